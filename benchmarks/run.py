@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""Offline microbenchmarks for the ipychat hot paths.
+
+Usage:
+    python benchmarks/run.py [--quick] [--filter NAME] [--output FILE]
+                             [--compare FILE]
+
+Results are written to benchmarks/results/<version>.json by default, so
+runs of different versions can be compared with --compare.
+"""
+
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+BENCHMARKS: Dict[str, Callable[[bool], Dict[str, Any]]] = {}
+
+
+def benchmark(func: Callable[[bool], Dict[str, Any]]):
+    BENCHMARKS[func.__name__.replace("bench_", "")] = func
+    return func
+
+
+def measure(func: Callable[[], Any], repeat: int = 5) -> Dict[str, Any]:
+    """Time `repeat` calls of `func`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "repeat": repeat,
+        "unit": "s",
+    }
+
+
+def synthetic_namespace(size: int) -> Dict[str, Any]:
+    namespace: Dict[str, Any] = {}
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            namespace[f"num_{i}"] = i
+        elif kind == 1:
+            namespace[f"items_{i}"] = list(range(100))
+        elif kind == 2:
+            namespace[f"mapping_{i}"] = {str(j): j for j in range(50)}
+        else:
+            namespace[f"text_{i}"] = "x" * 200
+    return namespace
+
+
+@benchmark
+def bench_context_namespace(quick: bool) -> Dict[str, Any]:
+    from ipychat.context import VariableSummaryCache, get_context_for_variables
+
+    namespace = synthetic_namespace(2_000 if quick else 20_000)
+    names = list(namespace)[::997][:8]
+    query = f"how are {', '.join(names)} related and what else is in scope?"
+
+    result = {"variables": len(namespace)}
+    result["cold"] = measure(lambda: get_context_for_variables(namespace, query))
+
+    cache = VariableSummaryCache()
+    get_context_for_variables(namespace, query, cache)
+    result["cached"] = measure(
+        lambda: get_context_for_variables(namespace, query, cache)
+    )
+    return result
+
+
+@benchmark
+def bench_context_dataframe(quick: bool) -> Dict[str, Any]:
+    try:
+        import numpy as np
+        import pandas as pd
+    except ImportError:
+        return {"skipped": "pandas and numpy are not installed"}
+
+    from ipychat.context import VariableSummaryCache, get_context_for_variables
+
+    rows = 100_000 if quick else 1_000_000
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            **{f"value_{i}": rng.normal(size=rows) for i in range(10)},
+            **{f"count_{i}": rng.integers(0, 1000, size=rows) for i in range(5)},
+            **{
+                f"label_{i}": rng.choice(["a", "b", "c", "d"], size=rows)
+                for i in range(5)
+            },
+        }
+    )
+    wide = pd.DataFrame(rng.normal(size=(1_000, 500)))
+    namespace = {"df": df, "wide": wide}
+
+    result = {"rows": rows}
+    result["cold"] = measure(
+        lambda: get_context_for_variables(namespace, "describe df"), repeat=3
+    )
+    result["wide"] = measure(
+        lambda: get_context_for_variables(namespace, "describe wide"), repeat=3
+    )
+
+    cache = VariableSummaryCache()
+    get_context_for_variables(namespace, "describe df", cache)
+    result["cached"] = measure(
+        lambda: get_context_for_variables(namespace, "describe df", cache)
+    )
+    return result
+
+
+@benchmark
+def bench_extract_variables(quick: bool) -> Dict[str, Any]:
+    from ipychat.context import extract_variables_from_query
+
+    words = ["df.groupby(key)", "model", "x,y", "the", "scores[0]", "résumé"]
+    short = "why does df.groupby('key').mean() drop my_column?"
+    long = " ".join(words[i % len(words)] for i in range(2_000 if quick else 20_000))
+    return {
+        "short": measure(lambda: extract_variables_from_query(short), repeat=1000),
+        "long": measure(lambda: extract_variables_from_query(long), repeat=20),
+        "long_words": len(long.split()),
+    }
+
+
+@benchmark
+def bench_history(quick: bool) -> Dict[str, Any]:
+    from ipychat.history import HistoryBuffer
+    from ipychat.prompt import HISTORY_WINDOW, build_user_content
+
+    cells = 10_000 if quick else 100_000
+    input_hist_raw = [""] + [
+        f"result_{i} = compute(data_{i}, factor={i})\nprint(result_{i})"
+        for i in range(cells)
+    ]
+
+    def cold():
+        buffer = HistoryBuffer(HISTORY_WINDOW)
+        buffer.sync(input_hist_raw)
+        return buffer.cells
+
+    buffer = HistoryBuffer(HISTORY_WINDOW)
+    buffer.sync(input_hist_raw)
+
+    def incremental():
+        input_hist_raw.append("x = 1")
+        buffer.sync(input_hist_raw)
+        return buffer.cells
+
+    def assemble():
+        return build_user_content(
+            "what happened?", [], buffer.cells, budget=16_000, provider="openai"
+        )
+
+    return {
+        "cells": cells,
+        "cold_sync": measure(cold),
+        "incremental_sync": measure(incremental, repeat=100),
+        "build_user_content": measure(assemble, repeat=100),
+    }
+
+
+def render_benchmark(text: str, chunk_size: int, terminal: bool) -> Dict[str, Any]:
+    from rich.console import Console
+
+    from ipychat.providers.base import BaseProvider
+
+    class FakeProvider(BaseProvider):
+        def initialize_client(self) -> None:
+            self.client = object()
+
+        def stream_chat(self, system_prompt: str, user_content: str) -> Iterator[str]:
+            for i in range(0, len(text), chunk_size):
+                yield text[i : i + chunk_size]
+
+    provider = FakeProvider({"current": {"provider": "fake"}}, debug=False)
+    provider.initialize_client()
+    provider.console = Console(file=io.StringIO(), force_terminal=terminal, width=100)
+
+    result = measure(lambda: provider.stream_response("system", "user"), repeat=3)
+    result["chars_per_second"] = len(text) / result["median"]
+    return result
+
+
+@benchmark
+def bench_render(quick: bool) -> Dict[str, Any]:
+    paragraph = (
+        "The **mean** of `df['value']` is computed per group, then the result "
+        "is joined back onto the original frame.\n\n"
+    )
+    code = (
+        "```python\nresult = df.groupby('key')['value'].mean()\nprint(result)\n```\n\n"
+    )
+    blocks = 50 if quick else 400
+    text = "".join(paragraph if i % 3 else code for i in range(blocks))
+
+    result: Dict[str, Any] = {"chars": len(text)}
+    for chunk_size in (1, 4, 32, 256):
+        result[f"chunk_{chunk_size}"] = render_benchmark(text, chunk_size, True)
+    result["plain"] = render_benchmark(text, 4, False)
+    return result
+
+
+def import_time(module: str, repeat: int) -> Dict[str, Any]:
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "repeat": repeat,
+        "unit": "s",
+    }
+
+
+@benchmark
+def bench_import(quick: bool) -> Dict[str, Any]:
+    repeat = 3 if quick else 7
+    return {
+        "ipychat": import_time("ipychat", repeat),
+        "ipychat.magic": import_time("ipychat.magic", repeat),
+    }
+
+
+def flatten(result: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Return the median timings of a result, keyed by dotted name."""
+    timings = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            if "median" in value:
+                timings[prefix + key] = value["median"]
+            else:
+                timings.update(flatten(value, f"{prefix}{key}."))
+    return timings
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    current = flatten(results["benchmarks"])
+    previous = flatten(baseline["benchmarks"])
+    print(f"\nCompared to {baseline['version']} ({baseline['timestamp']}):")
+    for name, median in current.items():
+        if name in previous:
+            ratio = median / previous[name]
+            print(
+                f"  {name:45} {previous[name] * 1000:10.3f} ms -> "
+                f"{median * 1000:10.3f} ms  x{ratio:.2f}"
+            )
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="smaller inputs")
+    parser.add_argument(
+        "--filter", action="append", help="only run benchmarks containing NAME"
+    )
+    parser.add_argument("--output", type=Path, help="where to save the results")
+    parser.add_argument("--compare", type=Path, help="results file to compare to")
+    args = parser.parse_args(argv)
+
+    output = args.output or RESULTS_DIR / f"{version('ipychat')}.json"
+    baseline = None
+    if args.compare:
+        if args.compare.resolve() == output.resolve():
+            parser.error(
+                f"--compare {args.compare} would be overwritten by this run, "
+                "save the results elsewhere with --output"
+            )
+        # read before running, so a missing baseline fails fast
+        baseline = json.loads(args.compare.read_text())
+
+    results: Dict[str, Any] = {
+        "version": version("ipychat"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "quick": args.quick,
+        "benchmarks": {},
+    }
+    for name, func in BENCHMARKS.items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        print(f"Running {name}...", flush=True)
+        results["benchmarks"][name] = func(args.quick)
+
+    for name, median in flatten(results["benchmarks"]).items():
+        print(f"  {name:45} {median * 1000:10.3f} ms")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Saved results to {output}")
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
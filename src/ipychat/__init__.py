@@ -1,6 +1,17 @@
 # -*- coding: utf-8 -*-
 
 from .__version__ import __version__
-from .magic import load_ipython_extension
+
+
+def load_ipython_extension(ipython):
+    """Load the %ask magics into an IPython shell.
+
+    The magics are imported here, so that importing ipychat, for the CLI or
+    `ipychat.results`, doesn't start up IPython.
+    """
+    from .magic import load_ipython_extension
+
+    load_ipython_extension(ipython)
+
 
 __all__ = ["load_ipython_extension", "__version__"]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .providers.base import BaseProvider
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful principal engineer and an experienced principal data scientist. Give your responses in richly formatted markdown and make it concise."
+
+
+def read_prompts(input_file: Path) -> List[Dict[str, Any]]:
+    """Read prompts from a JSONL file.
+
+    Each line is an object with a `prompt` and optionally an `id` and a
+    `system` prompt. Items without an `id` are numbered by line.
+    """
+    items = []
+    with open(input_file) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"prompt": item}
+            item.setdefault("id", line_number)
+            items.append(item)
+    return items
+
+
+def read_finished(output_file: Path) -> Set[Any]:
+    """Return the ids already answered in an existing output file."""
+    finished = set()
+    if not output_file.exists():
+        return finished
+
+    with open(output_file) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by an interrupted run
+                continue
+            if "error" not in record:
+                finished.add(record["id"])
+    return finished
+
+
+async def run_batch(
+    provider: BaseProvider,
+    input_file: Path,
+    output_file: Path,
+    concurrency: int = 4,
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, int]:
+    """Answer every prompt in `input_file`, appending results to `output_file`.
+
+    Items already answered in `output_file` are skipped, so an interrupted
+    run resumes where it stopped. Failed items are recorded with an `error`
+    and retried on the next run.
+    """
+    items = read_prompts(input_file)
+    finished = read_finished(output_file)
+    pending = [item for item in items if item["id"] not in finished]
+    summary = {"skipped": len(items) - len(pending), "answered": 0, "failed": 0}
+    queue = iter(pending)
+
+    async def answer(item: Dict[str, Any]) -> Dict[str, Any]:
+        chunks = []
+        try:
+            async for content in provider.aopen_stream(
+                item.get("system", system_prompt), item["prompt"]
+            ):
+                chunks.append(content)
+        except Exception as e:
+            return {"id": item["id"], "error": str(e)}
+        return {"id": item["id"], "response": "".join(chunks)}
+
+    with open(output_file, "a+") as out:
+        # terminate a record cut short by an interrupted run
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+
+        async def worker():
+            for item in queue:
+                record = await answer(item)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                summary["failed" if "error" in record else "answered"] += 1
+                if on_result is not None:
+                    on_result(record)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    return summary
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from .metrics import RequestTimer, percentile
+from .providers import get_provider
+from .scheduler import MAX_RETRIES, get_scheduler
+
+BENCH_PROVIDERS = ("openai", "anthropic")
+BENCH_SYSTEM_PROMPT = "You are a helpful assistant."
+BENCH_QUESTION = "What does df.groupby('key').mean() return?"
+
+
+def bench_config(provider: str, url: str, retries: int = MAX_RETRIES) -> Dict[str, Any]:
+    """Return an ipychat config pointing `provider` at a stub server."""
+    if provider not in BENCH_PROVIDERS:
+        raise ValueError(f"Unsupported bench provider: {provider}")
+
+    base_url = f"{url}/v1" if provider == "openai" else url
+    return {
+        "current": {"provider": provider, "model": "stub"},
+        provider: {"api_key": "stub", "base_url": base_url},
+        "scheduler": {"max_retries": retries},
+    }
+
+
+def run_session(config: Dict[str, Any], requests: int) -> List[Dict[str, Any]]:
+    """Send `requests` queries one after the other, like a user in a notebook."""
+    provider = get_provider(config, debug=False)
+    records = []
+    for _ in range(requests):
+        current = config["current"]
+        timer = RequestTimer(current["provider"], current["model"])
+        try:
+            text = "".join(
+                timer.watch(provider.open_stream(BENCH_SYSTEM_PROMPT, BENCH_QUESTION))
+            )
+        except Exception as e:
+            records.append({"error": str(e)})
+            continue
+        records.append(timer.record(BENCH_SYSTEM_PROMPT, BENCH_QUESTION, text))
+    return records
+
+
+def run_bench(
+    provider: str,
+    url: str,
+    sessions: int = 10,
+    requests: int = 5,
+    retries: int = MAX_RETRIES,
+) -> Dict[str, Any]:
+    """Run concurrent sessions against a stub server and summarize latencies.
+
+    Tokens are counted as streamed chunks, which is what the stub sends.
+    """
+    config = bench_config(provider, url, retries)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [
+            executor.submit(run_session, config, requests) for _ in range(sessions)
+        ]
+        records = [record for future in futures for record in future.result()]
+    elapsed = time.perf_counter() - start
+
+    answered = [record for record in records if "error" not in record]
+    summary: Dict[str, Any] = {
+        "requests": len(records),
+        "errors": len(records) - len(answered),
+        "elapsed": elapsed,
+        "throughput": sum(record["chunks"] for record in answered) / elapsed,
+    }
+    scheduler = get_scheduler(provider, config)
+    stats = scheduler.stats()
+    for name in ("retries", "throttled", "concurrency_limit"):
+        summary[name] = stats[name]
+    # time to first token includes this wait for a slot
+    queue_times = list(scheduler.queue_times)
+
+    first_tokens = [
+        record["first_token"] for record in answered if "first_token" in record
+    ]
+    rates = [
+        record["chunks"] / (record["total"] - record["first_token"])
+        for record in answered
+        if "first_token" in record and record["total"] > record["first_token"]
+    ]
+    for name, values in (
+        ("queue", queue_times),
+        ("first_token", first_tokens),
+        ("tokens_per_second", rates),
+    ):
+        if values:
+            summary[name] = {f"p{q}": percentile(values, q) for q in (50, 95, 99)}
+    return summary
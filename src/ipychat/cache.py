@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from .config import get_config_dir
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_SIZE_MB = 100
+MEMORY_ENTRIES = 128
+
+
+def get_cache_file() -> Path:
+    """Get the path to the on-disk response cache."""
+    return get_config_dir() / "cache.sqlite3"
+
+
+def make_cache_key(
+    provider: str,
+    model: str,
+    params: Dict[str, Any],
+    system_prompt: str,
+    user_content: str,
+    history: Sequence[Dict[str, str]] = (),
+) -> str:
+    """Build a cache key from the request that produced a response."""
+    prompt = f"{system_prompt}\0{user_content}"
+    if history:
+        prompt += "\0" + json.dumps(list(history), sort_keys=True)
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    key = json.dumps(
+        [provider, model, params, prompt_hash], sort_keys=True, default=str
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier response cache: an in-memory LRU in front of SQLite."""
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        ttl: float = DEFAULT_TTL,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        memory_entries: int = MEMORY_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["ResponseCache"]:
+        """Create a cache from the `cache` config section, or None if disabled."""
+        cache_config = config.get("cache", {})
+        if not cache_config.get("enabled", True):
+            return None
+
+        return cls(
+            ttl=cache_config.get("ttl", DEFAULT_TTL),
+            max_size_mb=cache_config.get("max_size_mb", DEFAULT_MAX_SIZE_MB),
+        )
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path is None:
+                self.path = get_cache_file()
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT, created REAL, "
+                "accessed REAL, size INTEGER)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                response, created = self._memory[key]
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._memory[key]
+
+            row = self.conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                )
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response and evict expired or excess entries."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, response, now, now, len(response.encode("utf-8"))),
+                )
+                self.conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (now - self.ttl,)
+                )
+                self.conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM (SELECT key, SUM(size) OVER "
+                    "(ORDER BY accessed DESC) AS total FROM responses) "
+                    "WHERE total > ?)",
+                    (self.max_bytes,),
+                )
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            self._memory.clear()
+            with self.conn:
+                self.conn.execute("DELETE FROM responses")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and cache sizes."""
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": entries,
+                "disk_bytes": size,
+                "path": str(self.path),
+            }
+
+    def _remember(self, key: str, response: str, created: float) -> None:
+        self._memory[key] = (response, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIRST_TOKEN_TIMEOUT = 60.0
+DEFAULT_TIMEOUT = 600.0
+
+_DONE = object()
+_CANCELLED = object()
+_local = threading.local()
+
+
+class StreamCancelled(Exception):
+    """A response stream was stopped before it finished.
+
+    `partial` holds the text received until then.
+    """
+
+    status = "cancelled"
+
+    def __init__(self, message: str = "Request cancelled", partial: str = ""):
+        super().__init__(message)
+        self.partial = partial
+
+
+class RequestTimeout(StreamCancelled):
+    """A response stream missed its first token or total deadline."""
+
+    status = "timeout"
+
+
+def get_deadlines(config: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Return the `request` deadlines from the config, 0 disables one."""
+    request = config.get("request", {})
+    first_token = request.get("first_token_timeout", DEFAULT_FIRST_TOKEN_TIMEOUT)
+    timeout = request.get("timeout", DEFAULT_TIMEOUT)
+    return {
+        "first_token_timeout": first_token or None,
+        "timeout": timeout or None,
+    }
+
+
+def on_cancel(close: Callable[[], Any]) -> None:
+    """Register `close` to abort the response being streamed on this thread.
+
+    Providers call this with their SDK stream's close method. It does nothing
+    unless the stream is consumed through a `GuardedStream`.
+    """
+    stream = getattr(_local, "stream", None)
+    if stream is not None:
+        stream._add_closer(close)
+
+
+@contextmanager
+def closing_stream(
+    response: T, close: Optional[Callable[[], Any]] = None
+) -> Iterator[T]:
+    """Close a provider response when its stream ends or is cancelled.
+
+    `close` defaults to the response's own `close` method.
+    """
+    close = close or getattr(response, "close", None)
+    if close is None:
+        yield response
+        return
+
+    on_cancel(close)
+    try:
+        yield response
+    finally:
+        close()
+
+
+class GuardedStream:
+    """Iterate chunks on a worker thread, so waiting for them can be stopped.
+
+    The consumer gives up when the first chunk takes longer than
+    `first_token_timeout` or the whole stream longer than `timeout`, on
+    KeyboardInterrupt, or when `cancel()` is called from another thread.
+    Giving up closes the provider's HTTP response, and a stream that still
+    hangs is left to its daemon thread instead of blocking the kernel.
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[str],
+        first_token_timeout: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.first_token_timeout = first_token_timeout
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.first_chunk: Optional[float] = None
+        self.finished = False
+        # set by the worker when the first chunk or error comes in
+        self.arrived = threading.Event()
+        self.arrived_at: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self._chunks = chunks
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._closers: List[Callable[[], Any]] = []
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._pump, name="ipychat-stream", daemon=True
+        )
+        self._thread.start()
+
+    def _pump(self) -> None:
+        _local.stream = self
+        try:
+            for content in self._chunks:
+                if self._cancelled:
+                    break
+                self._put(content)
+        except BaseException as e:
+            self.error = e
+            self._put(e)
+        else:
+            self._put(_DONE)
+        finally:
+            _local.stream = None
+            # run the generator's cleanup, such as releasing a scheduler slot,
+            # when the loop stopped early on cancel
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                self._close(close)
+
+    def _put(self, item: Any) -> None:
+        if self.arrived_at is None:
+            self.arrived_at = time.monotonic()
+        self._queue.put(item)
+        self.arrived.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Seconds until the first chunk or error came in, if it has."""
+        if self.arrived_at is None:
+            return None
+        return self.arrived_at - self.started
+
+    def _wait(self) -> Optional[float]:
+        now = time.monotonic()
+        deadlines = []
+        if self.timeout is not None:
+            deadlines.append(self.started + self.timeout)
+        if self.first_chunk is None and self.first_token_timeout is not None:
+            deadlines.append(self.started + self.first_token_timeout)
+        if not deadlines:
+            return None
+        return max(min(deadlines) - now, 0)
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        return self._get(None)
+
+    def next_within(self, timeout: float) -> Optional[str]:
+        """Return the next chunk, or None if none comes within `timeout` seconds."""
+        return self._get(timeout)
+
+    def _get(self, timeout: Optional[float]) -> Optional[str]:
+        if self.finished:
+            raise StopIteration
+
+        wait = self._wait()
+        expires = wait is not None and (timeout is None or wait <= timeout)
+        try:
+            item = self._queue.get(timeout=wait if expires else timeout)
+        except queue.Empty:
+            if not expires:
+                return None
+            self.cancel()
+            self.finished = True
+            waited = "first token" if self.first_chunk is None else "response"
+            raise RequestTimeout(f"Timed out waiting for the {waited}") from None
+        except BaseException:
+            # KeyboardInterrupt while waiting
+            self.cancel()
+            self.finished = True
+            raise
+
+        if item is _DONE:
+            self.finished = True
+            raise StopIteration
+        if item is _CANCELLED:
+            self.finished = True
+            raise StreamCancelled()
+        if isinstance(item, BaseException):
+            self.finished = True
+            raise item
+
+        if self.first_chunk is None:
+            self.first_chunk = time.monotonic()
+        return item
+
+    def _add_closer(self, close: Callable[[], Any]) -> None:
+        with self._lock:
+            if not self._cancelled:
+                self._closers.append(close)
+                return
+        # the response arrived after the stream was given up
+        self._close(close)
+
+    def _close(self, close: Callable[[], Any]) -> None:
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"Closing the response stream failed: {e}")
+
+    def cancel(self) -> None:
+        """Stop the stream and close the provider's response."""
+        with self._lock:
+            if self.finished or self._cancelled:
+                return
+            self._cancelled = True
+            closers = list(self._closers)
+        self._queue.put(_CANCELLED)
+
+        for close in closers:
+            self._close(close)
+
+    def close(self) -> None:
+        """Release the stream when the consumer stops early."""
+        self.cancel()
+        self.finished = True
+
+
+async def guard_async(
+    chunks: AsyncIterator[str],
+    first_token_timeout: Optional[float] = None,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """Yield async `chunks` under the same deadlines as `GuardedStream`.
+
+    Cancelling the pending chunk on a missed deadline closes the provider's
+    response, and `RequestTimeout` is raised.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    first = True
+    try:
+        while True:
+            deadlines = []
+            if timeout is not None:
+                deadlines.append(started + timeout)
+            if first and first_token_timeout is not None:
+                deadlines.append(started + first_token_timeout)
+            wait = max(min(deadlines) - loop.time(), 0) if deadlines else None
+            try:
+                content = await asyncio.wait_for(chunks.__anext__(), wait)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                waited = "first token" if first else "response"
+                raise RequestTimeout(f"Timed out waiting for the {waited}") from None
+            first = False
+            yield content
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
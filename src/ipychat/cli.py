@@ -1,19 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import sys
+from pathlib import Path
 from typing import Any, Dict
 
 import click
-from IPython import start_ipython
 from rich.console import Console
-from rich.prompt import Confirm
-from traitlets.config import Config
 
-from .config import get_api_key, load_config, save_config
+from .batch import DEFAULT_SYSTEM_PROMPT, run_batch
+from .bench import BENCH_PROVIDERS, run_bench
+from .cancel import RequestTimeout, StreamCancelled
+from .config import get_api_key, load_config, resolve_api_key, save_config
 from .models import AVAILABLE_MODELS, get_model_by_name
-from .ui import display_model_table, select_with_arrows
+from .prompt import build_shell_content, get_token_budget
+from .providers import get_provider
+from .scheduler import MAX_RETRIES
+from .stub import StubConfig, StubServer
+
+# IPython and questionary are imported by the commands that need them, so
+# `ipychat ask` starts quickly
 
 console = Console()
+err_console = Console(stderr=True)
+
+# exit codes of `ipychat ask`, following `timeout` and SIGINT
+EXIT_TIMEOUT = 124
+EXIT_INTERRUPTED = 130
 
 
 @click.group(invoke_without_command=True)
@@ -32,6 +45,8 @@ def app(ctx, debug):
 @app.command()
 def config():
     """Initialize ipychat configuration."""
+    from .ui import display_model_table, select_with_arrows
+
     ipychat_config = load_config()
 
     console.print("\n[bold]Welcome to ipychat configuration[/bold]\n")
@@ -43,7 +58,12 @@ def config():
         model_names,
     )
 
-    model_config = get_model_by_name(model)
+    try:
+        model_config = get_model_by_name(model)
+    except ValueError as e:
+        # also when the selection is interrupted
+        console.print(f"[red]{e}[/red]")
+        raise click.Abort()
     provider = model_config.provider
     ipychat_config["current"] = {
         "provider": provider,
@@ -58,10 +78,288 @@ def config():
     save_config(ipychat_config)
 
 
+@app.command()
+@click.argument("input_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_file", type=click.Path(dir_okay=False))
+@click.option(
+    "--concurrency",
+    "-c",
+    default=4,
+    show_default=True,
+    help="Number of requests to run at once",
+)
+@click.option("--system", default=DEFAULT_SYSTEM_PROMPT, help="System prompt to use")
+@click.pass_context
+def batch(ctx, input_file, output_file, concurrency, system):
+    """Answer prompts from a JSONL file.
+
+    Each input line is an object with a "prompt" and an optional "id" and
+    "system". Answers are appended to OUTPUT_FILE as they finish, and prompts
+    already answered there are skipped, so an interrupted run can resume.
+    """
+    ipychat_config = load_config()
+    provider = get_provider(ipychat_config, ctx.obj["debug"])
+    if provider.client is None:
+        ctx.exit(1)
+
+    def on_result(record):
+        if "error" in record:
+            console.print(f"[red]{record['id']}: {record['error']}[/red]")
+
+    summary = asyncio.run(
+        run_batch(
+            provider,
+            Path(input_file),
+            Path(output_file),
+            concurrency=concurrency,
+            system_prompt=system,
+            on_result=on_result,
+        )
+    )
+    console.print(
+        f"Answered {summary['answered']}, failed {summary['failed']}, "
+        f"skipped {summary['skipped']} already answered."
+    )
+
+
+def stub_options(func):
+    """Options describing the simulated provider."""
+    options = [
+        click.option(
+            "--latency", default=0.2, show_default=True, help="Seconds to first token"
+        ),
+        click.option(
+            "--tokens-per-second",
+            default=50.0,
+            show_default=True,
+            help="Streaming rate of each response",
+        ),
+        click.option(
+            "--response-tokens",
+            default=100,
+            show_default=True,
+            help="Length of each response",
+        ),
+        click.option(
+            "--error-rate",
+            default=0.0,
+            show_default=True,
+            help="Fraction of requests that fail",
+        ),
+        click.option(
+            "--rate-limit",
+            default=0.0,
+            show_default=True,
+            help="Requests per minute before answering 429, 0 for no limit",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+@app.command()
+@click.option("--port", default=8000, show_default=True, help="Port to listen on")
+@stub_options
+def stub(port, latency, tokens_per_second, response_tokens, error_rate, rate_limit):
+    """Run a local stub of the OpenAI and Anthropic streaming APIs."""
+    server = StubServer(
+        StubConfig(latency, tokens_per_second, response_tokens, error_rate, rate_limit),
+        port=port,
+    )
+    console.print(f"Serving OpenAI at {server.url}/v1 and Anthropic at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+@app.command()
+@click.option(
+    "--provider",
+    type=click.Choice(BENCH_PROVIDERS),
+    default="openai",
+    show_default=True,
+    help="Provider wire format to use",
+)
+@click.option(
+    "--sessions",
+    "-n",
+    default=10,
+    show_default=True,
+    help="Number of concurrent sessions",
+)
+@click.option(
+    "--requests", "-r", default=5, show_default=True, help="Requests per session"
+)
+@click.option("--url", help="Use a running stub server instead of starting one")
+@click.option(
+    "--retries",
+    default=MAX_RETRIES,
+    show_default=True,
+    help="Retries of a request failing with 429 or 5xx",
+)
+@stub_options
+def bench(
+    provider,
+    sessions,
+    requests,
+    url,
+    retries,
+    latency,
+    tokens_per_second,
+    response_tokens,
+    error_rate,
+    rate_limit,
+):
+    """Load test a provider against a local stub server.
+
+    Runs concurrent simulated sessions through the real provider classes and
+    reports time to first token and throughput.
+    """
+    server = None
+    if url is None:
+        server = StubServer(
+            StubConfig(
+                latency, tokens_per_second, response_tokens, error_rate, rate_limit
+            )
+        ).start()
+        url = server.url
+
+    try:
+        summary = run_bench(provider, url, sessions, requests, retries)
+    finally:
+        if server is not None:
+            server.stop()
+
+    console.print(
+        f"{summary['requests']} requests, {summary['errors']} errors "
+        f"in {summary['elapsed']:.2f}s"
+    )
+    console.print(
+        f"{summary['retries']} retries, {summary['throttled']} throttled, "
+        f"concurrency limit {summary['concurrency_limit']}"
+    )
+    if "queue" in summary:
+        queue = summary["queue"]
+        console.print(
+            f"Scheduler queue: p50 {queue['p50'] * 1000:.0f} ms, "
+            f"p95 {queue['p95'] * 1000:.0f} ms, p99 {queue['p99'] * 1000:.0f} ms"
+        )
+    if "first_token" in summary:
+        ttft = summary["first_token"]
+        console.print(
+            f"Time to first token: p50 {ttft['p50'] * 1000:.0f} ms, "
+            f"p95 {ttft['p95'] * 1000:.0f} ms, p99 {ttft['p99'] * 1000:.0f} ms"
+        )
+    if "tokens_per_second" in summary:
+        rate = summary["tokens_per_second"]
+        console.print(
+            f"Tokens/s per stream: p50 {rate['p50']:.1f}, "
+            f"p95 {rate['p95']:.1f}, p99 {rate['p99']:.1f}"
+        )
+    console.print(f"Total throughput: {summary['throughput']:.1f} tokens/s")
+
+
+@app.command()
+@click.argument("question", nargs=-1)
+@click.option(
+    "--file",
+    "-f",
+    "files",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Send a file along with the question, can be repeated",
+)
+@click.option(
+    "--stdin", "read_stdin", is_flag=True, help="Send stdin along with the question"
+)
+@click.option("--model", "-m", help="Model to use instead of the configured one")
+@click.option("--system", default=DEFAULT_SYSTEM_PROMPT, help="System prompt to use")
+@click.pass_context
+def ask(ctx, question, files, read_stdin, model, system):
+    """Answer a question and exit, without starting IPython.
+
+    The question is read from stdin when none is given, and --stdin sends
+    stdin along with a question. The answer streams to stdout, as plain
+    text when stdout isn't a terminal:
+
+        git diff | ipychat ask --stdin "review this change" > review.md
+
+    Exits with 1 when the request fails, 124 when it times out and 130
+    when it is interrupted.
+    """
+    query = " ".join(question).strip()
+    inputs = [
+        (f"File {path}", Path(path).read_text(errors="replace")) for path in files
+    ]
+    # stdin is left alone otherwise, so ask works inside `while read` loops
+    if read_stdin and query:
+        piped = sys.stdin.read()
+        if piped.strip():
+            inputs.append(("Input", piped))
+    elif read_stdin or (not query and not sys.stdin.isatty()):
+        query = sys.stdin.read().strip()
+    if not query:
+        raise click.UsageError("Ask a question, as arguments or on stdin.")
+
+    ipychat_config = load_config()
+    if model:
+        try:
+            model_config = get_model_by_name(model)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--model")
+        provider_name = model_config.provider
+        ipychat_config = {
+            **ipychat_config,
+            "current": {"provider": provider_name, "model": model},
+            provider_name: {
+                **ipychat_config.get(provider_name, {}),
+                "api_key": resolve_api_key(ipychat_config, provider_name),
+            },
+        }
+
+    provider_name = ipychat_config.get("current", {}).get("provider", "openai")
+    if not ipychat_config.get(provider_name, {}).get("api_key"):
+        # stdout only carries the answer
+        err_console.print(
+            f"[red]Set [bold]{provider_name.upper()}_API_KEY[/bold] in your "
+            "environment, or run [bold]ipychat config[/bold].[/red]"
+        )
+        ctx.exit(1)
+
+    provider = get_provider(ipychat_config, ctx.obj["debug"])
+    if provider.client is None:
+        ctx.exit(1)
+
+    user_content = build_shell_content(
+        query, inputs, get_token_budget(ipychat_config), provider_name, system
+    )
+    try:
+        provider.stream_response(system, user_content)
+    except RequestTimeout as e:
+        err_console.print(f"[yellow]{e}[/yellow]")
+        exit_code = EXIT_TIMEOUT
+    except StreamCancelled as e:
+        err_console.print(f"[yellow]{e}[/yellow]")
+        exit_code = EXIT_INTERRUPTED
+    except Exception as e:
+        err_console.print(f"[red]Error: {e}[/red]")
+        exit_code = 1
+    else:
+        exit_code = 0
+    ctx.exit(exit_code)
+
+
 @app.command(hidden=True)
 @click.pass_context
 def start(ctx):
     """Start the ipychat CLI application."""
+    from IPython import start_ipython
+    from traitlets.config import Config
+
     c = Config()
     c.InteractiveShellApp.extensions = ["ipychat.magic"]
     c.IPyChatMagics = Config()
@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
-import questionary
 import toml
 from click import get_app_dir
 from rich.console import Console
@@ -12,6 +20,10 @@ from rich.prompt import Confirm
 
 console = Console()
 
+# parsed config files, keyed by path and validated by their stat stamp
+_config_cache: Dict[Path, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+_config_cache_lock = threading.Lock()
+
 
 def get_default_config() -> Dict[str, Any]:
     from .models import AVAILABLE_MODELS
@@ -30,6 +42,17 @@ def get_default_config() -> Dict[str, Any]:
         "anthropic": {"api_key": ""},
         "google": {"api_key": ""},
         "sapgenaihub": {"api_key": ""},
+        "context": {"max_tokens": 16000},
+        "cache": {
+            "enabled": True,
+            "ttl": 7 * 24 * 60 * 60,
+            "max_size_mb": 100,
+        },
+        "metrics": {"log_file": ""},
+        "session": {"enabled": True, "max_tokens": 8000, "keep_turns": 4},
+        "request": {"first_token_timeout": 60, "timeout": 600},
+        "hedge": {"model": "", "delay": 0, "quantile": 95},
+        "scheduler": {"max_concurrency": 32, "max_retries": 4},
     }
 
     return DEFAULT_CONFIG
@@ -40,6 +63,14 @@ def get_api_key_from_env(provider: str) -> Optional[str]:
     return os.getenv(f"{provider.upper()}_API_KEY")
 
 
+def resolve_api_key(config: Dict[str, Any], provider: str) -> Optional[str]:
+    """Return the provider's API key from the config, or else the environment.
+
+    `load_config` only fills in the environment key of the current provider.
+    """
+    return config.get(provider, {}).get("api_key") or get_api_key_from_env(provider)
+
+
 def get_api_key(provider: str, ipychat_config: Dict[str, Any]) -> str:
     env_api_key = get_api_key_from_env(provider)
 
@@ -59,14 +90,56 @@ def get_api_key(provider: str, ipychat_config: Dict[str, Any]) -> str:
         if Confirm.ask(f"Found existing {provider} API key. Keep it?", default=True):
             return config_api_key
 
+    # imported here, it is slow to import and only needed to configure
+    import questionary
+
     return questionary.password(f"Enter your {provider} API key:", qmark="•").ask()
 
 
-def get_config_file() -> Path:
-    """Get the path to the config file."""
+def get_config_dir() -> Path:
+    """Get the ipychat application directory."""
     config_dir = Path(get_app_dir("ipychat"))
     config_dir.mkdir(parents=True, exist_ok=True)
-    return config_dir / "config.toml"
+    return config_dir
+
+
+def get_config_file() -> Path:
+    """Get the path to the config file."""
+    return get_config_dir() / "config.toml"
+
+
+def _stat_stamp(config_file: Path) -> Tuple[int, int, int]:
+    stat = config_file.stat()
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+@contextmanager
+def _config_lock(config_file: Path) -> Iterator[None]:
+    """Hold an advisory lock that serializes config writes across processes."""
+    with open(config_file.with_name(config_file.name + ".lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_config(config_file: Path) -> Dict[str, Any]:
+    """Return a copy of the parsed config file, re-reading it only if it changed."""
+    stamp = _stat_stamp(config_file)
+    with _config_cache_lock:
+        cached = _config_cache.get(config_file)
+        if cached is not None and cached[0] == stamp:
+            return copy.deepcopy(cached[1])
+
+    with open(config_file) as f:
+        config = toml.load(f)
+
+    with _config_cache_lock:
+        _config_cache[config_file] = (stamp, copy.deepcopy(config))
+    return config
 
 
 def load_config() -> Dict[str, Any]:
@@ -79,8 +152,7 @@ def load_config() -> Dict[str, Any]:
         save_config(default_config)
         return default_config
 
-    with open(config_file) as f:
-        config = toml.load(f)
+    config = _read_config(config_file)
 
     current_provider = config["current"]["provider"]
     env_api_key = get_api_key_from_env(current_provider)
@@ -91,8 +163,29 @@ def load_config() -> Dict[str, Any]:
 
 
 def save_config(config: Dict[str, Any]) -> None:
-    """Save configuration to TOML file."""
+    """Save configuration to TOML file.
+
+    The file is written to a temporary file and renamed into place, so
+    readers in other kernels never see a partial config.
+    """
     config_file = get_config_file()
 
-    with open(config_file, "w") as f:
-        toml.dump(config, f)
+    with _config_lock(config_file):
+        fd, tmp_file = tempfile.mkstemp(
+            dir=config_file.parent, prefix=".config.", suffix=".toml"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                toml.dump(config, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, config_file)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+        with _config_cache_lock:
+            _config_cache[config_file] = (
+                _stat_stamp(config_file),
+                copy.deepcopy(config),
+            )
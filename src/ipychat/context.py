@@ -2,18 +2,16 @@
 
 import ast
 import inspect
-from typing import Any, Dict, Optional
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from .dataframe import is_dataframe, summarize_dataframe
+from .discovery import extract_names, names_in_cell, rank_variables
 
 
 def extract_variables_from_query(query: str) -> set:
     """Extract potential variable names from the query string."""
-    # Only consider words that look like valid Python identifiers
-    words = set()
-    for word in query.split():
-        # Check if word could be a valid Python identifier
-        if word.isidentifier():
-            words.add(word)
-    return words
+    return set(extract_names(query))
 
 
 def get_variable_info(name: str, value: Any) -> str:
@@ -22,13 +20,8 @@ def get_variable_info(name: str, value: Any) -> str:
     info_parts.append(f"Type: {type(value).__name__}")
 
     # dataframes
-    if "pandas.core.frame.DataFrame" in str(type(value)):
-        info_parts.append(f"Shape: {value.shape}")
-        info_parts.append("Columns:")
-        for col in value.columns:
-            info_parts.append(f"- {col} ({value[col].dtype})")
-        info_parts.append("\nSample (first 5 rows):")
-        info_parts.append(str(value.head()))
+    if is_dataframe(value):
+        info_parts.extend(summarize_dataframe(value))
 
     # functions
     elif inspect.isfunction(value):
@@ -79,17 +72,118 @@ def get_variable_info(name: str, value: Any) -> str:
     return "\n".join(info_parts)
 
 
-def get_context_for_variables(namespace: Dict[str, Any], query: str) -> str:
+def fingerprint(value: Any) -> Tuple[Hashable, ...]:
+    """Cheap fingerprint that changes when a variable is likely to have changed."""
+    parts = [id(value), type(value)]
+
+    try:
+        shape = getattr(value, "shape", None)
+        if isinstance(shape, tuple):
+            parts.append(shape)
+
+        dtypes = getattr(value, "dtypes", None)
+        if dtypes is not None and hasattr(dtypes, "values"):
+            parts.append(tuple(str(dtype) for dtype in dtypes.values))
+
+        array_interface = getattr(value, "__array_interface__", None)
+        if isinstance(array_interface, dict):
+            parts.append(array_interface.get("data"))
+
+        if hasattr(value, "__len__") and not inspect.isclass(value):
+            parts.append(len(value))
+    except Exception:
+        pass
+
+    return tuple(parts)
+
+
+class VariableSummaryCache:
+    """LRU cache of variable summaries, validated by a cheap fingerprint.
+
+    Summaries are dropped when a cell touches the variable's name, when the
+    variable's fingerprint changes, or when the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[Tuple[Hashable, ...], str]]" = (
+            OrderedDict()
+        )
+
+    def get_info(self, name: str, value: Any) -> str:
+        """Return the summary of a variable, computing it only if needed."""
+        key = fingerprint(value)
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == key:
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        info = get_variable_info(name, value)
+        self._discard(name)
+        self._entries[name] = (key, info)
+        self.size += len(info)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            self._discard(next(iter(self._entries)))
+        return info
+
+    def invalidate(self, names: Iterable[str]) -> None:
+        """Drop the summaries of the given variables."""
+        for name in names:
+            self._discard(name)
+
+    def invalidate_cell(self, source: str) -> None:
+        """Drop the summaries of every variable a cell may have changed."""
+        names = names_in_cell(source)
+        if names is None:
+            self.clear()
+        else:
+            self.invalidate(names)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, name: str) -> None:
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+def get_variable_summaries(
+    namespace: Dict[str, Any],
+    query: str,
+    cache: Optional[VariableSummaryCache] = None,
+    cells: Sequence[str] = (),
+) -> List[str]:
+    """Summarize the variables relevant to the query, most relevant first.
+
+    Relevant variables are the ones mentioned in the query, followed by the
+    ones used in the recent history `cells`.
+    """
+    summaries = []
+
+    for var_name in rank_variables(namespace, query, cells):
+        var = namespace[var_name]
+        if cache is not None:
+            summaries.append(cache.get_info(var_name, var))
+        else:
+            summaries.append(get_variable_info(var_name, var))
+
+    return summaries
+
+
+def get_context_for_variables(
+    namespace: Dict[str, Any],
+    query: str,
+    cache: Optional[VariableSummaryCache] = None,
+) -> str:
     """Extract relevant context from the user's namespace based on the query."""
-    # Filter namespace to only include actual variables (non-private)
-    filtered_namespace = {k: v for k, v in namespace.items() if not k.startswith("_")}
-
-    mentioned_vars = extract_variables_from_query(query)
-    context_parts = []
-
-    for var_name in mentioned_vars:
-        if var_name in filtered_namespace:
-            var = filtered_namespace[var_name]
-            context_parts.append(get_variable_info(var_name, var))
-
-    return "\n".join(context_parts)
+    return "\n".join(get_variable_summaries(namespace, query, cache))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Any, List
+
+MAX_COLUMNS = 50
+MAX_SAMPLE_ROWS = 10_000
+MAX_HEAD_COLUMNS = 20
+TOP_VALUES = 3
+TIME_BUDGET = 0.5
+
+
+def is_dataframe(value: Any) -> bool:
+    """Check for a pandas DataFrame without importing pandas."""
+    cls = type(value)
+    return cls.__name__ == "DataFrame" and cls.__module__.startswith("pandas")
+
+
+def _format_value(value: Any, width: int = 20) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    text = str(value)
+    return text if len(text) <= width else text[: width - 3] + "..."
+
+
+def _sample_rows(df: Any, n: int) -> Any:
+    """Pick `n` random rows, in their original order.
+
+    `DataFrame.sample` permutes every row index first, so its cost grows with
+    the frame. Choosing the positions with a Generator doesn't.
+    """
+    import numpy as np
+
+    positions = np.random.default_rng(0).choice(len(df), n, replace=False)
+    positions.sort()
+    return df.iloc[positions]
+
+
+def summarize_dataframe(
+    df: Any,
+    max_columns: int = MAX_COLUMNS,
+    max_sample_rows: int = MAX_SAMPLE_ROWS,
+    time_budget: float = TIME_BUDGET,
+) -> List[str]:
+    """Summarize a DataFrame within a row, column and time budget.
+
+    Per-column stats (nulls, min/max, distinct and top values) are computed
+    on at most `max_sample_rows` rows of the first `max_columns` columns.
+    Remaining columns are only counted by dtype, so the summary size does
+    not grow with the frame.
+    """
+    deadline = time.perf_counter() + time_budget
+    n_rows, n_columns = df.shape
+    lines = [f"Shape: {df.shape}"]
+
+    frame = df.iloc[:, :max_columns] if n_columns > max_columns else df
+    sampled = n_rows > max_sample_rows
+    sample = _sample_rows(frame, max_sample_rows) if sampled else frame
+
+    # each step is vectorized over all sampled columns at once
+    stats = {}
+    stat_steps = [
+        ("nulls", lambda: sample.isna().sum()),
+        ("min", lambda: sample.select_dtypes(["number", "datetime"]).min()),
+        ("max", lambda: sample.select_dtypes(["number", "datetime"]).max()),
+        ("distinct", lambda: sample.nunique()),
+    ]
+    for stat, compute in stat_steps:
+        if time.perf_counter() > deadline:
+            break
+        try:
+            stats[stat] = dict(compute().items())
+        except Exception:
+            continue
+
+    if sampled:
+        lines.append(f"Columns (stats from a sample of {max_sample_rows} rows):")
+    else:
+        lines.append("Columns:")
+
+    for position, col in enumerate(frame.columns):
+        parts = [f"- {col} ({frame.dtypes.iloc[position]})"]
+        for stat, values in stats.items():
+            if col in values:
+                label = "distinct~" if stat == "distinct" and sampled else f"{stat}="
+                parts.append(f"{label}{_format_value(values[col])}")
+
+        column = sample.iloc[:, position]
+        if column.dtype.kind in "OSUb" and time.perf_counter() <= deadline:
+            try:
+                top = column.value_counts().head(TOP_VALUES)
+                top_values = ", ".join(_format_value(value) for value in top.index)
+                parts.append(f"top=[{top_values}]")
+            except Exception:
+                pass
+        lines.append(" ".join(parts))
+
+    if n_columns > max_columns:
+        dtype_counts = df.dtypes.iloc[max_columns:].astype(str).value_counts()
+        grouped = ", ".join(
+            f"{dtype} x {count}" for dtype, count in dtype_counts.items()
+        )
+        lines.append(f"... {n_columns - max_columns} more columns: {grouped}")
+
+    if time.perf_counter() > deadline:
+        lines.append("(summary cut short by the time budget)")
+
+    head_columns = min(n_columns, MAX_HEAD_COLUMNS)
+    lines.append("\nSample (first 5 rows):")
+    lines.append(df.iloc[:5, :head_columns].to_string(max_colwidth=30))
+
+    return lines
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import ast
+import re
+import types
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+# dotted names, also when glued to punctuation as in `df.head()` or `x,y`
+NAME_RE = re.compile(r"(?<![\w.])[^\W\d]\w*(?:\.[^\W\d]\w*)*")
+
+IGNORED_NAMES = {"In", "Out", "exit", "quit", "get_ipython"}
+MAX_CELL_VARIABLES = 5
+RECENCY_DECAY = 0.8
+
+
+def extract_names(query: str) -> List[str]:
+    """Return the root names mentioned in a query, in order of appearance."""
+    names = {}
+    for match in NAME_RE.finditer(query):
+        names.setdefault(match.group().split(".")[0], None)
+    return list(names)
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Starred)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _parse(source: str) -> Optional[ast.AST]:
+    try:
+        return ast.parse(source)
+    except (SyntaxError, ValueError):
+        pass
+
+    # drop IPython magics and shell escapes, and try again
+    lines = [
+        line for line in source.splitlines() if not line.lstrip().startswith(("%", "!"))
+    ]
+    try:
+        return ast.parse("\n".join(lines))
+    except (SyntaxError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=1024)
+def cell_names(source: str) -> Optional[Tuple[FrozenSet[str], FrozenSet[str]]]:
+    """Return the names a cell reads and the names it writes.
+
+    Assigning to an attribute or item of a variable counts as writing it.
+    Returns None if the cell can't be parsed.
+    """
+    tree = _parse(source)
+    if tree is None:
+        return None
+
+    reads: Set[str] = set()
+    writes: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                reads.add(node.id)
+            else:
+                writes.add(node.id)
+        elif isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Delete)):
+            targets = node.targets if hasattr(node, "targets") else [node.target]
+            for target in targets:
+                elements = getattr(target, "elts", [target])
+                for element in elements:
+                    name = _root_name(element)
+                    if name is not None:
+                        writes.add(name)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            writes.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                writes.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            writes.update(node.names)
+
+    return frozenset(reads), frozenset(writes)
+
+
+def names_in_cell(source: str) -> Optional[Set[str]]:
+    """Return the names a cell reads or writes, or None if it can't be parsed."""
+    names = cell_names(source)
+    if names is None:
+        return None
+    return set(names[0] | names[1])
+
+
+def _is_variable(name: str, namespace: Dict[str, Any]) -> bool:
+    return (
+        not name.startswith("_")
+        and name not in IGNORED_NAMES
+        and name in namespace
+        and not isinstance(namespace[name], types.ModuleType)
+    )
+
+
+def rank_variables(
+    namespace: Dict[str, Any],
+    query: str,
+    cells: Sequence[str] = (),
+    max_cell_variables: int = MAX_CELL_VARIABLES,
+) -> List[str]:
+    """Rank the namespace entries relevant to a query.
+
+    Variables mentioned in the query come first, in order of appearance.
+    They are followed by up to `max_cell_variables` variables used in the
+    recent `cells`, scored by recency, with writes counting double.
+    """
+    mentioned = [name for name in extract_names(query) if _is_variable(name, namespace)]
+
+    scores: Dict[str, float] = {}
+    weight = 1.0
+    for source in reversed(cells):
+        names = cell_names(source)
+        if names is not None:
+            reads, writes = names
+            for name in reads:
+                scores[name] = scores.get(name, 0.0) + weight
+            for name in writes:
+                scores[name] = scores.get(name, 0.0) + 2 * weight
+        weight *= RECENCY_DECAY
+
+    used = sorted(
+        (
+            name
+            for name in scores
+            if name not in mentioned and _is_variable(name, namespace)
+        ),
+        key=lambda name: (-scores[name], name),
+    )
+    return mentioned + used[:max_cell_variables]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+from typing import Deque, List, Sequence, Tuple
+
+
+class HistoryBuffer:
+    """Bounded buffer of the most recent history cells, formatted for prompts.
+
+    The buffer remembers how far it has read `input_hist_raw`, so each sync
+    only looks at cells entered since the previous one.
+    """
+
+    def __init__(self, maxlen: int):
+        self.maxlen = maxlen
+        self._cells: Deque[Tuple[int, str]] = deque(maxlen=maxlen)
+        self._next = 1
+
+    @property
+    def cells(self) -> List[str]:
+        """The buffered cells, formatted as `In [n]: source`."""
+        return [f"In [{session_id}]: {cmd}" for session_id, cmd in self._cells]
+
+    @property
+    def sources(self) -> List[str]:
+        """The source code of the buffered cells."""
+        return [cmd for _, cmd in self._cells]
+
+    def sync(self, input_hist_raw: Sequence[str]) -> None:
+        """Add the cells entered since the last sync."""
+        end = len(input_hist_raw)
+        if end < self._next:
+            # the history was reset
+            self._cells.clear()
+            self._next = 1
+
+        # walk back from the newest cell, so at most one window is read
+        new_cells = []
+        for session_id in range(end - 1, self._next - 1, -1):
+            cmd = input_hist_raw[session_id]
+            if cmd.strip() and not cmd.startswith("%"):
+                new_cells.append((session_id, cmd))
+                if len(new_cells) == self.maxlen:
+                    break
+
+        self._cells.extend(reversed(new_cells))
+        self._next = max(end, 1)
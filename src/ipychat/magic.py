@@ -1,16 +1,34 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
 from IPython.core.magic import Magics, line_magic, magics_class
 from rich.console import Console
-from traitlets import Bool
+from rich.table import Table
+from traitlets import Bool, Float
 from traitlets.config.configurable import Configurable
 
+from . import results
+from .cache import ResponseCache, make_cache_key
+from .cancel import StreamCancelled
 from .config import load_config, save_config
-from .context import get_context_for_variables
+from .context import VariableSummaryCache, get_variable_summaries
+from .history import HistoryBuffer
+from .metrics import METRICS, MetricsLog, RequestTimer
 from .models import AVAILABLE_MODELS, get_model_by_name
-from .providers import get_provider
+from .prompt import (
+    HISTORY_WINDOW,
+    SYSTEM_PROMPT,
+    build_user_content,
+    get_token_budget,
+)
+from .providers import get_pool_stats, get_provider
+from .providers.hedge import HedgedProvider
+from .session import ChatSession, Message
 from .ui import display_model_table, select_with_arrows
+from .warmup import IDLE_TIMEOUT, KEEPALIVE_INTERVAL, KeepAlive
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,21 +36,172 @@ logger = logging.getLogger(__name__)
 
 console = Console()
 
+ASK_FLAGS = {"no-cache", "bg", "new"}
+
+
+def split_flags(line: str, flags: Iterable[str]) -> Tuple[Set[str], str]:
+    """Split known leading `--flag` options from the rest of a magic line."""
+    found = set()
+    rest = line.strip()
+    while rest.startswith("--"):
+        flag, _, remainder = rest.partition(" ")
+        if flag[2:] not in flags:
+            break
+        found.add(flag[2:])
+        rest = remainder.strip()
+    return found, rest
+
 
 @magics_class
 class IPyChatMagics(Magics, Configurable):
     debug = Bool(False, help="Start ipychat in debug mode").tag(config=True)
+    warmup = Bool(
+        False,
+        help="Open the provider connection in the background on load, and "
+        "keep it alive with periodic pings",
+    ).tag(config=True)
+    keepalive_interval = Float(
+        KEEPALIVE_INTERVAL, help="Seconds between keep-alive pings"
+    ).tag(config=True)
+    keepalive_idle_timeout = Float(
+        IDLE_TIMEOUT, help="Stop keep-alive pings after this many idle seconds"
+    ).tag(config=True)
 
     def __init__(self, shell):
         Magics.__init__(self, shell)
         Configurable.__init__(self, config=shell.config)
         self._config = load_config()
         self.provider = get_provider(self._config, self.debug)
+        self.cache = ResponseCache.from_config(self._config)
+        self.summary_cache = VariableSummaryCache()
+        self.history = HistoryBuffer(HISTORY_WINDOW)
+        self.metrics = MetricsLog.from_config(self._config)
+        self.session = ChatSession.from_config(self._config)
+        # held while reading or recording the session, cache and metrics, since
+        # background queries finish on their own threads
+        self._lock = threading.Lock()
+        self.keepalive: Optional[KeepAlive] = None
+        self.shell.events.register("post_run_cell", self._post_run_cell)
+
+    def start_keepalive(self) -> None:
+        """Warm up the provider connection and keep it alive in the background."""
+        self.keepalive = KeepAlive(
+            self.provider, self.keepalive_interval, self.keepalive_idle_timeout
+        )
+        self.keepalive.start()
+
+    def _post_run_cell(self, result):
+        """Track history and namespace changes, and report background requests."""
+        self.history.sync(self.shell.history_manager.input_hist_raw)
+        raw_cell = getattr(result.info, "raw_cell", None)
+        if raw_cell:
+            self.summary_cache.invalidate_cell(self.shell.transform_cell(raw_cell))
+
+        status = results.store.status_line()
+        if status:
+            console.print(f"[dim]ipychat: {status}[/dim]")
 
     @line_magic
     def ask(self, line):
-        """Line magic for quick questions."""
-        return self._handle_query(line)
+        """Line magic for quick questions.
+
+        Usage: %ask [--no-cache] [--bg] [--new] <question>
+
+        Questions continue the current conversation, --new starts a fresh
+        one. With --bg the request runs in the background and a handle is
+        returned immediately. Answers are kept in `ipychat.results`.
+        """
+        flags, query = split_flags(line, ASK_FLAGS)
+        return self._handle_query(
+            query,
+            use_cache="no-cache" not in flags,
+            background="bg" in flags,
+            new_session="new" in flags,
+        )
+
+    @line_magic
+    def ask_cache(self, line):
+        """Show response cache statistics, or clear the cache.
+
+        Usage: %ask_cache [clear]
+        """
+        if self.cache is None:
+            print("Response cache is disabled.")
+            return
+
+        if line.strip() == "clear":
+            self.cache.clear()
+            print("Response cache cleared.")
+            return
+
+        stats = self.cache.stats()
+        print(f"Hits: {stats['hits']}")
+        print(f"Misses: {stats['misses']}")
+        print(f"Memory entries: {stats['memory_entries']}")
+        print(f"Disk entries: {stats['disk_entries']}")
+        print(f"Disk size: {stats['disk_bytes'] / 1024:.1f} KiB")
+        print(f"Location: {stats['path']}")
+
+    @line_magic
+    def ask_stats(self, line):
+        """Show latency percentiles of the %ask requests in this session.
+
+        Usage: %ask_stats [clear]
+        """
+        if line.strip() == "clear":
+            self.metrics.clear()
+            print("Request metrics cleared.")
+            return
+
+        records = self.metrics.records
+        cached = sum(record["cached"] for record in records)
+        print(f"Requests: {len(records)} ({cached} answered from cache)")
+        summary = self.metrics.summary()
+        if not summary:
+            return
+
+        table = Table(title="Uncached requests")
+        table.add_column("Metric")
+        for column in ("p50", "p90", "p99", "max"):
+            table.add_column(column, justify="right")
+        for name, label, unit in METRICS:
+            if name in summary:
+                values = summary[name]
+                fmt = "{:.3f}" if unit == "s" else "{:.0f}"
+                table.add_row(
+                    f"{label} ({unit})",
+                    *(fmt.format(values[c]) for c in ("p50", "p90", "p99", "max")),
+                )
+        console.print(table)
+
+        table = Table(title="Median by model")
+        table.add_column("Model")
+        table.add_column("Requests", justify="right")
+        table.add_column("First token (s)", justify="right")
+        table.add_column("Tokens/s", justify="right")
+        table.add_column("Total (s)", justify="right")
+        for model, values in self.metrics.by_model().items():
+            table.add_row(
+                model,
+                str(values["count"]),
+                *(
+                    f"{values[name]:.2f}" if name in values else "-"
+                    for name in ("first_token", "tokens_per_second", "total")
+                ),
+            )
+        console.print(table)
+
+        if isinstance(self.provider, HedgedProvider) and self.provider.requests:
+            print(
+                f"Hedging: {self.provider.hedged} of {self.provider.requests} "
+                f"requests also sent to {self._config['hedge']['model']}, "
+                f"which answered {self.provider.secondary_wins}"
+            )
+        hit_rate = self.metrics.cache_hit_rate()
+        if hit_rate is not None:
+            print(f"Provider prompt cache: {hit_rate:.0%} of input tokens read")
+        if self.metrics.path is not None:
+            print(f"Metrics log: {self.metrics.path}")
 
     @line_magic
     def models(self, line):
@@ -48,6 +217,12 @@ class IPyChatMagics(Magics, Configurable):
             print(f"Temperature: {openai_config.get('temperature')}")
             print(f"Max tokens: {openai_config.get('max_tokens')}")
 
+        pool_stats = get_pool_stats()
+        print(
+            f"Client pool: {pool_stats['clients']} clients, "
+            f"{pool_stats['hits']} reused, {pool_stats['misses']} created"
+        )
+
         display_model_table()
         model_names = [m.name for m in AVAILABLE_MODELS]
         model_name = select_with_arrows(
@@ -65,33 +240,148 @@ class IPyChatMagics(Magics, Configurable):
 
             save_config(self._config)
             self.provider = get_provider(self._config, self.debug)
+            if self.keepalive is not None:
+                self.keepalive.touch(self.provider)
             print(f"Model changed to {model.name}")
         except ValueError as e:
             print(f"Error: {e}")
             return
 
-    def _handle_query(self, query: str):
+    def _handle_query(
+        self,
+        query: str,
+        use_cache: bool = True,
+        background: bool = False,
+        new_session: bool = False,
+    ):
         """Handle chat queries."""
-        context = get_context_for_variables(self.shell.user_ns, query)
+        if self.keepalive is not None:
+            self.keepalive.touch()
+        if new_session and self.session is not None:
+            with self._lock:
+                self.session.clear()
+
+        current = self._config.get("current", {})
+        provider_name = current.get("provider")
+        timer = RequestTimer(provider_name, current.get("model"))
 
-        history = []
-        for session_id in range(1, len(self.shell.history_manager.input_hist_raw)):
-            cmd = self.shell.history_manager.input_hist_raw[session_id]
-            if cmd.strip() and not cmd.startswith("%"):
-                history.append(f"In [{session_id}]: {cmd}")
+        with timer.stage("history"):
+            self.history.sync(self.shell.history_manager.input_hist_raw)
+            history = self.history.cells
+        with timer.stage("context"):
+            variables = get_variable_summaries(
+                self.shell.user_ns, query, self.summary_cache, self.history.sources
+            )
 
-        system_prompt = f"You are a helpful principal engineer and an experienced principal data scientist with access to the current IPython environment. Give your responses in richly formatted markdown and make it concise."
-        user_content = f"Recent IPython history:\n{'\n'.join(history[-10:])}\n\nContext:\n{context}\n\nQuestion: {query} \n"
+        system_prompt = SYSTEM_PROMPT
+        messages = []
+        budget = get_token_budget(self._config)
+        if self.session is not None:
+            # follow-ups only send what the earlier turns didn't
+            with self._lock:
+                variables, history = self.session.unsent(variables, history)
+                messages = self.session.messages()
+                budget -= self.session.tokens(provider_name)
+
+        with timer.stage("prompt"):
+            user_content = build_user_content(
+                query,
+                variables,
+                history,
+                budget=budget,
+                provider=provider_name,
+                system_prompt=system_prompt,
+            )
         if self.debug:
             logger.info(f"user_content: {user_content}")  # Changed to INFO level
-        self.provider.stream_response(system_prompt, user_content)
+
+        cache_key = None
+        cached = None
+        if use_cache and self.cache is not None:
+            cache_key = make_cache_key(
+                provider_name,
+                current.get("model"),
+                self.provider.generation_params(),
+                system_prompt,
+                user_content,
+                messages,
+            )
+            cached = self.cache.get(cache_key)
+
+        def finish(response: str, usage: Optional[Dict[str, int]] = None) -> None:
+            record = timer.record(system_prompt, user_content, response, usage)
+            with self._lock:
+                self.metrics.add(record)
+                if cache_key is not None and cached is None and response:
+                    self.cache.put(cache_key, response)
+                if self.session is not None:
+                    self.session.add_turn(
+                        query, user_content, response, variables, history
+                    )
+
+        if background:
+            return self._submit_query(
+                query, system_prompt, user_content, messages, cached, timer, finish
+            )
+
+        if cached is not None:
+            timer.cached = True
+            with timer.stage("stream"):
+                self.provider.render_stream(timer.watch([cached]))
+            finish(cached)
+            return None
+
+        try:
+            response = self.provider.stream_response(
+                system_prompt, user_content, timer, messages
+            )
+        except StreamCancelled as e:
+            result = results.store.record(query, e.partial, e)
+            console.print(
+                f"[yellow]{e}. The partial answer is kept as "
+                f"ipychat.results.get({result.id}).[/yellow]"
+            )
+            return None
+        if isinstance(response, str):
+            finish(response, self.provider.last_usage)
         return None
 
+    def _submit_query(
+        self,
+        query: str,
+        system_prompt: str,
+        user_content: str,
+        messages: List[Message],
+        cached: Optional[str],
+        timer: RequestTimer,
+        finish: Callable[[str, Optional[Dict[str, int]]], None],
+    ) -> Optional[results.AskResult]:
+        """Run a query on a background thread and return its handle."""
+        timer.background = True
+        provider = self.provider
+
+        def on_done(result: results.AskResult) -> None:
+            if result.status == "done":
+                finish(result.text, provider.last_usage if cached is None else None)
+
+        if cached is not None:
+            timer.cached = True
+            return results.submit(query, lambda: timer.watch([cached]), on_done)
+
+        if provider.client is None:
+            provider.stream_response(system_prompt, user_content)
+            return None
+
+        chunks = provider.open_stream(system_prompt, user_content, messages)
+        return results.submit(
+            query, lambda: timer.watch(chunks), on_done, cancel=chunks.cancel
+        )
+
 
 def load_ipython_extension(ipython):
     """Load the extension in IPython."""
     # Check if any of our magics already exist
-    magic_names = ["ask", "models"]
+    magic_names = ["ask", "ask_cache", "ask_stats", "models"]
     existing_magics = [
         name for name in magic_names if name in ipython.magics_manager.magics["line"]
     ]
@@ -102,4 +392,7 @@ def load_ipython_extension(ipython):
         )
         console.print("They will be overridden by ipychat.[/yellow]")
 
-    ipython.register_magics(IPyChatMagics)
\ No newline at end of file
+    magics = IPyChatMagics(ipython)
+    ipython.register_magics(magics)
+    if magics.warmup:
+        magics.start_keepalive()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .prompt import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_RECORDS = 1000
+
+# name, label and unit of each reported metric, in display order
+METRICS = [
+    ("context", "Context build", "s"),
+    ("history", "History assembly", "s"),
+    ("prompt", "Prompt packing", "s"),
+    ("dispatch", "Request dispatch", "s"),
+    ("first_token", "Time to first token", "s"),
+    ("tokens_per_second", "Tokens per second", "tok/s"),
+    ("render", "Render", "s"),
+    ("total", "Total", "s"),
+    ("prompt_tokens", "Prompt size", "tok"),
+    ("response_tokens", "Response size", "tok"),
+    ("input_tokens", "Input tokens (provider)", "tok"),
+    ("cache_read_tokens", "Cache read tokens", "tok"),
+    ("cache_write_tokens", "Cache write tokens", "tok"),
+]
+
+
+class RequestTimer:
+    """Timings of one %ask request.
+
+    Stages are timed with `stage()`, and the response chunks are passed
+    through `watch()` to time the first token and the streaming rate.
+    """
+
+    def __init__(self, provider: Optional[str] = None, model: Optional[str] = None):
+        self.provider = provider
+        self.model = model
+        self.cached = False
+        self.background = False
+        self.chunks = 0
+        self.timings: Dict[str, float] = {}
+        self.started = time.perf_counter()
+        self._dispatched: Optional[float] = None
+        self._first_chunk: Optional[float] = None
+        self._last_chunk: Optional[float] = None
+        self._waiting = 0.0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def watch(self, chunks: Iterable[str]) -> Iterator[str]:
+        """Yield the chunks, recording when they arrive."""
+        self._dispatched = time.perf_counter()
+        iterator = iter(chunks)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    content = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    now = time.perf_counter()
+                    self._waiting += now - start
+                if self._first_chunk is None:
+                    self._first_chunk = now
+                self._last_chunk = now
+                self.chunks += 1
+                yield content
+        finally:
+            # release the stream when the consumer stops early
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def record(
+        self,
+        system_prompt: str,
+        user_content: str,
+        response: str,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> dict:
+        """Return the metrics of the finished request.
+
+        `usage` holds the token counts reported by the provider, if any.
+        """
+        total = time.perf_counter() - self.started
+        record: Dict[str, Any] = {
+            "timestamp": time.time(),
+            "provider": self.provider,
+            "model": self.model,
+            "cached": self.cached,
+            "background": self.background,
+            **{name: round(value, 6) for name, value in self.timings.items()},
+            "total": round(total, 6),
+            "prompt_chars": len(system_prompt) + len(user_content),
+            "prompt_tokens": estimate_tokens(system_prompt)
+            + estimate_tokens(user_content),
+            "response_chars": len(response),
+            "response_tokens": estimate_tokens(response),
+            "chunks": self.chunks,
+            **(usage or {}),
+        }
+
+        if self._first_chunk is not None:
+            record["dispatch"] = round(self._first_chunk - self._dispatched, 6)
+            record["first_token"] = round(self._first_chunk - self.started, 6)
+            streaming = self._last_chunk - self._first_chunk
+            if streaming > 0:
+                record["tokens_per_second"] = round(
+                    record["response_tokens"] / streaming, 2
+                )
+
+        if "stream" in self.timings:
+            # time spent on the display rather than waiting for the provider
+            record["render"] = round(max(self.timings["stream"] - self._waiting, 0), 6)
+        return record
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the q-th percentile of values, interpolating between ranks."""
+    ordered = sorted(values)
+    if not ordered:
+        raise ValueError("percentile of an empty sequence")
+
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class MetricsLog:
+    """Metrics of the requests in this session, optionally appended to a JSONL file."""
+
+    def __init__(self, path: Optional[Path] = None, max_records: int = MAX_RECORDS):
+        self.path = path
+        self._records: Deque[dict] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "MetricsLog":
+        log_file = config.get("metrics", {}).get("log_file")
+        return cls(Path(log_file).expanduser() if log_file else None)
+
+    @property
+    def records(self) -> List[dict]:
+        with self._lock:
+            return list(self._records)
+
+    def add(self, record: dict) -> None:
+        with self._lock:
+            self._records.append(record)
+
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock, open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def summary(
+        self, quantiles: Sequence[float] = (50, 90, 99)
+    ) -> Dict[str, Dict[str, float]]:
+        """Return the percentiles of each metric over uncached requests."""
+        records = [record for record in self.records if not record["cached"]]
+        summary = {}
+        for name, _, _ in METRICS:
+            values = [record[name] for record in records if name in record]
+            if values:
+                summary[name] = {f"p{q:g}": percentile(values, q) for q in quantiles}
+                summary[name]["max"] = max(values)
+                summary[name]["count"] = len(values)
+        return summary
+
+    def cache_hit_rate(self) -> Optional[float]:
+        """Return the share of provider input tokens read from its prompt cache."""
+        records = [
+            record
+            for record in self.records
+            if not record["cached"] and "cache_read_tokens" in record
+        ]
+        input_tokens = sum(record["input_tokens"] for record in records)
+        if not input_tokens:
+            return None
+        return sum(record["cache_read_tokens"] for record in records) / input_tokens
+
+    def by_model(self) -> Dict[str, Dict[str, float]]:
+        """Return the median latencies of uncached requests for each model."""
+        groups: Dict[str, List[dict]] = {}
+        for record in self.records:
+            if not record["cached"]:
+                key = f"{record['provider']}/{record['model']}"
+                groups.setdefault(key, []).append(record)
+
+        result = {}
+        for key, records in groups.items():
+            result[key] = {"count": len(records)}
+            for name in ("first_token", "tokens_per_second", "total"):
+                values = [record[name] for record in records if name in record]
+                if values:
+                    result[key][name] = percentile(values, 50)
+        return result
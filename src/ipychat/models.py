@@ -12,13 +12,35 @@ class ModelConfig:
     provider: str
     default_max_tokens: Optional[int] = None
     default_temperature: Optional[float] = None
+    context_window: Optional[int] = None
 
 
 AVAILABLE_MODELS = [
-    ModelConfig("gpt-4o", "openai", default_max_tokens=2000, default_temperature=0.7),
-    ModelConfig("anthropic--claude-3.5-sonnet", "sapgenaihub"),
-    ModelConfig("claude-3-5-sonnet-20241022", "anthropic"),
-    ModelConfig("gemini-1.5-flash", "google", default_temperature=0.7),
+    ModelConfig(
+        "gpt-4o",
+        "openai",
+        default_max_tokens=2000,
+        default_temperature=0.7,
+        context_window=128_000,
+    ),
+    ModelConfig(
+        "anthropic--claude-3.5-sonnet",
+        "sapgenaihub",
+        default_max_tokens=256,
+        context_window=200_000,
+    ),
+    ModelConfig(
+        "claude-3-5-sonnet-20241022",
+        "anthropic",
+        default_max_tokens=4000,
+        context_window=200_000,
+    ),
+    ModelConfig(
+        "gemini-1.5-flash",
+        "google",
+        default_temperature=0.7,
+        context_window=1_048_576,
+    ),
 ]
 
 
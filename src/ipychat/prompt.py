@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import get_model_by_name
+
+SYSTEM_PROMPT = "You are a helpful principal engineer and an experienced principal data scientist with access to the current IPython environment. Give your responses in richly formatted markdown and make it concise."
+
+# Average characters per token, a fast offline stand-in for each tokenizer
+CHARS_PER_TOKEN = {
+    "openai": 4.0,
+    "anthropic": 3.5,
+    "google": 4.0,
+    "sapgenaihub": 3.5,
+}
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+DEFAULT_CONTEXT_TOKENS = 16000
+DEFAULT_OUTPUT_TOKENS = 4000
+HISTORY_WINDOW = 30
+RECENT_CELLS = 10
+MIN_TRUNCATED_TOKENS = 32
+TRUNCATED = "\n... (truncated)"
+
+# Sections of the user content, from the most to the least stable, so
+# providers can cache the prompt prefix across turns
+PROMPT_SECTIONS = [
+    "Context:\n{context}\n\n",
+    "Earlier IPython history:\n{older}\n\n",
+    "Recent IPython history:\n{recent}\n\nQuestion: {query} \n",
+]
+
+
+def estimate_tokens(text: str, provider: Optional[str] = None) -> int:
+    """Estimate how many tokens `text` takes for the given provider."""
+    chars_per_token = CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+    return math.ceil(len(text) / chars_per_token)
+
+
+def truncate_to_tokens(text: str, tokens: int, provider: Optional[str] = None) -> str:
+    """Cut `text` down to roughly `tokens` tokens."""
+    if estimate_tokens(text, provider) <= tokens:
+        return text
+    chars_per_token = CHARS_PER_TOKEN.get(provider, DEFAULT_CHARS_PER_TOKEN)
+    keep = max(0, int(tokens * chars_per_token) - len(TRUNCATED))
+    return text[:keep] + TRUNCATED
+
+
+def get_token_budget(config: Dict[str, Any]) -> int:
+    """Return how many prompt tokens a query may use with the current model.
+
+    The budget is the configured `context.max_tokens`, capped by the model's
+    context window minus the tokens reserved for its answer.
+    """
+    current = config.get("current", {})
+    provider = current.get("provider")
+    budget = config.get("context", {}).get("max_tokens", DEFAULT_CONTEXT_TOKENS)
+
+    try:
+        model = get_model_by_name(current.get("model"))
+    except ValueError:
+        return budget
+
+    if model.context_window:
+        reserved = (
+            config.get(provider, {}).get("max_tokens")
+            or model.default_max_tokens
+            or DEFAULT_OUTPUT_TOKENS
+        )
+        budget = min(budget, model.context_window - reserved)
+    return budget
+
+
+def _fill(
+    pieces: List[str],
+    remaining: int,
+    provider: Optional[str],
+    truncate: bool,
+    contiguous: bool,
+) -> Tuple[List[str], int]:
+    """Take pieces in order while they fit in `remaining` tokens.
+
+    A piece that doesn't fit is truncated if `truncate` is set. Otherwise it
+    is skipped, or ends the fill if the pieces must stay `contiguous`.
+    """
+    packed = []
+    for piece in pieces:
+        tokens = estimate_tokens(piece, provider) + 1
+        if tokens <= remaining:
+            packed.append(piece)
+            remaining -= tokens
+        elif truncate and remaining > MIN_TRUNCATED_TOKENS:
+            packed.append(truncate_to_tokens(piece, remaining - 1, provider))
+            remaining = 0
+        elif contiguous:
+            break
+    return packed, remaining
+
+
+def build_user_content(
+    query: str,
+    variables: List[str],
+    history: List[str],
+    budget: int,
+    provider: Optional[str] = None,
+    system_prompt: str = SYSTEM_PROMPT,
+) -> str:
+    """Pack the query, variable summaries and history cells into `budget` tokens.
+
+    Pieces are added by priority: the query, then the summaries of the
+    mentioned variables, then the most recent history cells, then older
+    cells. Variables and recent cells are truncated to fit the remaining
+    budget, older cells are dropped.
+
+    The packed pieces are laid out in `PROMPT_SECTIONS` order, with the
+    variables sorted, so that follow-up questions share the longest
+    possible prefix.
+    """
+    template = "".join(PROMPT_SECTIONS)
+    remaining = budget - estimate_tokens(system_prompt, provider)
+    remaining -= estimate_tokens(
+        template.format(context="", older="", recent="", query=query), provider
+    )
+
+    context, remaining = _fill(
+        variables, remaining, provider, truncate=True, contiguous=False
+    )
+
+    history = history[-HISTORY_WINDOW:]
+    recent = history[-RECENT_CELLS:][::-1]
+    older = history[:-RECENT_CELLS][::-1]
+    recent, remaining = _fill(
+        recent, remaining, provider, truncate=True, contiguous=True
+    )
+    older, remaining = _fill(
+        older, remaining, provider, truncate=False, contiguous=True
+    )
+
+    return template.format(
+        context="\n".join(sorted(context)),
+        older="\n".join(older[::-1]),
+        recent="\n".join(recent[::-1]),
+        query=query,
+    )
+
+
+def build_shell_content(
+    query: str,
+    inputs: List[Tuple[str, str]],
+    budget: int,
+    provider: Optional[str] = None,
+    system_prompt: str = SYSTEM_PROMPT,
+) -> str:
+    """Pack a question asked from the shell and its inputs into `budget` tokens.
+
+    `inputs` are `(name, text)` pairs, such as files and piped stdin. They
+    are truncated in order to fit the remaining budget, and inputs that
+    don't fit at all are dropped.
+    """
+    question = f"Question: {query}\n"
+    remaining = budget - estimate_tokens(system_prompt, provider)
+    remaining -= estimate_tokens(question, provider)
+
+    sections = []
+    for name, text in inputs:
+        header = f"{name}:\n"
+        available = remaining - estimate_tokens(header, provider)
+        if available < MIN_TRUNCATED_TOKENS:
+            break
+        text = truncate_to_tokens(text, available, provider)
+        remaining = available - estimate_tokens(text, provider)
+        sections.append(f"{header}{text}\n\n")
+    return "".join(sections) + question
+
+
+def split_prompt(user_content: str) -> List[str]:
+    """Split user content built by `build_user_content` into its sections.
+
+    The sections join back into `user_content`. Content that doesn't follow
+    the layout is returned as a single section.
+    """
+    headers = [section.partition("{")[0] for section in PROMPT_SECTIONS]
+    if not user_content.startswith(headers[0]):
+        return [user_content]
+
+    starts = [0]
+    for header in headers[1:]:
+        start = user_content.find("\n\n" + header, starts[-1])
+        if start == -1:
+            return [user_content]
+        starts.append(start + 2)
+
+    ends = starts[1:] + [len(user_content)]
+    return [user_content[start:end] for start, end in zip(starts, ends)]
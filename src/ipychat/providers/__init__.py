@@ -1,28 +1,82 @@
 # -*- coding: utf-8 -*-
 
+from importlib import import_module
+from importlib.metadata import entry_points
 from typing import Any, Dict, Type
 
-from .anthropic import AnthropicProvider
 from .base import BaseProvider
-from .google import GoogleProvider
-from .openai import OpenAIProvider
-from .sapgenaihub import SAPGenAIHubProvider
-
-PROVIDER_MAP = {
-    "openai": OpenAIProvider,
-    "anthropic": AnthropicProvider,
-    "google": GoogleProvider,
-    "sapgenaihub": SAPGenAIHubProvider,
+from .hedge import DEFAULT_QUANTILE, HedgedProvider, secondary_config
+from .pool import client_pool
+
+ENTRY_POINT_GROUP = "ipychat.providers"
+
+PROVIDER_REGISTRY = {
+    "openai": "ipychat.providers.openai:OpenAIProvider",
+    "anthropic": "ipychat.providers.anthropic:AnthropicProvider",
+    "google": "ipychat.providers.google:GoogleProvider",
+    "sapgenaihub": "ipychat.providers.sapgenaihub:SAPGenAIHubProvider",
 }
 
+_entry_points_loaded = False
+
+
+def register_provider(name: str, path: str) -> None:
+    """Register a provider class by its dotted `module:Class` import path."""
+    PROVIDER_REGISTRY[name] = path
+
+
+def _load_entry_points() -> None:
+    """Add providers advertised by installed packages to the registry."""
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    try:
+        group = entry_points(group=ENTRY_POINT_GROUP)
+    except TypeError:
+        # Python 3.9 returns a dict keyed by group
+        group = entry_points().get(ENTRY_POINT_GROUP, [])
+
+    for entry_point in group:
+        PROVIDER_REGISTRY.setdefault(entry_point.name, entry_point.value)
+
+
+def get_provider_class(provider_name: str) -> Type[BaseProvider]:
+    """Import and return the provider class registered under `provider_name`."""
+    if provider_name not in PROVIDER_REGISTRY:
+        _load_entry_points()
+
+    path = PROVIDER_REGISTRY.get(provider_name)
+    if not path:
+        raise ValueError(f"Unknown provider: {provider_name}")
+
+    module_name, _, class_name = path.partition(":")
+    return getattr(import_module(module_name), class_name)
+
 
 def get_provider(config: Dict[str, Any], debug: bool = True) -> BaseProvider:
-    """Get the appropriate provider based on configuration."""
+    """Get the appropriate provider based on configuration.
+
+    When `hedge.model` is set, slow requests are hedged with that model.
+    """
     provider_name = config.get("current", {}).get("provider", "openai")
-    provider_class = PROVIDER_MAP.get(provider_name)
-    if not provider_class:
-        raise ValueError(f"Unknown provider: {provider_name}")
+    provider = get_provider_class(provider_name)(config, debug)
+
+    hedge = config.get("hedge", {})
+    if hedge.get("model"):
+        secondary = secondary_config(config)
+        provider = HedgedProvider(
+            provider,
+            get_provider_class(secondary["current"]["provider"])(secondary, debug),
+            delay=hedge.get("delay", 0),
+            quantile=hedge.get("quantile", DEFAULT_QUANTILE),
+        )
 
-    provider = provider_class(config, debug)
     provider.initialize_client()
     return provider
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return statistics of the shared provider client pool."""
+    return client_pool.stats()
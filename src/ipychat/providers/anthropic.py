@@ -1,13 +1,59 @@
 # -*- coding: utf-8 -*-
 
-from typing import Generator
+from typing import Any, AsyncIterator, Dict, Generator, List, Optional
 
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 
+from ..cancel import closing_stream
+from ..scheduler import report_response
+from ..prompt import split_prompt
+from ..session import Message
 from .base import BaseProvider
+from .pool import client_pool
+
+
+CACHE_CONTROL = {"type": "ephemeral"}
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+
+def _update_usage(usage: Dict[str, int], event: Any) -> None:
+    """Collect token counts from message_start and message_delta events."""
+    source = getattr(event, "usage", None)
+    if event.type == "message_start":
+        source = getattr(event.message, "usage", None)
+
+    for name in USAGE_FIELDS:
+        value = getattr(source, name, None)
+        if isinstance(value, int):
+            usage[name] = value
+
+
+def _normalize_usage(usage: Dict[str, int]) -> Dict[str, int]:
+    """Return usage in the provider-neutral keys of `BaseProvider.last_usage`.
+
+    Anthropic counts cached prompt tokens separately from `input_tokens`,
+    they are added back so input tokens cover the whole prompt.
+    """
+    if not usage:
+        return {}
+    cache_read = usage.get("cache_read_input_tokens", 0)
+    cache_write = usage.get("cache_creation_input_tokens", 0)
+    return {
+        "input_tokens": usage.get("input_tokens", 0) + cache_read + cache_write,
+        "output_tokens": usage.get("output_tokens", 0),
+        "cache_read_tokens": cache_read,
+        "cache_write_tokens": cache_write,
+    }
 
 
 class AnthropicProvider(BaseProvider):
+    supports_history = True
+
     def initialize_client(self) -> None:
         api_key = self.config.get("anthropic", {}).get("api_key")
         if api_key is None or api_key == "":
@@ -17,34 +63,101 @@ class AnthropicProvider(BaseProvider):
             self.client = None
             return
 
-        self.client = Anthropic(api_key=api_key)
+        base_url = self.config.get("anthropic", {}).get("base_url")
+        self.client = client_pool.get(
+            "anthropic",
+            api_key,
+            base_url,
+            # retries are left to the request scheduler
+            lambda: Anthropic(api_key=api_key, base_url=base_url, max_retries=0),
+        )
+        self.async_client = AsyncAnthropic(
+            api_key=api_key, base_url=base_url, max_retries=0
+        )
         self.model = self.config["current"]["model"]
         self.max_tokens = self.config.get("anthropic", {}).get("max_tokens", 4000)
 
-    def stream_chat(
-        self, system_prompt: str, user_content: str
-    ) -> Generator[str, None, None]:
-        messages = [
+    def _request(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> Dict[str, Any]:
+        # cache breakpoints after the system prompt, the earlier turns and
+        # each stable section, the last section changes with every question
+        messages: List[Dict[str, Any]] = [dict(message) for message in history or []]
+        if messages:
+            messages[-1]["content"] = [
+                {
+                    "type": "text",
+                    "text": messages[-1]["content"],
+                    "cache_control": CACHE_CONTROL,
+                }
+            ]
+
+        sections = split_prompt(user_content)
+        content = [
+            {"type": "text", "text": section, "cache_control": CACHE_CONTROL}
+            for section in sections[:-1]
+        ]
+        content.append({"type": "text", "text": sections[-1]})
+        messages.append(
             {
                 "role": "user",
-                "content": user_content,
+                "content": content,
             }
-        ]
+        )
+
+        return {
+            "model": self.model,
+            "system": [
+                {"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}
+            ],
+            "messages": messages,
+            "max_tokens": self.max_tokens,
+            "stream": True,
+        }
 
+    def stream_chat(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> Generator[str, None, None]:
         response = self.client.messages.create(
-            model=self.model,
-            system=system_prompt,
-            messages=messages,
-            max_tokens=self.max_tokens,
-            stream=True,
+            **self._request(system_prompt, user_content, history)
+        )
+        report_response(response)
+
+        usage: Dict[str, int] = {}
+        with closing_stream(response):
+            for chunk in response:
+                if hasattr(chunk, "type"):
+                    if chunk.type == "content_block_delta":
+                        yield chunk.delta.text
+                    elif chunk.type in ("message_start", "message_delta"):
+                        _update_usage(usage, chunk)
+                    elif chunk.type == "error":
+                        print(f"Error: {chunk}")
+                        break
+        self.last_usage = _normalize_usage(usage)
+
+    async def astream_chat(
+        self, system_prompt: str, user_content: str
+    ) -> AsyncIterator[str]:
+        response = await self.async_client.messages.create(
+            **self._request(system_prompt, user_content)
         )
+        report_response(response)
 
-        for chunk in response:
+        usage: Dict[str, int] = {}
+        async for chunk in response:
             if hasattr(chunk, "type"):
                 if chunk.type == "content_block_delta":
                     yield chunk.delta.text
-                elif chunk.type == "message_delta":
-                    continue
+                elif chunk.type in ("message_start", "message_delta"):
+                    _update_usage(usage, chunk)
                 elif chunk.type == "error":
                     print(f"Error: {chunk}")
                     break
+        self.last_usage = _normalize_usage(usage)
@@ -1,19 +1,59 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Generator
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
 
 from rich.console import Console
 from rich.live import Live
 from rich.markdown import Markdown as RichMarkdown
 from rich.panel import Panel
 
+from ..cancel import GuardedStream, StreamCancelled, get_deadlines, guard_async
+from ..metrics import RequestTimer
+from ..prompt import estimate_tokens
+from ..render import (
+    JUPYTER_REFRESH_INTERVAL,
+    JupyterDisplay,
+    MarkdownStream,
+    RefreshPace,
+    coalesce,
+)
+from ..scheduler import Scheduler, get_scheduler
+from ..session import Message
+
+WARMUP_TIMEOUT = 10.0
+
 
 class BaseProvider(ABC):
+    # whether `stream_chat` accepts the earlier turns as `history`
+    supports_history = False
+
     def __init__(self, config: Dict[str, Any], debug: bool = True):
         self.config = config
         self.debug = debug
         self.console = Console()
+        # token usage of the last finished stream, with the keys input_tokens,
+        # output_tokens, cache_read_tokens and cache_write_tokens
+        self.last_usage: Dict[str, int] = {}
+        self.deadlines = get_deadlines(config)
+        self.pace = (
+            RefreshPace(min_interval=JUPYTER_REFRESH_INTERVAL)
+            if self.console.is_jupyter
+            else RefreshPace()
+        )
+        self.scheduler: Optional[Scheduler] = get_scheduler(
+            config.get("current", {}).get("provider", "openai"), config
+        )
 
     @abstractmethod
     def initialize_client(self) -> None:
@@ -22,11 +62,128 @@ class BaseProvider(ABC):
 
     @abstractmethod
     def stream_chat(
-        self, system_prompt: str, user_content: str
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
     ) -> Generator[str, None, None]:
-        """Stream chat responses."""
+        """Stream chat responses.
+
+        `history` holds the earlier user and assistant messages of the
+        session, oldest first.
+        """
         pass
 
+    def stream_turn(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> Iterable[str]:
+        """Stream a reply to `user_content` following the `history` messages.
+
+        Providers that don't support message history get the earlier turns
+        inlined into the user content.
+        """
+        if not history:
+            return self.stream_chat(system_prompt, user_content)
+        if self.supports_history:
+            return self.stream_chat(system_prompt, user_content, history)
+
+        transcript = "\n\n".join(
+            f"{message['role'].capitalize()}: {message['content']}"
+            for message in history
+        )
+        return self.stream_chat(
+            system_prompt, f"Earlier conversation:\n{transcript}\n\n{user_content}"
+        )
+
+    def open_stream(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> GuardedStream:
+        """Start streaming a reply through the provider's request scheduler,
+        under the configured request deadlines."""
+
+        def request() -> Iterable[str]:
+            return self.stream_turn(system_prompt, user_content, history)
+
+        if self.scheduler is None:
+            chunks = request()
+        else:
+            chunks = self.scheduler.stream(
+                request, self.request_tokens(system_prompt, user_content, history)
+            )
+        return GuardedStream(chunks, **self.deadlines)
+
+    def aopen_stream(self, system_prompt: str, user_content: str) -> AsyncIterator[str]:
+        """Stream a reply asynchronously through the request scheduler,
+        under the configured request deadlines."""
+
+        def request() -> AsyncIterator[str]:
+            return self.astream_chat(system_prompt, user_content)
+
+        if self.scheduler is None:
+            chunks = request()
+        else:
+            chunks = self.scheduler.astream(
+                request, self.request_tokens(system_prompt, user_content)
+            )
+        return guard_async(chunks, **self.deadlines)
+
+    def request_tokens(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> int:
+        """Estimate the tokens a request counts against the provider's quota."""
+        provider = self.config.get("current", {}).get("provider")
+        prompt = [system_prompt, user_content]
+        prompt.extend(message["content"] for message in history or [])
+        return sum(estimate_tokens(text, provider) for text in prompt) + (
+            getattr(self, "max_tokens", None) or 0
+        )
+
+    async def astream_chat(
+        self, system_prompt: str, user_content: str
+    ) -> AsyncIterator[str]:
+        """Stream chat responses asynchronously.
+
+        Providers without an async client fall back to running `stream_chat`
+        in a worker thread, one chunk at a time.
+        """
+        done = object()
+        chunks = iter(self.stream_chat(system_prompt, user_content))
+        while True:
+            content = await asyncio.to_thread(next, chunks, done)
+            if content is done:
+                break
+            yield content
+
+    def warmup(self) -> None:
+        """Open a connection to the provider's endpoint before it is needed.
+
+        The default works for SDK clients that expose their `base_url` and
+        keep an httpx client in `_client`, as the OpenAI and Anthropic SDKs
+        do. Any response is fine, only the pooled connection matters.
+        """
+        http_client = getattr(self.client, "_client", None)
+        base_url = getattr(self.client, "base_url", None)
+        if http_client is None or base_url is None:
+            return
+        http_client.head(str(base_url), timeout=WARMUP_TIMEOUT)
+
+    def generation_params(self) -> Dict[str, Any]:
+        """Parameters that affect the generated response, besides the prompt."""
+        return {
+            name: getattr(self, name)
+            for name in ("max_tokens", "temperature")
+            if hasattr(self, name)
+        }
+
     def display_debug_info(self, system_prompt: str, user_content: str) -> None:
         """Display debug information before making API call."""
         if not self.debug:
@@ -52,18 +209,86 @@ class BaseProvider(ABC):
         )
         self.console.print()
 
-    def stream_response(self, system_prompt: str, user_content: str) -> None:
-        """Stream responses with live display."""
+    def stream_response(
+        self,
+        system_prompt: str,
+        user_content: str,
+        timer: Optional[RequestTimer] = None,
+        history: Optional[List[Message]] = None,
+    ) -> Optional[str]:
+        """Stream responses with live display and return the full response."""
         self.display_debug_info(system_prompt, user_content)
 
         if self.client is None:
             self.console.print(
                 f"[red]Set [bold]{self.config['current']['provider'].upper()}_API_KEY[/bold] in your environment, or run [bold]ipychat config[/bold].[/red]"
             )
-            return
+            return None
+
+        chunks = coalesce(
+            self.open_stream(system_prompt, user_content, history), self.pace
+        )
+        if timer is None:
+            return self.render_stream(chunks)
+        with timer.stage("stream"):
+            return self.render_stream(timer.watch(chunks))
+
+    def render_stream(self, chunks: Iterable[str]) -> str:
+        """Display streamed chunks as markdown and return the full text.
+
+        In Jupyter the answer streams through display handles, and when the
+        output isn't a terminal the chunks are written as plain text. Raises
+        StreamCancelled with the text received so far when the stream is
+        interrupted or misses a deadline.
+        """
+        if self.console.is_jupyter:
+            return self._render_stream(chunks, JupyterDisplay())
+        if not self.console.is_terminal:
+            return self._write_stream(chunks)
+
+        with Live(RichMarkdown(""), console=self.console, auto_refresh=False) as live:
+            return self._render_stream(chunks, live)
+
+    def _render_stream(
+        self, chunks: Iterable[str], live: Union[Live, JupyterDisplay]
+    ) -> str:
+        stream = MarkdownStream(live, self.pace)
+        try:
+            for content in chunks:
+                stream.feed(content)
+        except KeyboardInterrupt:
+            _close(chunks)
+            raise StreamCancelled("Interrupted", stream.text) from None
+        except StreamCancelled as e:
+            e.partial = stream.text
+            raise
+        finally:
+            stream.close()
+        return stream.text
+
+    def _write_stream(self, chunks: Iterable[str]) -> str:
+        """Write the chunks straight to the output, for pipes and logs."""
+        out = self.console.file
+        parts: List[str] = []
+        try:
+            for content in chunks:
+                parts.append(content)
+                out.write(content)
+                out.flush()
+        except KeyboardInterrupt:
+            _close(chunks)
+            raise StreamCancelled("Interrupted", "".join(parts)) from None
+        except StreamCancelled as e:
+            e.partial = "".join(parts)
+            raise
+        finally:
+            if parts and not parts[-1].endswith("\n"):
+                out.write("\n")
+            out.flush()
+        return "".join(parts)
+
 
-        full_response = ""
-        with Live(RichMarkdown(""), refresh_per_second=10) as live:
-            for content in self.stream_chat(system_prompt, user_content):
-                full_response += content
-                live.update(RichMarkdown(full_response))
+def _close(chunks: Iterable[str]) -> None:
+    close = getattr(chunks, "close", None)
+    if close is not None:
+        close()
@@ -1,13 +1,26 @@
 # -*- coding: utf-8 -*-
 
-from typing import Generator
+from typing import Any, AsyncIterator, Dict, Generator, List, Optional
 
 import google.generativeai as genai
 
+from ..cancel import closing_stream
+from ..session import Message
 from .base import BaseProvider
+from .pool import client_pool
+
+
+def _cancel(response: Any) -> None:
+    # the SDK keeps the streaming call in a private attribute, gRPC calls
+    # can be cancelled, other transports are released when dropped
+    cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+    if cancel is not None:
+        cancel()
 
 
 class GoogleProvider(BaseProvider):
+    supports_history = True
+
     def initialize_client(self) -> None:
         api_key = self.config.get("google", {}).get("api_key")
         if api_key is None or api_key == "":
@@ -17,29 +30,68 @@ class GoogleProvider(BaseProvider):
             self.client = None
             return
 
-        genai.configure(api_key=api_key)
-        self.client = genai.GenerativeModel(self.config["current"]["model"])
+        model = self.config["current"]["model"]
+
+        def create_client():
+            genai.configure(api_key=api_key)
+            return genai.GenerativeModel(model)
+
+        # each model keeps the transport it was created with
+        self.client = client_pool.get("google", api_key, model, create_client)
         self.temperature = self.config.get("google", {}).get("temperature", 0.7)
 
-    def stream_chat(
-        self, system_prompt: str, user_content: str
-    ) -> Generator[str, None, None]:
+    def warmup(self) -> None:
+        genai.get_model(self.client.model_name)
+
+    def _messages(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> List[Dict[str, Any]]:
+        # Gemini calls the assistant "model", and the system prompt leads the
+        # first user message
         messages = [
             {
-                "role": "user",
-                "parts": [f"{system_prompt}\n\n{user_content}"],
+                "role": "model" if message["role"] == "assistant" else "user",
+                "parts": [message["content"]],
             }
+            for message in history or []
         ]
+        messages.append({"role": "user", "parts": [user_content]})
+        messages[0]["parts"] = [f"{system_prompt}\n\n{messages[0]['parts'][0]}"]
+        return messages
 
+    def stream_chat(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> Generator[str, None, None]:
         response = self.client.generate_content(
-            messages,
+            self._messages(system_prompt, user_content, history),
+            stream=True,
+            generation_config=genai.types.GenerationConfig(
+                temperature=self.temperature
+            ),
+        )
+
+        with closing_stream(response, lambda: _cancel(response)):
+            for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+
+    async def astream_chat(
+        self, system_prompt: str, user_content: str
+    ) -> AsyncIterator[str]:
+        response = await self.client.generate_content_async(
+            self._messages(system_prompt, user_content),
             stream=True,
             generation_config=genai.types.GenerationConfig(
                 temperature=self.temperature
             ),
         )
 
-        for chunk in response:
+        async for chunk in response:
             if chunk.text:
                 yield chunk.text
-                yield chunk.text
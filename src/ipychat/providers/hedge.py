@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Generator, List, Optional, Set, Tuple
+
+from ..cancel import GuardedStream, on_cancel
+from ..config import resolve_api_key
+from ..metrics import percentile
+from ..models import get_model_by_name
+from ..session import Message
+from .base import BaseProvider
+
+DEFAULT_DELAY = 2.0
+DEFAULT_QUANTILE = 95
+MIN_SAMPLES = 5
+MAX_SAMPLES = 200
+POLL_INTERVAL = 0.01
+
+
+class LatencyHistory:
+    """Recent times to first token, keyed by `provider/model`."""
+
+    def __init__(self, max_samples: int = MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(key, deque(maxlen=self.max_samples))
+            samples.append(seconds)
+
+    def samples(self, key: str) -> List[float]:
+        with self._lock:
+            return list(self._samples.get(key, ()))
+
+    def threshold(self, key: str, quantile: float, default: float) -> float:
+        """Return the quantile of the samples, or `default` until there are enough."""
+        samples = self.samples(key)
+        if len(samples) < MIN_SAMPLES:
+            return default
+        return percentile(samples, quantile)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+# shared by all hedged providers, so switching models keeps what was learned
+latencies = LatencyHistory()
+# secondary models already reported as unavailable
+_warned: Set[str] = set()
+
+
+def provider_key(provider: BaseProvider) -> str:
+    current = provider.config.get("current", {})
+    return f"{current.get('provider')}/{current.get('model')}"
+
+
+def secondary_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the config of the `hedge` secondary model.
+
+    The provider is looked up from the model name unless `hedge.provider`
+    is set, and its API key may come from the environment.
+    """
+    hedge = config.get("hedge", {})
+    model = hedge["model"]
+    provider = hedge.get("provider") or get_model_by_name(model).provider
+    return {
+        **config,
+        "current": {"provider": provider, "model": model},
+        provider: {
+            **config.get(provider, {}),
+            "api_key": resolve_api_key(config, provider),
+        },
+    }
+
+
+class HedgedProvider(BaseProvider):
+    """Send a request to a secondary model too when the primary is slow.
+
+    If the primary hasn't sent its first token after `delay` seconds, or
+    after the `quantile` of its recent first-token latencies when `delay` is
+    0, the same prompt also goes to the secondary. Whichever starts
+    streaming first answers and the other request is cancelled. A primary
+    that fails before its first token fails over to the secondary at once.
+    """
+
+    supports_history = True
+
+    def __init__(
+        self,
+        primary: BaseProvider,
+        secondary: BaseProvider,
+        delay: float = 0,
+        quantile: float = DEFAULT_QUANTILE,
+        history: Optional[LatencyHistory] = None,
+    ):
+        super().__init__(primary.config, primary.debug)
+        self.primary = primary
+        self.secondary = secondary
+        self.delay = delay
+        self.quantile = quantile
+        self.latencies = history if history is not None else latencies
+        # the primary and the secondary schedule their own requests
+        self.scheduler = None
+        self.requests = 0
+        self.hedged = 0
+        self.secondary_wins = 0
+        self._lock = threading.Lock()
+
+    def initialize_client(self) -> None:
+        self.primary.initialize_client()
+        self.secondary.initialize_client()
+        self.client = self.primary.client
+
+        key = provider_key(self.secondary)
+        if self.secondary.client is None and key not in _warned:
+            _warned.add(key)
+            self.console.print(
+                f"[yellow]Hedging with {key} is off, its client could not be "
+                "created.[/yellow]"
+            )
+
+    def threshold(self) -> float:
+        """Seconds to wait for the primary's first token before hedging."""
+        if self.delay:
+            return self.delay
+        return self.latencies.threshold(
+            provider_key(self.primary), self.quantile, DEFAULT_DELAY
+        )
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def _race(
+        self,
+        streams: List[Tuple[BaseProvider, GuardedStream]],
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]],
+    ) -> Tuple[BaseProvider, GuardedStream]:
+        primary = streams[0]
+        if primary[1].arrived.wait(self.threshold()) and primary[1].error is None:
+            return primary
+        if self.secondary.client is None:
+            return primary
+
+        self._count(hedged=1)
+        streams.append(
+            (
+                self.secondary,
+                self.secondary.open_stream(system_prompt, user_content, history),
+            )
+        )
+        while True:
+            pending = []
+            for provider, stream in streams:
+                if stream.arrived.is_set():
+                    if stream.error is None:
+                        return provider, stream
+                elif not stream.cancelled:
+                    pending.append(stream)
+            if not pending:
+                # both failed, report the primary's error
+                return primary
+            pending[0].arrived.wait(POLL_INTERVAL)
+
+    def stream_chat(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> Generator[str, None, None]:
+        self._count(requests=1)
+        streams = [
+            (
+                self.primary,
+                self.primary.open_stream(system_prompt, user_content, history),
+            )
+        ]
+
+        def cancel() -> None:
+            for _, stream in list(streams):
+                stream.cancel()
+
+        on_cancel(cancel)
+        try:
+            provider, winner = self._race(streams, system_prompt, user_content, history)
+            for other, stream in streams:
+                if stream is not winner:
+                    stream.close()
+                    if other is self.primary and winner.latency is not None:
+                        # a lower bound, so a slow primary doesn't look fast
+                        self.latencies.add(
+                            provider_key(other), winner.arrived_at - stream.started
+                        )
+            if winner.latency is not None and winner.error is None:
+                self.latencies.add(provider_key(provider), winner.latency)
+            if provider is self.secondary:
+                self._count(secondary_wins=1)
+
+            yield from winner
+            self.last_usage = provider.last_usage
+        finally:
+            cancel()
+
+    def warmup(self) -> None:
+        self.primary.warmup()
+        if self.secondary.client is not None:
+            self.secondary.warmup()
+
+    def generation_params(self) -> Dict[str, Any]:
+        return self.primary.generation_params()
+
+    def display_debug_info(self, system_prompt: str, user_content: str) -> None:
+        self.primary.display_debug_info(system_prompt, user_content)
+
+    def aopen_stream(self, system_prompt: str, user_content: str):
+        return self.primary.aopen_stream(system_prompt, user_content)
+
+    async def astream_chat(self, system_prompt: str, user_content: str):
+        # batch jobs aren't latency sensitive, they use the primary only
+        async for content in self.primary.astream_chat(system_prompt, user_content):
+            yield content
@@ -1,13 +1,36 @@
 # -*- coding: utf-8 -*-
 
-from typing import Generator
+from typing import Any, AsyncIterator, Dict, Generator, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
+from ..cancel import closing_stream
+from ..scheduler import report_response
+from ..session import Message
 from .base import BaseProvider
+from .pool import client_pool
+
+
+def _normalize_usage(usage: Any) -> Dict[str, int]:
+    """Return usage in the provider-neutral keys of `BaseProvider.last_usage`.
+
+    OpenAI caches prompt prefixes automatically, cache hits are reported in
+    the prompt token details.
+    """
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "input_tokens": usage.prompt_tokens,
+        "output_tokens": usage.completion_tokens,
+        "cache_read_tokens": getattr(details, "cached_tokens", None) or 0,
+        "cache_write_tokens": 0,
+    }
 
 
 class OpenAIProvider(BaseProvider):
+    supports_history = True
+
     def initialize_client(self) -> None:
         api_key = self.config.get("openai", {}).get("api_key")
         if api_key is None or api_key == "":
@@ -17,33 +40,81 @@ class OpenAIProvider(BaseProvider):
             self.client = None
             return
 
-        self.client = OpenAI(api_key=api_key)
+        base_url = self.config.get("openai", {}).get("base_url")
+        self.client = client_pool.get(
+            "openai",
+            api_key,
+            base_url,
+            # retries are left to the request scheduler
+            lambda: OpenAI(api_key=api_key, base_url=base_url, max_retries=0),
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=api_key, base_url=base_url, max_retries=0
+        )
         self.model = self.config["current"]["model"]
         self.max_tokens = self.config.get("openai", {}).get("max_tokens", 2000)
         self.temperature = self.config.get("openai", {}).get("temperature", 0.7)
 
-    def stream_chat(
-        self, system_prompt: str, user_content: str
-    ) -> Generator[str, None, None]:
-        messages = [
+    def _messages(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> List[Dict[str, str]]:
+        return [
             {
                 "role": "system",
                 "content": system_prompt,
             },
+            *(history or []),
             {
                 "role": "user",
                 "content": user_content,
             },
         ]
 
+    def stream_chat(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
+    ) -> Generator[str, None, None]:
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=messages,
+            messages=self._messages(system_prompt, user_content, history),
+            stream=True,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            stream_options={"include_usage": True},
+        )
+        report_response(response)
+
+        usage = None
+        with closing_stream(response):
+            for chunk in response:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        self.last_usage = _normalize_usage(usage)
+
+    async def astream_chat(
+        self, system_prompt: str, user_content: str
+    ) -> AsyncIterator[str]:
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(system_prompt, user_content),
             stream=True,
             max_tokens=self.max_tokens,
             temperature=self.temperature,
+            stream_options={"include_usage": True},
         )
+        report_response(response)
 
-        for chunk in response:
-            if chunk.choices[0].delta.content:
+        usage = None
+        async for chunk in response:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
+        self.last_usage = _normalize_usage(usage)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class ClientPool:
+    """Initialized SDK clients, kept with their connections across provider switches.
+
+    Clients are keyed by (provider, api_key, endpoint), so switching back to
+    a model reuses the client and its keep-alive connections.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._clients: Dict[Tuple[str, str, Optional[Hashable]], Any] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        provider: str,
+        api_key: str,
+        endpoint: Optional[Hashable],
+        factory: Callable[[], Any],
+    ) -> Any:
+        """Return the pooled client for the key, creating it with `factory`."""
+        key = (provider, api_key, endpoint)
+        with self._lock:
+            if key in self._clients:
+                self.hits += 1
+                return self._clients[key]
+
+            self.misses += 1
+            client = self._clients[key] = factory()
+            return client
+
+    def clear(self) -> None:
+        """Forget every pooled client."""
+        with self._lock:
+            self._clients.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool counters and the pooled (provider, endpoint) pairs."""
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "hits": self.hits,
+                "misses": self.misses,
+                "endpoints": [
+                    (provider, endpoint) for provider, _, endpoint in self._clients
+                ],
+            }
+
+
+client_pool = ClientPool()
@@ -1,15 +1,34 @@
 # -*- coding: utf-8 -*-
 
-from typing import Generator
-from .base import BaseProvider
+from typing import Any, AsyncIterator, Generator, List, Optional
 
-from gen_ai_hub.orchestration.models.message import SystemMessage, UserMessage
+from ..cancel import closing_stream
+from ..session import Message
+from .base import WARMUP_TIMEOUT, BaseProvider
+from .pool import client_pool
+
+from gen_ai_hub.orchestration.models.message import (
+    AssistantMessage,
+    SystemMessage,
+    UserMessage,
+)
+from gen_ai_hub.orchestration.models.message import Message as OrchestrationMessage
 from gen_ai_hub.orchestration.models.llm import LLM
 from gen_ai_hub.orchestration.models.template import Template, TemplateValue
 from gen_ai_hub.orchestration.models.config import OrchestrationConfig
 from gen_ai_hub.orchestration.service import OrchestrationService
 
+
+def _close(response: Any) -> None:
+    # the SSE client only opens its HTTP response on the first iteration
+    http_response = getattr(response, "_response", None)
+    if http_response is not None:
+        http_response.close()
+
+
 class SAPGenAIHubProvider(BaseProvider):
+    supports_history = True
+
     def initialize_client(self) -> None:
         api_key = self.config.get("sapgenaihub", {}).get("api_key")
         if not api_key:
@@ -19,46 +38,85 @@ class SAPGenAIHubProvider(BaseProvider):
             self.client = None
             return
 
+        self.max_tokens = self.config.get("sapgenaihub", {}).get("max_tokens", 256)
+        self.temperature = self.config.get("sapgenaihub", {}).get("temperature", 0.2)
         llm = LLM(
             name=self.config["current"]["model"],
             version="latest",
-            parameters={"max_tokens": 256, "temperature": 0.2}
+            parameters={"max_tokens": self.max_tokens, "temperature": self.temperature},
         )
 
         template = Template(
-            messages=[
-                SystemMessage("{{?system_prompt}}"),
-                UserMessage("{{?query}}")
-            ],
+            messages=[SystemMessage("{{?system_prompt}}"), UserMessage("{{?query}}")],
             defaults=[
-                TemplateValue(name="system_prompt", value="You are a helpful principal engineer and principal data scientist with access to the current IPython environment."),
-                TemplateValue(name="query", value="What can I do in IPython?")
-            ]
+                TemplateValue(
+                    name="system_prompt",
+                    value="You are a helpful principal engineer and principal data scientist with access to the current IPython environment.",
+                ),
+                TemplateValue(name="query", value="What can I do in IPython?"),
+            ],
         )
 
-        config = OrchestrationConfig(
-            template=template,
-            llm=llm
+        self.orchestration_config = OrchestrationConfig(template=template, llm=llm)
+
+        # the service holds the HTTP clients, the config is passed per request
+        self.client = client_pool.get(
+            "sapgenaihub",
+            api_key,
+            api_key,
+            lambda: OrchestrationService(api_url=api_key),
         )
 
-        self.client = OrchestrationService(api_url=api_key, config=config)
+    def warmup(self) -> None:
+        self.client.client.head(self.client.api_url, timeout=WARMUP_TIMEOUT)
 
-    def stream_chat(
+    def _template_values(
         self, system_prompt: str, user_content: str
+    ) -> List[TemplateValue]:
+        return [
+            TemplateValue(name="system_prompt", value=system_prompt),
+            TemplateValue(name="query", value=user_content),
+        ]
+
+    def _history(self, history: Optional[List[Message]]) -> List[OrchestrationMessage]:
+        return [
+            AssistantMessage(message["content"])
+            if message["role"] == "assistant"
+            else UserMessage(message["content"])
+            for message in history or []
+        ]
+
+    def stream_chat(
+        self,
+        system_prompt: str,
+        user_content: str,
+        history: Optional[List[Message]] = None,
     ) -> Generator[str, None, None]:
         if not self.client:
             raise ValueError("Client is not initialized.")
 
         response = self.client.stream(
-            config=self.client.config,
-            template_values=[
-                TemplateValue(name="system_prompt", value=system_prompt),
-                TemplateValue(name="query", value=user_content)
-            ],
-            stream_options={
-                'chunk_size': 1
-            }
+            config=self.orchestration_config,
+            template_values=self._template_values(system_prompt, user_content),
+            history=self._history(history),
+            stream_options={"chunk_size": 1},
+        )
+
+        with closing_stream(response, lambda: _close(response)):
+            for chunk in response:
+                yield chunk.orchestration_result.choices[0].delta.content
+
+    async def astream_chat(
+        self, system_prompt: str, user_content: str
+    ) -> AsyncIterator[str]:
+        if not self.client:
+            raise ValueError("Client is not initialized.")
+
+        response = await self.client.astream(
+            config=self.orchestration_config,
+            template_values=self._template_values(system_prompt, user_content),
+            stream_options={"chunk_size": 1},
         )
 
-        for chunk in response:
-            yield chunk.orchestration_result.choices[0].delta.content
\ No newline at end of file
+        async for chunk in response:
+            yield chunk.orchestration_result.choices[0].delta.content
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+from rich.live import Live
+from rich.markdown import Markdown as RichMarkdown
+
+from .cancel import GuardedStream
+
+FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})")
+LIST_ITEM_RE = re.compile(r"^([-*+]|\d{1,9}[.)])(\s|$)")
+LIST_MARKERS = "-*+0123456789"
+
+MIN_REFRESH_INTERVAL = 1 / 30
+# notebook front ends re-render the markdown on every update
+JUPYTER_REFRESH_INTERVAL = 0.1
+MAX_REFRESH_INTERVAL = 0.5
+# share of the streaming time the display may take
+REFRESH_BUDGET = 0.2
+MAX_DELTA_CHARS = 4000
+
+
+class RefreshPace:
+    """How often to refresh the display, adapted to how long refreshes take.
+
+    Slow terminals, such as over SSH, get fewer and larger updates so that
+    refreshing takes at most `budget` of the streaming time.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = MIN_REFRESH_INTERVAL,
+        max_interval: float = MAX_REFRESH_INTERVAL,
+        budget: float = REFRESH_BUDGET,
+        max_chars: int = MAX_DELTA_CHARS,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self.max_chars = max_chars
+        self.cost = 0.0
+        self.interval = min_interval
+
+    def record(self, seconds: float) -> None:
+        """Adapt the interval to the duration of a refresh."""
+        # a moving average, so a single slow refresh doesn't stall the display
+        self.cost = seconds if not self.cost else 0.7 * self.cost + 0.3 * seconds
+        self.interval = min(
+            self.max_interval, max(self.min_interval, self.cost / self.budget)
+        )
+
+
+def coalesce(chunks: Iterable[str], pace: RefreshPace) -> Iterator[str]:
+    """Merge the chunks arriving within one refresh interval into one delta.
+
+    The first chunk is passed on at once. Only a `GuardedStream` can be
+    waited on with a timeout, other iterables are passed through unchanged.
+    """
+    if not isinstance(chunks, GuardedStream):
+        yield from chunks
+        return
+
+    started = False
+    try:
+        for content in chunks:
+            if not started:
+                started = True
+                yield content
+                continue
+
+            delta = [content]
+            size = len(content)
+            deadline = time.monotonic() + pace.interval
+            error = None
+            while size < pace.max_chars:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    content = chunks.next_within(remaining)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    # show what came before the error first
+                    error = e
+                    break
+                if content is None:
+                    break
+                delta.append(content)
+                size += len(content)
+            yield "".join(delta)
+            if error is not None:
+                raise error
+    finally:
+        chunks.close()
+
+
+class JupyterDisplay:
+    """Stand-in for `Live` in Jupyter, streaming through display handles.
+
+    Rich's `Live` re-sends the whole answer on every refresh in a notebook.
+    Here each completed block becomes an output of its own, and only the
+    open block is updated in place with `update_display`, so the notebook
+    receives the answer about once. Blocks are published as raw bundles
+    with the markup as their text/plain form, for front ends such as
+    `jupyter console` that don't render markdown.
+    """
+
+    def __init__(self):
+        from IPython.display import display
+
+        self._display = display
+        self._handle: Any = None
+        self._shown: Optional[str] = None
+        # MarkdownStream prints completed blocks through `live.console`
+        self.console = self
+
+    def _show(self, markup: str) -> None:
+        if markup == self._shown:
+            return
+        bundle = {"text/markdown": markup, "text/plain": markup}
+        if self._handle is None:
+            self._handle = self._display(bundle, raw=True, display_id=True)
+        else:
+            self._handle.update(bundle, raw=True)
+        self._shown = markup
+
+    def update(self, renderable: RichMarkdown, refresh: bool = False) -> None:
+        # the open block is only emptied right before it is completed
+        if renderable.markup:
+            self._show(renderable.markup)
+
+    def print(self, renderable: Optional[RichMarkdown] = None) -> None:
+        """Show a completed block, and start a new output for the next one."""
+        if renderable is None:
+            return
+        self._show(renderable.markup)
+        self._handle = None
+        self._shown = None
+
+
+class MarkdownStream:
+    """Render streamed markdown, printing each completed block only once.
+
+    Completed blocks are frozen above the live area, and only the open
+    trailing block is re-parsed on every update. A block is complete once a
+    blank line is followed by a line that starts a new top-level block, so
+    lists and the indented code blocks inside them stay together.
+    """
+
+    def __init__(
+        self, live: Union[Live, JupyterDisplay], pace: Optional[RefreshPace] = None
+    ):
+        self.live = live
+        self.pace = pace
+        self._parts: List[str] = []
+        self._block: List[str] = []
+        self._line = ""
+        self._fence: Optional[str] = None
+        self._fence_indented = False
+        # blank lines after the open block, until it is known whether it ends
+        self._blanks = 0
+        self._frozen = 0
+
+    @property
+    def text(self) -> str:
+        """The full response streamed so far."""
+        return "".join(self._parts)
+
+    def feed(self, content: str) -> None:
+        """Add a chunk of the response and refresh the open block."""
+        start = time.perf_counter()
+        self._parts.append(content)
+        lines = (self._line + content).split("\n")
+        self._line = lines.pop()
+
+        for line in lines:
+            self._add_line(line)
+        if self._blanks and self._line and self._starts_block(self._line, False):
+            self._freeze()
+
+        markup = "".join(self._block) + "\n" * self._blanks + self._line
+        self.live.update(RichMarkdown(markup), refresh=True)
+        if self.pace is not None:
+            self.pace.record(time.perf_counter() - start)
+
+    def close(self) -> None:
+        """Render whatever is left of the open block."""
+        if self._line:
+            self._block.append(self._line)
+            self._line = ""
+        self.live.update(RichMarkdown("".join(self._block)), refresh=True)
+
+    def _add_line(self, line: str) -> None:
+        if self._fence is not None:
+            self._block.append(line + "\n")
+            stripped = line.strip()
+            if stripped and set(stripped) == {self._fence[0]}:
+                if len(stripped) >= len(self._fence):
+                    self._fence = None
+                    if not self._fence_indented:
+                        self._freeze()
+            return
+
+        if not line.strip():
+            if self._block:
+                self._blanks += 1
+            return
+
+        match = FENCE_RE.match(line)
+        if (match and not line[0].isspace()) or (
+            self._blanks and self._starts_block(line, True)
+        ):
+            self._freeze()
+        self._block.append("\n" * self._blanks + line + "\n")
+        self._blanks = 0
+        if match:
+            self._fence = match.group(1)
+            self._fence_indented = line[0].isspace()
+
+    def _starts_block(self, line: str, complete: bool) -> bool:
+        """Whether `line`, after a blank line, starts a new top-level block.
+
+        Indented lines continue the open block, and so do list items when it
+        is a list. A partial line only counts once that is certain.
+        """
+        if line[0].isspace():
+            return False
+        if not (self._block and LIST_ITEM_RE.match(self._block[0])):
+            return True
+        if complete:
+            return not LIST_ITEM_RE.match(line)
+        return line[0] not in LIST_MARKERS
+
+    def _freeze(self) -> None:
+        self._blanks = 0
+        if not self._block:
+            return
+
+        self.live.update(RichMarkdown(""), refresh=True)
+        if self._frozen:
+            self.live.console.print()
+        self.live.console.print(RichMarkdown("".join(self._block)))
+        self._block = []
+        self._frozen += 1
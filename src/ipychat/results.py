@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from rich.console import Console
+from rich.markdown import Markdown as RichMarkdown
+
+console = Console()
+
+
+class AskResult:
+    """Handle for an %ask request running in the background."""
+
+    def __init__(self, id: int, query: str):
+        self.id = id
+        self.query = query
+        self.status = "running"
+        self.error: Optional[Exception] = None
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.future: "Future[str]" = Future()
+        self._chunks: List[str] = []
+        self._cancel: Optional[Callable[[], None]] = None
+
+    @property
+    def text(self) -> str:
+        """The response received so far."""
+        return "".join(self._chunks)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        """Wait for the response and return it."""
+        return self.future.result(timeout)
+
+    def cancel(self) -> None:
+        """Stop the request, keeping the response received so far."""
+        if self._cancel is not None and not self.done():
+            self._cancel()
+
+    def show(self) -> None:
+        """Render the response received so far as markdown."""
+        console.print(RichMarkdown(self.text))
+
+    def status_line(self) -> str:
+        query = self.query if len(self.query) <= 40 else self.query[:37] + "..."
+        return (
+            f"#{self.id} {self.status} {self.elapsed:.1f}s "
+            f"{len(self.text)} chars: {query}"
+        )
+
+    def __repr__(self) -> str:
+        return f"<AskResult {self.status_line()}>"
+
+    def _repr_markdown_(self) -> str:
+        return self.text if self.done() else f"*{self.status_line()}*"
+
+    def _run(self, stream: Callable[[], Iterable[str]]) -> None:
+        try:
+            for content in stream():
+                self._chunks.append(content)
+        except Exception as e:
+            self._fail(e)
+        else:
+            self.status = "done"
+            self.finished = time.monotonic()
+            self.future.set_result(self.text)
+
+    def _fail(self, error: Exception) -> None:
+        self.status = getattr(error, "status", "error")
+        self.error = error
+        self.finished = time.monotonic()
+        self.future.set_exception(error)
+
+
+class ResultStore:
+    """Results of background %ask requests, keyed by request number."""
+
+    def __init__(self):
+        self._results: Dict[int, AskResult] = {}
+        self._reported: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, query: str) -> AskResult:
+        with self._lock:
+            result = AskResult(len(self._results) + 1, query)
+            self._results[result.id] = result
+        return result
+
+    def record(self, query: str, text: str, error: Exception) -> AskResult:
+        """Keep the partial response of a request that didn't finish."""
+        result = self.add(query)
+        result._chunks.append(text)
+        result._fail(error)
+        return result
+
+    def latest(self) -> Optional[AskResult]:
+        """Return the most recently started result, if any."""
+        with self._lock:
+            return self._results[max(self._results)] if self._results else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._reported.clear()
+
+    def status_line(self) -> str:
+        """Summarize results that are running or changed since the last call.
+
+        Returns an empty string when there is nothing new to report.
+        """
+        with self._lock:
+            parts = []
+            for result in self._results.values():
+                reported = self._reported.get(result.id)
+                if result.status == "running" or reported != result.status:
+                    parts.append(result.status_line())
+                self._reported[result.id] = result.status
+        return " | ".join(parts)
+
+    def __getitem__(self, id: int) -> AskResult:
+        return self._results[id]
+
+    def __iter__(self) -> Iterator[AskResult]:
+        return iter(list(self._results.values()))
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+store = ResultStore()
+
+
+def get(id: int) -> AskResult:
+    """Return the background result with the given request number."""
+    return store[id]
+
+
+def latest() -> Optional[AskResult]:
+    """Return the most recent background result."""
+    return store.latest()
+
+
+def submit(
+    query: str,
+    stream: Callable[[], Iterable[str]],
+    on_done: Optional[Callable[[AskResult], None]] = None,
+    cancel: Optional[Callable[[], None]] = None,
+) -> AskResult:
+    """Consume `stream()` on a background thread into a new result.
+
+    `cancel` is called to stop the stream when the result is cancelled.
+    """
+    result = store.add(query)
+    result._cancel = cancel
+
+    def run():
+        result._run(stream)
+        if on_done is not None:
+            on_done(result)
+
+    threading.Thread(target=run, name=f"ipychat-ask-{result.id}", daemon=True).start()
+    return result
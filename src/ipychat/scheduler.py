@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 32
+MAX_RETRIES = 4
+BASE_DELAY = 0.5
+MAX_DELAY = 30.0
+# how many recent queue waits are kept for stats
+MAX_QUEUE_SAMPLES = 1000
+# how often a request waiting for a concurrency slot checks again
+SLOT_POLL = 0.05
+
+RETRY_STATUSES = {408, 409, 429}
+TRANSPORT_ERRORS = {"APIConnectionError", "TransportError"}
+
+_current: ContextVar[Optional["Scheduler"]] = ContextVar(
+    "ipychat_scheduler", default=None
+)
+_schedulers: Dict[Tuple[str, Any, Any], "Scheduler"] = {}
+_schedulers_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Allow `rate` units per minute, in bursts of up to `capacity`.
+
+    A rate of 0 means no limit until the provider reports one.
+    """
+
+    def __init__(self, rate: float = 0, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.rate / 60
+        )
+        self.updated = now
+
+    def delay(self, amount: float, now: Optional[float] = None) -> float:
+        """Return the seconds until `amount` units are available."""
+        if not self.rate:
+            return 0.0
+        self._refill(time.monotonic() if now is None else now)
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0) * 60 / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate:
+            self.level -= min(amount, self.capacity)
+
+    def sync(self, limit: Optional[float], remaining: Optional[float]) -> None:
+        """Follow the limit and remaining quota reported by the provider.
+
+        A configured rate is only lowered, never raised, by the provider's.
+        """
+        if limit and (not self.rate or limit < self.rate):
+            now = time.monotonic()
+            if self.rate:
+                self._refill(now)
+                self.level = min(self.level, limit)
+            else:
+                self.level = limit
+                self.updated = now
+            self.rate = self.capacity = limit
+        if remaining is not None and self.rate:
+            self._refill(time.monotonic())
+            self.level = min(self.level, remaining)
+
+
+class AIMDLimiter:
+    """Concurrency limit that halves whenever the provider throttles and
+    grows back by one per window of successful requests.
+
+    It starts at `initial`, or `maximum` when not given, so requests are
+    only held back once the provider has pushed back.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        minimum: int = 1,
+        maximum: int = MAX_CONCURRENCY,
+        decrease: float = 0.5,
+    ):
+        if initial is None:
+            initial = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.active = 0
+
+    def try_acquire(self) -> bool:
+        if self.active >= int(self.limit):
+            return False
+        self.active += 1
+        return True
+
+    def release(self, throttled: bool = False) -> None:
+        self.active -= 1
+        if throttled:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """Return the HTTP status of an SDK error, if it has one."""
+    for name in ("status_code", "code"):
+        value = getattr(error, name, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_transport_error(error: BaseException) -> bool:
+    """Whether `error` is a dropped connection or timeout, without a response.
+
+    Matched by class name so the SDKs aren't imported here: the OpenAI and
+    Anthropic `APIConnectionError`s, their timeout subclasses, and httpx's
+    `TransportError`s.
+    """
+    return any(
+        cls.__name__ in TRANSPORT_ERRORS
+        and cls.__module__.split(".")[0] in ("httpx", "openai", "anthropic")
+        for cls in type(error).__mro__
+    )
+
+
+def is_retryable(error: BaseException) -> bool:
+    status = status_code(error)
+    if status is None:
+        return is_transport_error(error)
+    return status in RETRY_STATUSES or status >= 500
+
+
+def error_headers(error: BaseException) -> Any:
+    return getattr(getattr(error, "response", None), "headers", None)
+
+
+def _header(headers: Any, name: str) -> Optional[str]:
+    try:
+        value = headers.get(name)
+    except AttributeError:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse durations like `20ms`, `1.5s` or `6m0s` into seconds."""
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+def parse_reset(value: str) -> Optional[float]:
+    """Parse a reset time, a duration or an RFC 3339 timestamp, into seconds."""
+    if "T" not in value:
+        return parse_duration(value)
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max((reset - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Return the seconds to wait from `retry-after-ms` or `retry-after`."""
+    value = _header(headers, "retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = _header(headers, "retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_rate_limits(headers: Any) -> Dict[str, Dict[str, float]]:
+    """Read the request and token quotas from OpenAI or Anthropic headers.
+
+    Returns `{"requests": {...}, "tokens": {...}}` with the `limit`,
+    `remaining` and `reset` seconds each provider reported.
+    """
+    names = {
+        "limit": ("x-ratelimit-limit-{}", "anthropic-ratelimit-{}-limit"),
+        "remaining": ("x-ratelimit-remaining-{}", "anthropic-ratelimit-{}-remaining"),
+        "reset": ("x-ratelimit-reset-{}", "anthropic-ratelimit-{}-reset"),
+    }
+    limits: Dict[str, Dict[str, float]] = {}
+    for kind in ("requests", "tokens"):
+        for field, patterns in names.items():
+            for pattern in patterns:
+                value = _header(headers, pattern.format(kind))
+                if value is None:
+                    continue
+                parsed = parse_reset(value) if field == "reset" else _number(value)
+                if parsed is not None:
+                    limits.setdefault(kind, {})[field] = parsed
+                break
+    return limits
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class Scheduler:
+    """Pace and retry the requests to one provider.
+
+    Requests wait for the requests and tokens per minute buckets and for a
+    concurrency slot. The concurrency limit is adjusted with AIMD, and the
+    buckets follow the rate limit headers the provider sends. Requests that
+    fail with 429 or 5xx before their first chunk are retried with jittered
+    exponential backoff, and a `retry-after` pauses all requests to the
+    provider.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = MAX_RETRIES,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AIMDLimiter(maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+        self.retries = 0
+        self.throttled = 0
+        # seconds each attempt waited for its slot and quota
+        self.queue_times: Deque[float] = deque(maxlen=MAX_QUEUE_SAMPLES)
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any]) -> "Scheduler":
+        """Create a scheduler from the provider's section and `scheduler`."""
+        limits = config.get(name, {})
+        settings = config.get("scheduler", {})
+        return cls(
+            name,
+            requests_per_minute=limits.get("requests_per_minute", 0),
+            tokens_per_minute=limits.get("tokens_per_minute", 0),
+            max_concurrency=settings.get("max_concurrency", MAX_CONCURRENCY),
+            max_retries=settings.get("max_retries", MAX_RETRIES),
+        )
+
+    def _reserve(self, tokens: float) -> float:
+        """Take a slot and the quota of a request, or return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(
+                self.paused_until - now,
+                self.requests.delay(1, now),
+                self.tokens.delay(tokens, now),
+            )
+            if wait > 0:
+                return wait
+            if not self.concurrency.try_acquire():
+                return SLOT_POLL
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            return 0.0
+
+    def _queued(self, start: float) -> None:
+        with self._lock:
+            self.queue_times.append(time.monotonic() - start)
+
+    def acquire(self, tokens: float = 0) -> None:
+        start = time.monotonic()
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                self._queued(start)
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: float = 0) -> None:
+        start = time.monotonic()
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                self._queued(start)
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, throttled: bool = False) -> None:
+        with self._lock:
+            self.concurrency.release(throttled)
+
+    def update(self, headers: Any) -> None:
+        """Follow the rate limit headers of a response."""
+        limits = parse_rate_limits(headers)
+        with self._lock:
+            for kind, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+                if kind not in limits:
+                    continue
+                limit = limits[kind]
+                bucket.sync(limit.get("limit"), limit.get("remaining"))
+                if limit.get("remaining") == 0 and limit.get("reset"):
+                    # the quota is used up, wait for it to reset
+                    self.paused_until = max(
+                        self.paused_until, time.monotonic() + limit["reset"]
+                    )
+
+    def _retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Return the seconds to wait before retrying, or None to give up."""
+        throttled = status_code(error) == 429
+        headers = error_headers(error)
+        if headers is not None:
+            self.update(headers)
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+
+        retry_after = parse_retry_after(headers)
+        with self._lock:
+            self.retries += 1
+            if throttled:
+                self.throttled += 1
+            if retry_after is None:
+                # equal jitter keeps retries apart without waiting for nothing
+                backoff = min(self.max_delay, self.base_delay * 2**attempt)
+                retry_after = backoff / 2 + self._random.uniform(0, backoff / 2)
+            elif throttled:
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + retry_after
+                )
+        logger.info(
+            f"{self.name} request failed with {status_code(error)}, "
+            f"retrying in {retry_after:.1f}s"
+        )
+        return retry_after
+
+    def stream(
+        self, make_stream: Callable[[], Iterable[str]], tokens: float = 0
+    ) -> Iterator[str]:
+        """Yield the chunks of `make_stream()`, paced and retried."""
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            started = False
+            throttled = False
+            try:
+                _current.set(self)
+                for content in make_stream():
+                    started = True
+                    yield content
+                return
+            except Exception as e:
+                throttled = status_code(e) == 429
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(throttled)
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(
+        self, make_stream: Callable[[], AsyncIterable[str]], tokens: float = 0
+    ) -> AsyncIterator[str]:
+        """Yield the chunks of `make_stream()` asynchronously, paced and retried."""
+        attempt = 0
+        while True:
+            await self.aacquire(tokens)
+            started = False
+            throttled = False
+            try:
+                _current.set(self)
+                async for content in make_stream():
+                    started = True
+                    yield content
+                return
+            except Exception as e:
+                throttled = status_code(e) == 429
+                delay = None if started else self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(throttled)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency_limit": int(self.concurrency.limit),
+                "active": self.concurrency.active,
+                "requests_per_minute": self.requests.rate,
+                "tokens_per_minute": self.tokens.rate,
+                "retries": self.retries,
+                "throttled": self.throttled,
+            }
+
+
+def get_scheduler(name: str, config: Dict[str, Any]) -> Scheduler:
+    """Return the scheduler shared by all providers using the same quota.
+
+    Quotas belong to an API key at an endpoint, so that's what requests are
+    scheduled by.
+    """
+    section = config.get(name, {})
+    key = (name, section.get("api_key"), section.get("base_url"))
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = Scheduler.from_config(name, config)
+        return _schedulers[key]
+
+
+def reset_schedulers() -> None:
+    with _schedulers_lock:
+        _schedulers.clear()
+
+
+def report_headers(headers: Any) -> None:
+    """Pass the headers of a provider response to the scheduler running it."""
+    scheduler = _current.get()
+    if scheduler is not None:
+        scheduler.update(headers)
+
+
+def report_response(response: Any) -> None:
+    """Report the headers of an OpenAI or Anthropic SDK stream."""
+    report_headers(getattr(getattr(response, "response", None), "headers", None))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from .prompt import estimate_tokens, truncate_to_tokens
+
+Message = Dict[str, str]
+
+DEFAULT_SESSION_TOKENS = 8000
+DEFAULT_KEEP_TURNS = 4
+SUMMARY_ANSWER_TOKENS = 120
+SUMMARY_TOKENS = 1500
+SUMMARY_ACK = "Understood, I'll keep the earlier conversation in mind."
+
+
+class Turn:
+    """One question and answer of a chat session."""
+
+    def __init__(
+        self,
+        query: str,
+        user_content: str,
+        response: str,
+        variables: Sequence[str] = (),
+        cells: Sequence[str] = (),
+    ):
+        self.query = query
+        self.user_content = user_content
+        self.response = response
+        self.variables = set(variables)
+        self.cells = set(cells)
+
+    def messages(self) -> List[Message]:
+        return [
+            {"role": "user", "content": self.user_content},
+            {"role": "assistant", "content": self.response},
+        ]
+
+    def summary(self) -> str:
+        answer = truncate_to_tokens(self.response.strip(), SUMMARY_ANSWER_TOKENS)
+        return f"- Asked: {self.query}\n  Answered: {answer}"
+
+
+class ChatSession:
+    """The conversation of consecutive %ask queries.
+
+    Turns are sent back to the provider as message history, so follow-up
+    questions only carry the variable summaries and history cells the model
+    hasn't seen yet. Once the turns take more than `max_tokens`, all but the
+    last `keep_turns` are compacted into a short summary that opens the
+    history. The system prompt never changes, so providers can keep caching
+    it.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = DEFAULT_SESSION_TOKENS,
+        keep_turns: int = DEFAULT_KEEP_TURNS,
+        summary_tokens: int = SUMMARY_TOKENS,
+    ):
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.turns: List[Turn] = []
+        self.summaries: List[str] = []
+        self.compactions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["ChatSession"]:
+        """Create a session from the `session` config, or None if disabled."""
+        session_config = config.get("session", {})
+        if not session_config.get("enabled", True):
+            return None
+        return cls(
+            max_tokens=session_config.get("max_tokens", DEFAULT_SESSION_TOKENS),
+            keep_turns=session_config.get("keep_turns", DEFAULT_KEEP_TURNS),
+        )
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summaries)
+
+    def messages(self) -> List[Message]:
+        """The message history to send before the next question.
+
+        The summary of compacted turns comes first, as a question and answer
+        pair so that user and assistant messages keep alternating.
+        """
+        with self._lock:
+            messages = []
+            if self.summaries:
+                messages = [
+                    {
+                        "role": "user",
+                        "content": "Summary of the earlier conversation:\n"
+                        + self.summary,
+                    },
+                    {"role": "assistant", "content": SUMMARY_ACK},
+                ]
+            messages.extend(
+                message for turn in self.turns for message in turn.messages()
+            )
+            return messages
+
+    def tokens(self, provider: Optional[str] = None) -> int:
+        """Estimate the tokens the session adds to the next request."""
+        with self._lock:
+            return self._tokens(provider)
+
+    def _tokens(self, provider: Optional[str] = None) -> int:
+        return sum(
+            estimate_tokens(turn.user_content, provider)
+            + estimate_tokens(turn.response, provider)
+            for turn in self.turns
+        ) + estimate_tokens(self.summary, provider)
+
+    def unsent(
+        self, variables: Sequence[str], cells: Sequence[str]
+    ) -> Tuple[List[str], List[str]]:
+        """Drop the variable summaries and cells already sent in a kept turn."""
+        with self._lock:
+            sent_variables: Set[str] = set()
+            sent_cells: Set[str] = set()
+            for turn in self.turns:
+                sent_variables |= turn.variables
+                sent_cells |= turn.cells
+        return (
+            [variable for variable in variables if variable not in sent_variables],
+            [cell for cell in cells if cell not in sent_cells],
+        )
+
+    def add_turn(
+        self,
+        query: str,
+        user_content: str,
+        response: str,
+        variables: Sequence[str] = (),
+        cells: Sequence[str] = (),
+    ) -> None:
+        """Record a finished turn, with the variables and cells it sent.
+
+        Turns without an answer, such as cancelled ones, are skipped since
+        providers reject empty messages.
+        """
+        if not response.strip():
+            return
+        turn = Turn(
+            query,
+            user_content,
+            response,
+            [variable for variable in variables if variable in user_content],
+            [cell for cell in cells if cell in user_content],
+        )
+        # one step, so turns finishing on other threads can't interleave
+        with self._lock:
+            self.turns.append(turn)
+            if self._tokens() > self.max_tokens:
+                self._compact()
+
+    def compact(self) -> None:
+        """Fold all but the last `keep_turns` turns into the summary."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self) -> None:
+        old = self.turns[: max(len(self.turns) - self.keep_turns, 0)]
+        if not old:
+            return
+        self.turns = self.turns[len(old) :]
+        self.summaries.extend(turn.summary() for turn in old)
+        self.compactions += 1
+
+        # the oldest summaries go first once they outgrow their budget
+        while (
+            len(self.summaries) > 1
+            and estimate_tokens(self.summary) > self.summary_tokens
+        ):
+            self.summaries.pop(0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.turns.clear()
+            self.summaries.clear()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .scheduler import TokenBucket
+
+WORDS = (
+    "the data frame groups rows by key and computes the mean of each column "
+    "before joining the result back onto the original index"
+).split()
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub server."""
+
+    latency: float = 0.2
+    tokens_per_second: float = 50.0
+    response_tokens: int = 100
+    error_rate: float = 0.0
+    # requests per minute before answering 429, 0 for no limit
+    rate_limit: float = 0.0
+    seed: Optional[int] = None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve streaming OpenAI chat completions and Anthropic messages."""
+
+    protocol_version = "HTTP/1.1"
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_error(400, "invalid_request_error", "Body is not valid JSON")
+            return
+
+        if self.path.endswith("/chat/completions"):
+            events = self._openai_events(body)
+        elif self.path.endswith("/messages"):
+            events = self._anthropic_events(body)
+        else:
+            self._send_error(404, "not_found_error", f"Unknown path {self.path}")
+            return
+
+        if not body.get("stream"):
+            self._send_error(
+                400, "invalid_request_error", "The stub only serves streams"
+            )
+            return
+
+        remaining, retry_after = self.server.take_request()
+        limits = self._rate_limit_headers(remaining)
+        if retry_after is not None:
+            self._send_error(
+                429,
+                "rate_limit_error",
+                "Simulated rate limit",
+                {**limits, "retry-after": f"{retry_after:.3f}"},
+            )
+            return
+
+        if self.server.should_fail():
+            self._send_error(500, "api_error", "Simulated server error")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        for name, value in limits.items():
+            self.send_header(name, value)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(self.server.config.latency)
+        try:
+            for event in events:
+                self._write_chunk(event.encode())
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_error(
+        self,
+        status: int,
+        error_type: str,
+        message: str,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        payload = json.dumps(
+            {"type": "error", "error": {"type": error_type, "message": message}}
+        ).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        # report errors to the caller instead of letting the SDK retry
+        self.send_header("x-should-retry", "false")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _rate_limit_headers(self, remaining: Optional[int]) -> Dict[str, str]:
+        limit = self.server.config.rate_limit
+        if not limit or remaining is None:
+            return {}
+        return {
+            "x-ratelimit-limit-requests": f"{limit:g}",
+            "x-ratelimit-remaining-requests": str(remaining),
+            "anthropic-ratelimit-requests-limit": f"{limit:g}",
+            "anthropic-ratelimit-requests-remaining": str(remaining),
+        }
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _tokens(self) -> Iterator[str]:
+        config = self.server.config
+        delay = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+        for i in range(config.response_tokens):
+            if i and delay:
+                time.sleep(delay)
+            yield WORDS[i % len(WORDS)] + " "
+
+    def _openai_events(self, body: Dict[str, Any]) -> Iterator[str]:
+        id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "stub")
+
+        def chunk(choices: List[Dict[str, Any]], **extra: Any) -> str:
+            data = {
+                "id": id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": choices,
+                **extra,
+            }
+            return f"data: {json.dumps(data)}\n\n"
+
+        def choice(delta: Dict[str, Any], finish_reason: Optional[str] = None):
+            return [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+
+        yield chunk(choice({"role": "assistant", "content": ""}))
+        tokens = 0
+        for token in self._tokens():
+            tokens += 1
+            yield chunk(choice({"content": token}))
+        yield chunk(choice({}, "stop"))
+        if body.get("stream_options", {}).get("include_usage"):
+            usage = {
+                "prompt_tokens": 0,
+                "completion_tokens": tokens,
+                "total_tokens": tokens,
+            }
+            yield chunk([], usage=usage)
+        yield "data: [DONE]\n\n"
+
+    def _anthropic_events(self, body: Dict[str, Any]) -> Iterator[str]:
+        def event(type: str, data: Dict[str, Any]) -> str:
+            return f"event: {type}\ndata: {json.dumps({'type': type, **data})}\n\n"
+
+        yield event(
+            "message_start",
+            {
+                "message": {
+                    "id": f"msg_{uuid.uuid4().hex}",
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [],
+                    "model": body.get("model", "stub"),
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": 0, "output_tokens": 0},
+                }
+            },
+        )
+        yield event(
+            "content_block_start",
+            {"index": 0, "content_block": {"type": "text", "text": ""}},
+        )
+        tokens = 0
+        for token in self._tokens():
+            tokens += 1
+            yield event(
+                "content_block_delta",
+                {"index": 0, "delta": {"type": "text_delta", "text": token}},
+            )
+        yield event("content_block_stop", {"index": 0})
+        yield event(
+            "message_delta",
+            {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": tokens},
+            },
+        )
+        yield event("message_stop", {})
+
+
+class StubServer(ThreadingHTTPServer):
+    """Local server speaking the OpenAI and Anthropic streaming wire formats.
+
+    Point a provider's `base_url` at `url + "/v1"` for OpenAI, or at `url`
+    for Anthropic.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        config: Optional[StubConfig] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        super().__init__((host, port), StubHandler)
+        self.config = config or StubConfig()
+        self._random = random.Random(self.config.seed)
+        self._random_lock = threading.Lock()
+        self._quota = TokenBucket(self.config.rate_limit)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def should_fail(self) -> bool:
+        with self._random_lock:
+            return self._random.random() < self.config.error_rate
+
+    def take_request(self) -> Tuple[Optional[int], Optional[float]]:
+        """Count a request against the rate limit.
+
+        Returns the requests remaining, and the seconds to wait when the
+        request is over the limit.
+        """
+        if not self.config.rate_limit:
+            return None, None
+        with self._random_lock:
+            if self._quota.rate != self.config.rate_limit:
+                self._quota = TokenBucket(self.config.rate_limit)
+            wait = self._quota.delay(1)
+            if wait > 0:
+                return 0, wait
+            self._quota.take(1)
+            return int(self._quota.level), None
+
+    def start(self) -> "StubServer":
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="ipychat-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
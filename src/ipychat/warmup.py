@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from .providers.base import BaseProvider
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 30.0
+IDLE_TIMEOUT = 600.0
+
+_local = threading.local()
+
+
+class _QuietPings(logging.Filter):
+    """Drop httpx's request logs of warm-up pings, which would otherwise
+    print into the session every `interval` seconds."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(_local, "pinging", False)
+
+
+_quiet_pings = _QuietPings()
+
+
+class KeepAlive:
+    """Warm a provider's connection in the background and keep it from going cold.
+
+    The connection is opened right away, then pinged every `interval`
+    seconds until nothing has used the provider for `idle_timeout` seconds.
+    Calling `touch()` marks activity and resumes pinging.
+    """
+
+    def __init__(
+        self,
+        provider: BaseProvider,
+        interval: float = KEEPALIVE_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+    ):
+        self.provider = provider
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.pings = 0
+        self._last_used = time.monotonic()
+        self._idle = False
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        # adding the same filter again is a no-op
+        logging.getLogger("httpx").addFilter(_quiet_pings)
+        self._thread = threading.Thread(
+            target=self._run, name="ipychat-keepalive", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def touch(self, provider: Optional[BaseProvider] = None) -> None:
+        """Mark the connection as in use, optionally switching providers."""
+        self._last_used = time.monotonic()
+        if provider is not None and provider is not self.provider:
+            # warm the new provider right away
+            self.provider = provider
+            self._wake.set()
+        elif self._idle:
+            self._wake.set()
+
+    def _ping(self) -> None:
+        _local.pinging = True
+        try:
+            self.provider.warmup()
+            self.pings += 1
+        except Exception as e:
+            logger.debug(f"Connection warm-up failed: {e}")
+        finally:
+            _local.pinging = False
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._idle = True
+            if time.monotonic() - self._last_used > self.idle_timeout:
+                # wait for the next touch before pinging again
+                self._wake.wait()
+            self._idle = False
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+
+            self._ping()
+            self._wake.wait(self.interval)
@@ -36,3 +36,10 @@ def mock_config_file(tmp_path: Path, mock_config):
     with open(config_file, "w") as f:
         toml.dump(mock_config, f)
     return config_file
+
+
+@pytest.fixture(autouse=True)
+def cache_file(tmp_path: Path, monkeypatch):
+    cache_file = tmp_path / "cache.sqlite3"
+    monkeypatch.setattr("ipychat.cache.get_cache_file", lambda: cache_file)
+    return cache_file
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+from ipychat.batch import read_finished, read_prompts, run_batch
+from ipychat.providers.base import BaseProvider
+
+
+class EchoProvider(BaseProvider):
+    def initialize_client(self) -> None:
+        self.client = object()
+        self.prompts = []
+
+    def stream_chat(self, system_prompt, user_content):
+        if user_content == "fail":
+            raise RuntimeError("provider error")
+        self.prompts.append(user_content)
+        yield "echo: "
+        yield user_content
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_read_prompts(tmp_path):
+    input_file = tmp_path / "prompts.jsonl"
+    input_file.write_text('{"id": "a", "prompt": "one"}\n\n"two"\n')
+
+    assert read_prompts(input_file) == [
+        {"id": "a", "prompt": "one"},
+        {"id": 3, "prompt": "two"},
+    ]
+
+
+def test_run_batch(tmp_path, mock_config):
+    input_file = tmp_path / "prompts.jsonl"
+    output_file = tmp_path / "answers.jsonl"
+    write_jsonl(input_file, [{"id": i, "prompt": f"q{i}"} for i in range(10)])
+
+    provider = EchoProvider(mock_config)
+    provider.initialize_client()
+    summary = asyncio.run(run_batch(provider, input_file, output_file, concurrency=3))
+
+    assert summary == {"skipped": 0, "answered": 10, "failed": 0}
+    records = sorted(read_jsonl(output_file), key=lambda r: r["id"])
+    assert records == [{"id": i, "response": f"echo: q{i}"} for i in range(10)]
+
+
+def test_run_batch_resumes(tmp_path, mock_config):
+    input_file = tmp_path / "prompts.jsonl"
+    output_file = tmp_path / "answers.jsonl"
+    write_jsonl(
+        input_file,
+        [
+            {"id": 1, "prompt": "done"},
+            {"id": 2, "prompt": "retry"},
+            {"id": 3, "prompt": "new"},
+            {"id": 4, "prompt": "fail"},
+        ],
+    )
+    output_file.write_text(
+        '{"id": 1, "response": "echo: done"}\n'
+        '{"id": 2, "error": "timeout"}\n'
+        '{"id": 3, "respo'
+    )
+
+    provider = EchoProvider(mock_config)
+    provider.initialize_client()
+    summary = asyncio.run(run_batch(provider, input_file, output_file))
+
+    assert summary == {"skipped": 1, "answered": 2, "failed": 1}
+    assert sorted(provider.prompts) == ["new", "retry"]
+    assert read_finished(output_file) == {1, 2, 3}
+
+
+class StalledProvider(EchoProvider):
+    async def astream_chat(self, system_prompt, user_content):
+        await asyncio.sleep(10)
+        yield "never"
+
+
+def test_run_batch_first_token_timeout(tmp_path, mock_config):
+    input_file = tmp_path / "prompts.jsonl"
+    output_file = tmp_path / "answers.jsonl"
+    write_jsonl(input_file, [{"id": 1, "prompt": "hello"}])
+    mock_config["request"] = {"first_token_timeout": 0.05}
+
+    provider = StalledProvider(mock_config)
+    provider.initialize_client()
+    summary = asyncio.run(run_batch(provider, input_file, output_file))
+
+    assert summary == {"skipped": 0, "answered": 0, "failed": 1}
+    assert read_jsonl(output_file) == [
+        {"id": 1, "error": "Timed out waiting for the first token"}
+    ]
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from ipychat.cache import ResponseCache, make_cache_key
+
+
+def test_make_cache_key():
+    key = make_cache_key("openai", "gpt-4o", {"temperature": 0.7}, "sys", "user")
+    assert key == make_cache_key(
+        "openai", "gpt-4o", {"temperature": 0.7}, "sys", "user"
+    )
+    assert key != make_cache_key(
+        "openai", "gpt-4o", {"temperature": 0.2}, "sys", "user"
+    )
+    assert key != make_cache_key("openai", "gpt-4o", {"temperature": 0.7}, "sys", "u")
+    assert key != make_cache_key(
+        "anthropic", "gpt-4o", {"temperature": 0.7}, "sys", "user"
+    )
+
+
+def test_response_cache_roundtrip(cache_file):
+    cache = ResponseCache()
+    assert cache.get("key") is None
+
+    cache.put("key", "response")
+    assert cache.get("key") == "response"
+
+    # a fresh instance reads the disk tier
+    cache = ResponseCache()
+    assert cache.get("key") == "response"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["disk_entries"] == 1
+    assert stats["path"] == str(cache_file)
+
+
+def test_response_cache_ttl(monkeypatch):
+    cache = ResponseCache(ttl=10)
+    cache.put("key", "response")
+
+    later = time.time() + 60
+    monkeypatch.setattr("ipychat.cache.time.time", lambda: later)
+    assert cache.get("key") is None
+
+
+def test_response_cache_size_eviction():
+    cache = ResponseCache(max_size_mb=1 / 1024, memory_entries=1)
+    cache.put("old", "x" * 600)
+    cache.put("new", "y" * 600)
+
+    assert cache.get("new") == "y" * 600
+    assert cache.get("old") is None
+    assert cache.stats()["disk_entries"] == 1
+
+
+def test_response_cache_clear():
+    cache = ResponseCache()
+    cache.put("key", "response")
+    cache.clear()
+    assert cache.get("key") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_response_cache_from_config():
+    assert ResponseCache.from_config({"cache": {"enabled": False}}) is None
+
+    cache = ResponseCache.from_config({"cache": {"ttl": 5, "max_size_mb": 2}})
+    assert cache.ttl == 5
+    assert cache.max_bytes == 2 * 1024 * 1024
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ipychat.cancel import (
+    GuardedStream,
+    RequestTimeout,
+    StreamCancelled,
+    closing_stream,
+    get_deadlines,
+    guard_async,
+    on_cancel,
+)
+from ipychat.scheduler import Scheduler
+
+
+def hanging_stream(closed, first=None):
+    """Yield `first`, then block until the response is closed."""
+    on_cancel(closed.set)
+    if first is not None:
+        yield first
+    closed.wait(5)
+    raise ConnectionError("response closed")
+
+
+def test_guarded_stream_passes_chunks():
+    assert list(GuardedStream(iter(["a", "b"]), 1, 1)) == ["a", "b"]
+
+
+def test_guarded_stream_propagates_errors():
+    def failing():
+        yield "a"
+        raise ValueError("boom")
+
+    stream = GuardedStream(failing())
+    assert next(stream) == "a"
+    with pytest.raises(ValueError):
+        next(stream)
+
+
+def test_first_token_timeout_closes_response():
+    closed = threading.Event()
+    stream = GuardedStream(hanging_stream(closed), first_token_timeout=0.05)
+
+    start = time.monotonic()
+    with pytest.raises(RequestTimeout, match="first token"):
+        list(stream)
+    assert time.monotonic() - start < 1
+    assert closed.wait(1)
+
+
+def test_total_timeout():
+    closed = threading.Event()
+    stream = GuardedStream(hanging_stream(closed, "a"), timeout=0.05)
+    assert next(stream) == "a"
+    with pytest.raises(RequestTimeout, match="response"):
+        next(stream)
+    assert closed.wait(1)
+
+
+def test_cancel_from_another_thread():
+    closed = threading.Event()
+    stream = GuardedStream(hanging_stream(closed, "a"))
+    assert next(stream) == "a"
+
+    threading.Timer(0.05, stream.cancel).start()
+    with pytest.raises(StreamCancelled):
+        next(stream)
+    assert closed.is_set()
+
+
+def test_closer_registered_after_cancel():
+    release = threading.Event()
+    closed = threading.Event()
+
+    def slow_request():
+        release.wait(5)
+        on_cancel(closed.set)
+        yield "late"
+
+    stream = GuardedStream(slow_request(), first_token_timeout=0.01)
+    with pytest.raises(RequestTimeout):
+        next(stream)
+    release.set()
+    assert closed.wait(1)
+
+
+def test_cancel_closes_chunks():
+    scheduler = Scheduler("test")
+    release = threading.Event()
+
+    def chunks():
+        yield "a"
+        release.wait(5)
+        yield "b"
+
+    stream = GuardedStream(scheduler.stream(chunks), 1, 5)
+    assert next(stream) == "a"
+    stream.cancel()
+    release.set()
+    stream._thread.join(1)
+
+    assert scheduler.stats()["active"] == 0
+
+
+def test_guard_async_first_token_timeout():
+    closed = []
+
+    async def stalled():
+        try:
+            await asyncio.sleep(10)
+            yield "never"
+        finally:
+            closed.append(True)
+
+    async def consume(chunks):
+        return [content async for content in chunks]
+
+    start = time.monotonic()
+    with pytest.raises(RequestTimeout, match="first token"):
+        asyncio.run(consume(guard_async(stalled(), first_token_timeout=0.05)))
+    assert time.monotonic() - start < 1
+    assert closed == [True]
+
+
+def test_guard_async_total_timeout():
+    async def slow():
+        yield "a"
+        await asyncio.sleep(10)
+        yield "b"
+
+    async def consume(chunks):
+        received = []
+        with pytest.raises(RequestTimeout, match="response"):
+            async for content in chunks:
+                received.append(content)
+        return received
+
+    assert asyncio.run(consume(guard_async(slow(), 1, timeout=0.05))) == ["a"]
+
+
+def test_closing_stream():
+    class Response:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    response = Response()
+    with closing_stream(response):
+        pass
+    assert response.closed
+
+    with closing_stream([1, 2]) as items:
+        assert items == [1, 2]
+
+
+def test_get_deadlines():
+    assert get_deadlines({}) == {"first_token_timeout": 60.0, "timeout": 600.0}
+    assert get_deadlines({"request": {"first_token_timeout": 0, "timeout": 5}}) == {
+        "first_token_timeout": None,
+        "timeout": 5,
+    }
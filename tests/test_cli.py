@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import subprocess
+import sys
 from pathlib import Path
 from unittest.mock import patch
 
@@ -7,6 +9,7 @@ import pytest
 import toml
 from click.testing import CliRunner
 
+from ipychat.cancel import RequestTimeout, StreamCancelled
 from ipychat.cli import app
 from ipychat.cli import config as config_command
 from ipychat.cli import start as start_command
@@ -19,7 +22,7 @@ def cli_runner():
 
 @pytest.fixture
 def mock_ipython():
-    with patch("ipychat.cli.start_ipython") as mock:
+    with patch("IPython.start_ipython") as mock:
         yield mock
 
 
@@ -207,3 +210,192 @@ def test_start_command_without_debug(cli_runner, mock_ipython):
     # Verify IPython configuration
     config = mock_ipython.call_args[1]["config"]
     assert config.IPyChatMagics.debug is False
+
+
+def test_batch_command(cli_runner, tmp_path, mock_config):
+    input_file = tmp_path / "prompts.jsonl"
+    output_file = tmp_path / "answers.jsonl"
+    input_file.write_text('{"id": 1, "prompt": "hello"}\n')
+
+    async def aopen_stream(system_prompt, user_content):
+        yield f"echo: {user_content}"
+
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        mock_get_provider.return_value.aopen_stream = aopen_stream
+        result = cli_runner.invoke(
+            app, ["batch", str(input_file), str(output_file)], catch_exceptions=False
+        )
+
+    assert result.exit_code == 0
+    assert "Answered 1, failed 0, skipped 0" in result.output
+    assert output_file.read_text() == '{"id": 1, "response": "echo: hello"}\n'
+
+
+def test_bench_command(cli_runner):
+    result = cli_runner.invoke(
+        app,
+        [
+            "bench",
+            "--sessions",
+            "2",
+            "--requests",
+            "2",
+            "--latency",
+            "0",
+            "--tokens-per-second",
+            "0",
+            "--response-tokens",
+            "5",
+        ],
+        catch_exceptions=False,
+    )
+
+    assert result.exit_code == 0
+    assert "4 requests, 0 errors" in result.output
+    assert "Time to first token: p50" in result.output
+
+
+def test_ask_command(cli_runner, tmp_path, mock_config):
+    notes = tmp_path / "notes.txt"
+    notes.write_text("the answer is 42")
+
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        provider = mock_get_provider.return_value
+        result = cli_runner.invoke(
+            app,
+            ["ask", "--stdin", "-f", str(notes), "what", "is", "it?"],
+            input="piped text",
+            catch_exceptions=False,
+        )
+
+    assert result.exit_code == 0
+    _, user_content = provider.stream_response.call_args.args
+    assert user_content == (
+        f"File {notes}:\nthe answer is 42\n\n"
+        "Input:\npiped text\n\n"
+        "Question: what is it?\n"
+    )
+
+
+def test_ask_command_question_from_stdin(cli_runner, mock_config):
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        provider = mock_get_provider.return_value
+        result = cli_runner.invoke(app, ["ask"], input="why?\n")
+
+    assert result.exit_code == 0
+    assert provider.stream_response.call_args.args[1] == "Question: why?\n"
+
+
+def test_ask_command_leaves_stdin_alone(cli_runner, mock_config):
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        provider = mock_get_provider.return_value
+        result = cli_runner.invoke(app, ["ask", "hi"], input="next question\n")
+
+    assert result.exit_code == 0
+    assert provider.stream_response.call_args.args[1] == "Question: hi\n"
+
+
+def test_ask_command_model_override(cli_runner, mock_config):
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        result = cli_runner.invoke(
+            app, ["ask", "-m", "claude-3-5-sonnet-20241022", "hi"]
+        )
+        assert result.exit_code == 0
+        config = mock_get_provider.call_args.args[0]
+        assert config["current"] == {
+            "provider": "anthropic",
+            "model": "claude-3-5-sonnet-20241022",
+        }
+
+        result = cli_runner.invoke(app, ["ask", "-m", "invalid-model", "hi"])
+        assert result.exit_code == 2
+        assert "Model invalid-model not found" in result.output
+
+
+def test_ask_command_model_override_key_from_env(cli_runner, mock_config, monkeypatch):
+    del mock_config["anthropic"]
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "env-key")
+
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        result = cli_runner.invoke(
+            app, ["ask", "-m", "claude-3-5-sonnet-20241022", "hi"]
+        )
+
+    assert result.exit_code == 0
+    config = mock_get_provider.call_args.args[0]
+    assert config["anthropic"]["api_key"] == "env-key"
+
+
+def test_ask_command_missing_key(cli_runner, mock_config, monkeypatch):
+    del mock_config["anthropic"]
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        result = cli_runner.invoke(
+            app, ["ask", "-m", "claude-3-5-sonnet-20241022", "hi"]
+        )
+
+    assert result.exit_code == 1
+    assert not mock_get_provider.called
+    assert result.stdout == ""
+    assert "ANTHROPIC_API_KEY" in result.stderr
+
+
+def test_ask_command_errors(cli_runner, mock_config):
+    result = cli_runner.invoke(app, ["ask"], input="")
+    assert result.exit_code == 2
+    assert "Ask a question" in result.output
+
+    with (
+        patch("ipychat.cli.load_config", return_value=mock_config),
+        patch("ipychat.cli.get_provider") as mock_get_provider,
+    ):
+        provider = mock_get_provider.return_value
+        provider.stream_response.side_effect = ConnectionError("down")
+        result = cli_runner.invoke(app, ["ask", "hi"])
+        assert result.exit_code == 1
+
+        provider.stream_response.side_effect = RequestTimeout("Timed out")
+        result = cli_runner.invoke(app, ["ask", "hi"])
+        assert result.exit_code == 124
+
+        provider.stream_response.side_effect = StreamCancelled()
+        result = cli_runner.invoke(app, ["ask", "hi"])
+        assert result.exit_code == 130
+
+        provider.client = None
+        result = cli_runner.invoke(app, ["ask", "hi"])
+        assert result.exit_code == 1
+
+
+def test_cli_import_does_not_load_ipython():
+    code = (
+        "import sys, ipychat.cli\n"
+        "slow = ('IPython', 'questionary', 'openai', 'anthropic')\n"
+        "print(','.join(m for m in slow if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
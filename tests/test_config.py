@@ -88,3 +88,47 @@ def test_get_api_key_from_prompt(mock_config, monkeypatch):
     ):
         api_key = get_api_key("openai", mock_config)
         assert api_key == "prompt-key"
+
+
+def test_load_config_uses_cache(mock_config_file, monkeypatch):
+    monkeypatch.setattr("ipychat.config.get_config_file", lambda: mock_config_file)
+    load_config()
+
+    with patch("ipychat.config.toml.load") as mock_load:
+        config = load_config()
+        assert not mock_load.called
+
+    # callers get their own copy
+    config["current"]["model"] = "changed"
+    assert load_config()["current"]["model"] == "gpt-4o"
+
+
+def test_load_config_detects_changes(mock_config_file, mock_config, monkeypatch):
+    monkeypatch.setattr("ipychat.config.get_config_file", lambda: mock_config_file)
+    load_config()
+
+    # another process rewrites the file
+    mock_config["current"]["model"] = "gpt-4o-mini"
+    with open(mock_config_file, "w") as f:
+        toml.dump(mock_config, f)
+
+    assert load_config()["current"]["model"] == "gpt-4o-mini"
+
+
+def test_save_config_is_atomic(tmp_path: Path, mock_config, monkeypatch):
+    config_file = tmp_path / "config.toml"
+    monkeypatch.setattr("ipychat.config.get_config_file", lambda: config_file)
+    save_config(mock_config)
+
+    with (
+        patch("ipychat.config.toml.dump", side_effect=RuntimeError("disk full")),
+        pytest.raises(RuntimeError),
+    ):
+        save_config({"current": {"provider": "anthropic"}})
+
+    # the old file is untouched and no temporary files are left behind
+    assert toml.load(config_file) == mock_config
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "config.toml",
+        "config.toml.lock",
+    ]
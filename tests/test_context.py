@@ -3,13 +3,16 @@
 import inspect
 from dataclasses import dataclass
 from typing import List
+from unittest.mock import patch
 
 import numpy as np
 import pandas as pd
 import pytest
 
 from ipychat.context import (
+    VariableSummaryCache,
     extract_variables_from_query,
+    fingerprint,
     get_context_for_variables,
     get_variable_info,
 )
@@ -182,3 +185,57 @@ def test_get_variable_info_nested_structure():
     assert "Variable: nested" in info
     assert "Type: dict" in info
     assert "Sample:" in info
+
+
+def test_fingerprint_changes():
+    numbers = [1, 2, 3]
+    before = fingerprint(numbers)
+    numbers.append(4)
+    assert fingerprint(numbers) != before
+
+    df = pd.DataFrame({"A": [1, 2]})
+    before = fingerprint(df)
+    df["B"] = ["x", "y"]
+    assert fingerprint(df) != before
+
+    arr = np.zeros(3)
+    assert fingerprint(arr) == fingerprint(arr)
+    assert fingerprint(arr) != fingerprint(arr.copy())
+
+
+def test_variable_summary_cache(sample_namespace):
+    cache = VariableSummaryCache()
+    with patch(
+        "ipychat.context.get_variable_info", wraps=get_variable_info
+    ) as mock_info:
+        first = get_context_for_variables(sample_namespace, "Show me the df", cache)
+        second = get_context_for_variables(sample_namespace, "Show me the df", cache)
+        assert first == second
+        assert mock_info.call_count == 1
+
+        cache.invalidate_cell("df.loc[0, 'A'] = 10")
+        get_context_for_variables(sample_namespace, "Show me the df", cache)
+        assert mock_info.call_count == 2
+
+        sample_namespace["numbers"].append(4)
+        get_context_for_variables(sample_namespace, "Show me numbers", cache)
+        context = get_context_for_variables(sample_namespace, "Show me numbers", cache)
+        assert "Length: 4" in context
+        assert mock_info.call_count == 3
+
+
+def test_variable_summary_cache_memory_cap():
+    cache = VariableSummaryCache(max_bytes=200)
+    for i in range(10):
+        cache.get_info(f"text{i}", "x" * 50)
+    assert cache.size <= 200
+    assert len(cache) < 10
+
+
+def test_get_context_for_variables_punctuation(sample_namespace):
+    context = get_context_for_variables(sample_namespace, "what does df.head() do?")
+    assert "Variable: df" in context
+
+    context = get_context_for_variables(sample_namespace, "compare numbers,text")
+    assert "Variable: numbers" in context
+    assert "Variable: text" in context
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from ipychat.dataframe import is_dataframe, summarize_dataframe
+
+
+def test_is_dataframe():
+    assert is_dataframe(pd.DataFrame({"A": [1]}))
+    assert not is_dataframe(pd.Series([1]))
+    assert not is_dataframe({"A": [1]})
+
+
+def test_summarize_dataframe_stats():
+    df = pd.DataFrame(
+        {
+            "A": [1, 2, None, 4],
+            "B": ["x", "y", "x", "x"],
+        }
+    )
+    summary = "\n".join(summarize_dataframe(df))
+
+    assert "Shape: (4, 2)" in summary
+    assert "- A (float64) nulls=1 min=1 max=4 distinct=3" in summary
+    assert "- B (object) nulls=0 distinct=2 top=[x, y]" in summary
+    assert "Sample (first 5 rows):" in summary
+
+
+def test_summarize_dataframe_wide_frame():
+    df = pd.DataFrame(np.zeros((3, 500)))
+    df["label"] = "a"
+    lines = summarize_dataframe(df, max_columns=10)
+
+    assert sum(line.startswith("- ") for line in lines) == 10
+    assert "... 491 more columns: float64 x 490, object x 1" in lines
+
+
+def test_summarize_dataframe_samples_rows():
+    df = pd.DataFrame({"A": np.arange(1000)})
+    summary = "\n".join(summarize_dataframe(df, max_sample_rows=100))
+
+    assert "stats from a sample of 100 rows" in summary
+    assert "distinct~100" in summary
+
+
+def test_summarize_dataframe_large_frame():
+    df = pd.DataFrame({"A": np.arange(5_000_000), "B": np.zeros(5_000_000)})
+
+    start = time.perf_counter()
+    summary = "\n".join(summarize_dataframe(df))
+    assert time.perf_counter() - start < 0.5
+    assert "stats from a sample of 10000 rows" in summary
+
+
+def test_summarize_dataframe_time_budget():
+    df = pd.DataFrame({"A": ["x"] * 10})
+    summary = "\n".join(summarize_dataframe(df, time_budget=-1))
+
+    assert "- A (object)" in summary
+    assert "nulls=" not in summary
+    assert "cut short by the time budget" in summary
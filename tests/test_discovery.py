@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from ipychat.discovery import cell_names, extract_names, names_in_cell, rank_variables
+
+
+def test_extract_names():
+    assert extract_names("what does df.head() show") == ["what", "does", "df", "show"]
+    assert extract_names("is model's score ok") == ["is", "model", "s", "score", "ok"]
+    assert extract_names("compare x,y and (z)") == ["compare", "x", "y", "and", "z"]
+    assert extract_names("plot 3d data") == ["plot", "data"]
+
+
+def test_cell_names():
+    reads, writes = cell_names("df['total'] = df.a + b\nresult, other = f(x)")
+    assert reads == {"df", "b", "f", "x"}
+    assert writes == {"df", "result", "other"}
+
+    reads, writes = cell_names("import numpy as np\ndef g(): pass\nclass K: pass")
+    assert writes == {"np", "g", "K"}
+
+
+def test_cell_names_with_magics():
+    assert cell_names("%matplotlib inline\nfig = plot(data)") == (
+        frozenset({"plot", "data"}),
+        frozenset({"fig"}),
+    )
+    assert cell_names("def broken(:") is None
+
+
+def test_names_in_cell():
+    names = names_in_cell("import numpy as np\ndf['x'] = np.arange(3)\ndef f(): pass")
+    assert names == {"np", "df", "f"}
+    assert names_in_cell("for") is None
+
+
+def test_rank_variables():
+    namespace = {
+        "df": 1,
+        "model": 2,
+        "scores": 3,
+        "old": 4,
+        "np": np,
+        "_hidden": 5,
+        "In": [],
+    }
+    cells = [
+        "old = 1",
+        "scores = evaluate(model, df)",
+        "print(_hidden, In)",
+    ]
+
+    ranked = rank_variables(namespace, "why is model.predict slow", cells)
+    assert ranked == ["model", "scores", "old", "df"]
+
+
+def test_rank_variables_limits_cell_variables():
+    namespace = {f"v{i}": i for i in range(10)}
+    cells = [f"v{i} = {i}" for i in range(10)]
+
+    ranked = rank_variables(namespace, "v0", cells, max_cell_variables=3)
+    assert ranked == ["v0", "v9", "v8", "v7"]
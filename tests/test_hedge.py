@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from unittest.mock import patch
+
+import pytest
+
+from ipychat.providers import get_provider
+from ipychat.providers.anthropic import AnthropicProvider
+from ipychat.providers.base import BaseProvider
+from ipychat.providers.hedge import (
+    DEFAULT_DELAY,
+    HedgedProvider,
+    LatencyHistory,
+    secondary_config,
+)
+from ipychat.providers.openai import OpenAIProvider
+
+
+class SlowProvider(BaseProvider):
+    """Answer `text` after `delay` seconds, or fail with `error`."""
+
+    def __init__(self, config, name, delay=0.0, text="", error=None):
+        super().__init__(
+            {**config, "current": {"provider": name, "model": name}}, debug=False
+        )
+        self.delay = delay
+        self.text = text
+        self.error = error
+        self.closed = threading.Event()
+
+    def initialize_client(self) -> None:
+        self.client = object()
+
+    def stream_chat(self, system_prompt, user_content, history=None):
+        if self.closed.wait(self.delay):
+            return
+        if self.error is not None:
+            raise self.error
+        yield self.text
+
+    def open_stream(self, system_prompt, user_content, history=None):
+        stream = super().open_stream(system_prompt, user_content, history)
+        stream._add_closer(self.closed.set)
+        return stream
+
+
+def hedged(primary, secondary, delay=0.05):
+    provider = HedgedProvider(primary, secondary, delay=delay, history=LatencyHistory())
+    provider.initialize_client()
+    return provider
+
+
+def test_fast_primary_is_not_hedged(mock_config):
+    primary = SlowProvider(mock_config, "primary", text="primary")
+    secondary = SlowProvider(mock_config, "secondary", text="secondary")
+    provider = hedged(primary, secondary, delay=1)
+
+    assert list(provider.stream_chat("system", "user")) == ["primary"]
+    assert provider.hedged == 0
+    assert len(provider.latencies.samples("primary/primary")) == 1
+
+
+def test_slow_primary_is_hedged(mock_config):
+    primary = SlowProvider(mock_config, "primary", delay=5, text="primary")
+    secondary = SlowProvider(mock_config, "secondary", text="secondary")
+    provider = hedged(primary, secondary)
+
+    start = time.monotonic()
+    assert list(provider.stream_chat("system", "user")) == ["secondary"]
+    assert time.monotonic() - start < 1
+    assert primary.closed.is_set()
+    assert (provider.requests, provider.hedged, provider.secondary_wins) == (1, 1, 1)
+    # the cancelled primary is recorded at least as slow as the secondary
+    assert provider.latencies.samples("primary/primary")[0] >= 0.05
+
+
+def test_primary_wins_race_after_hedging(mock_config):
+    primary = SlowProvider(mock_config, "primary", delay=0.1, text="primary")
+    secondary = SlowProvider(mock_config, "secondary", delay=5, text="secondary")
+    provider = hedged(primary, secondary)
+
+    assert list(provider.stream_chat("system", "user")) == ["primary"]
+    assert secondary.closed.is_set()
+    assert (provider.hedged, provider.secondary_wins) == (1, 0)
+
+
+def test_failing_primary_fails_over(mock_config):
+    primary = SlowProvider(mock_config, "primary", error=ConnectionError("down"))
+    secondary = SlowProvider(mock_config, "secondary", text="secondary")
+    provider = hedged(primary, secondary, delay=5)
+
+    start = time.monotonic()
+    assert list(provider.stream_chat("system", "user")) == ["secondary"]
+    assert time.monotonic() - start < 1
+
+
+def test_both_failing_raises_primary_error(mock_config):
+    primary = SlowProvider(mock_config, "primary", error=ConnectionError("down"))
+    secondary = SlowProvider(mock_config, "secondary", error=ValueError("bad"))
+    provider = hedged(primary, secondary)
+
+    with pytest.raises(ConnectionError):
+        list(provider.stream_chat("system", "user"))
+
+
+def test_learned_threshold(mock_config):
+    history = LatencyHistory()
+    primary = SlowProvider(mock_config, "primary")
+    secondary = SlowProvider(mock_config, "secondary")
+    provider = HedgedProvider(primary, secondary, quantile=50, history=history)
+
+    assert provider.threshold() == DEFAULT_DELAY
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        history.add("primary/primary", seconds)
+    assert provider.threshold() == pytest.approx(0.3)
+
+
+def test_get_hedged_provider(mock_config):
+    mock_config["hedge"] = {"model": "claude-3-5-sonnet-20241022", "delay": 1.5}
+
+    provider = get_provider(mock_config, debug=False)
+
+    assert isinstance(provider, HedgedProvider)
+    assert isinstance(provider.primary, OpenAIProvider)
+    assert isinstance(provider.secondary, AnthropicProvider)
+    assert provider.secondary.model == "claude-3-5-sonnet-20241022"
+    assert provider.threshold() == 1.5
+
+
+def test_secondary_config_provider_override(mock_config):
+    mock_config["hedge"] = {"model": "gpt-4o-mini", "provider": "openai"}
+    assert secondary_config(mock_config)["current"] == {
+        "provider": "openai",
+        "model": "gpt-4o-mini",
+    }
+
+
+def test_cross_provider_hedge_key_from_env(mock_config, monkeypatch):
+    del mock_config["anthropic"]
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "env-key")
+    mock_config["hedge"] = {"model": "claude-3-5-sonnet-20241022"}
+
+    provider = get_provider(mock_config, debug=False)
+
+    assert provider.secondary.config["anthropic"]["api_key"] == "env-key"
+    assert provider.secondary.client is not None
+
+
+def test_warns_once_when_hedging_is_off(mock_config, monkeypatch):
+    del mock_config["anthropic"]
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    mock_config["hedge"] = {"model": "claude-3-5-sonnet-20241022"}
+    monkeypatch.setattr("ipychat.providers.hedge._warned", set())
+
+    with patch("rich.console.Console.print") as mock_print:
+        get_provider(mock_config, debug=False)
+        get_provider(mock_config, debug=False)
+
+    warnings = [
+        call.args[0] for call in mock_print.call_args_list if "Hedging" in call.args[0]
+    ]
+    assert warnings == [
+        "[yellow]Hedging with anthropic/claude-3-5-sonnet-20241022 is off, its "
+        "client could not be created.[/yellow]"
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+from ipychat.history import HistoryBuffer
+
+
+def test_history_buffer_filters_and_formats():
+    history = HistoryBuffer(10)
+    history.sync(["", "x = 1", "%ask what is x", "  ", "y = 2"])
+
+    assert history.cells == ["In [1]: x = 1", "In [4]: y = 2"]
+
+
+def test_history_buffer_is_incremental():
+    input_hist_raw = ["", "x = 1"]
+    history = HistoryBuffer(2)
+    history.sync(input_hist_raw)
+
+    input_hist_raw.extend(["y = 2", "z = 3"])
+    history.sync(input_hist_raw)
+    assert history.cells == ["In [2]: y = 2", "In [3]: z = 3"]
+
+    history.sync(input_hist_raw)
+    assert history.cells == ["In [2]: y = 2", "In [3]: z = 3"]
+
+
+class CountingList(list):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.reads = 0
+
+    def __getitem__(self, index):
+        self.reads += 1
+        return super().__getitem__(index)
+
+
+def test_history_buffer_reads_one_window():
+    input_hist_raw = CountingList([""] + [f"x = {i}" for i in range(10_000)])
+    history = HistoryBuffer(5)
+    history.sync(input_hist_raw)
+
+    assert input_hist_raw.reads == 5
+    assert history.cells[-1] == "In [10000]: x = 9999"
+
+
+def test_history_buffer_reset():
+    history = HistoryBuffer(5)
+    history.sync(["", "x = 1", "y = 2"])
+    history.sync(["", "z = 3"])
+
+    assert history.cells == ["In [1]: z = 3"]
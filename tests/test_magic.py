@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import time
 from unittest.mock import Mock, patch
 
 import pytest
 from IPython.core.interactiveshell import InteractiveShell
 from traitlets.config import Config
 
-from ipychat.magic import IPyChatMagics
+from ipychat.cancel import GuardedStream, StreamCancelled
+from ipychat import results
+from ipychat.magic import IPyChatMagics, split_flags
 
 
 @pytest.fixture
@@ -24,7 +27,7 @@ def ipython():
 @pytest.fixture
 def magic(ipython):
     with patch("ipychat.magic.get_provider") as mock_get_provider:
-        mock_provider = Mock()
+        mock_provider = Mock(last_usage={})
         mock_get_provider.return_value = mock_provider
         magic = IPyChatMagics(ipython)
         magic.provider = mock_provider
@@ -158,3 +161,165 @@ def test_magic_debug_inheritance(ipython):
         shell = InteractiveShell.instance(config=config)
         magic = IPyChatMagics(shell)
         assert magic.debug is False
+
+
+def test_split_flags():
+    assert split_flags("--no-cache what is df", {"no-cache"}) == (
+        {"no-cache"},
+        "what is df",
+    )
+    assert split_flags("what is --no-cache", {"no-cache"}) == (
+        set(),
+        "what is --no-cache",
+    )
+    assert split_flags("--other what", {"no-cache"}) == (set(), "--other what")
+
+
+def test_chat_query_cache(magic):
+    magic.shell = Mock()
+    magic.shell.user_ns = {}
+    magic.shell.history_manager = Mock()
+    magic.shell.history_manager.input_hist_raw = ["", "command1"]
+    magic.provider.generation_params.return_value = {"temperature": 0.7}
+    magic.provider.stream_response.return_value = "cached answer"
+
+    magic.ask("cache me")
+    assert magic.provider.stream_response.call_count == 1
+
+    # a fresh conversation sends the same request again
+    magic.ask("--new cache me")
+    assert magic.provider.stream_response.call_count == 1
+    magic.provider.render_stream.assert_called_once()
+    assert list(magic.provider.render_stream.call_args[0][0]) == ["cached answer"]
+
+    magic.ask("--no-cache --new cache me")
+    assert magic.provider.stream_response.call_count == 2
+
+
+def test_chat_query_background(magic):
+    magic.shell = Mock()
+    magic.shell.user_ns = {}
+    magic.shell.history_manager = Mock()
+    magic.shell.history_manager.input_hist_raw = ["", "command1"]
+    magic.provider.open_stream.return_value = GuardedStream(["background ", "answer"])
+
+    result = magic.ask("--no-cache --bg what is df")
+
+    assert result.result(timeout=5) == "background answer"
+    assert result.query == "what is df"
+    assert not magic.provider.stream_response.called
+
+
+def test_background_query_records_under_lock(magic):
+    magic.shell = Mock()
+    magic.shell.user_ns = {}
+    magic.shell.history_manager = Mock()
+    magic.shell.history_manager.input_hist_raw = ["", "command1"]
+    magic.provider.open_stream.return_value = GuardedStream(["answer"])
+    locked = []
+    magic.session.add_turn = Mock(
+        side_effect=lambda *args: locked.append(magic._lock.locked())
+    )
+
+    result = magic.ask("--no-cache --bg what is df")
+
+    assert result.result(timeout=5) == "answer"
+    assert wait_for(lambda: locked == [True])
+
+
+def test_post_run_cell_invalidates_summaries(magic, ipython):
+    ipython.run_cell("numbers = [1, 2, 3]")
+    magic.summary_cache.get_info("numbers", ipython.user_ns["numbers"])
+    magic.summary_cache.get_info("other", [1])
+    assert len(magic.summary_cache) == 2
+
+    ipython.run_cell("numbers[0] = 10")
+    assert len(magic.summary_cache) == 1
+
+
+def test_ask_stats(magic, capsys):
+    magic.shell = Mock()
+    magic.shell.user_ns = {}
+    magic.shell.history_manager = Mock()
+    magic.shell.history_manager.input_hist_raw = ["", "command1"]
+    magic.provider.generation_params.return_value = {}
+    magic.provider.stream_response.return_value = "an answer"
+    magic.provider.last_usage = {
+        "input_tokens": 1000,
+        "output_tokens": 10,
+        "cache_read_tokens": 800,
+        "cache_write_tokens": 0,
+    }
+
+    magic.ask("--no-cache first")
+    magic.ask("--no-cache second")
+    records = magic.metrics.records
+    assert len(records) == 2
+    assert {"context", "history", "prompt", "total"} <= set(records[0])
+    assert records[0]["response_chars"] == len("an answer")
+    assert magic.provider.stream_response.call_args[0][2] is not None
+
+    magic.ask_stats("")
+    output = capsys.readouterr().out
+    assert "Requests: 2 (0 answered from cache)" in output
+    assert "Provider prompt cache: 80% of input tokens read" in output
+
+    magic.ask_stats("clear")
+    assert magic.metrics.records == []
+
+
+def test_follow_up_questions(magic):
+    magic.shell = Mock()
+    magic.shell.user_ns = {"df": [1, 2, 3]}
+    magic.shell.history_manager = Mock()
+    magic.shell.history_manager.input_hist_raw = ["", "df = [1, 2, 3]"]
+    magic.provider.generation_params.return_value = {}
+    magic.provider.stream_response.return_value = "first answer"
+
+    magic.ask("--no-cache what is df")
+    system_prompt, first, _, messages = magic.provider.stream_response.call_args[0]
+    assert messages == []
+    assert "Variable: df" in first
+
+    magic.provider.stream_response.return_value = "second answer"
+    magic.ask("--no-cache and its length?")
+    _, second, _, messages = magic.provider.stream_response.call_args[0]
+    assert messages == [
+        {"role": "user", "content": first},
+        {"role": "assistant", "content": "first answer"},
+    ]
+    # the variable and the cell were already sent with the first question
+    assert "Variable: df" not in second
+    assert "df = [1, 2, 3]" not in second
+
+    magic.ask("--no-cache --new what is df")
+    assert magic.provider.stream_response.call_args[0][3] == []
+
+
+def test_interrupted_query_keeps_partial_answer(magic):
+    magic.shell = Mock()
+    magic.shell.user_ns = {}
+    magic.shell.history_manager = Mock()
+    magic.shell.history_manager.input_hist_raw = ["", "command1"]
+    magic.provider.generation_params.return_value = {}
+    magic.provider.stream_response.side_effect = StreamCancelled(
+        "Interrupted", "half an"
+    )
+
+    magic.ask("--no-cache what is df")
+
+    result = results.latest()
+    assert result.status == "cancelled"
+    assert result.text == "half an"
+    assert magic.session.turns == []
+
+
+def test_warmup_is_opt_in(magic):
+    assert magic.warmup is False
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
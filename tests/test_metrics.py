@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+import pytest
+
+from ipychat.metrics import MetricsLog, RequestTimer, percentile
+
+
+def slow_chunks():
+    time.sleep(0.02)
+    yield "Hello "
+    time.sleep(0.02)
+    yield "world"
+
+
+def test_percentile():
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([5], 99) == 5
+    assert percentile([1, 2, 3, 4, 5], 100) == 5
+    with pytest.raises(ValueError):
+        percentile([], 50)
+
+
+def test_request_timer():
+    timer = RequestTimer("openai", "gpt-4o")
+    with timer.stage("context"):
+        time.sleep(0.01)
+    with timer.stage("stream"):
+        assert "".join(timer.watch(slow_chunks())) == "Hello world"
+
+    record = timer.record("system", "user content", "Hello world")
+    assert record["provider"] == "openai"
+    assert record["context"] >= 0.01
+    assert record["dispatch"] >= 0.02
+    assert record["first_token"] >= record["dispatch"] + 0.01
+    assert record["tokens_per_second"] > 0
+    assert 0 <= record["render"] < 0.02
+    assert record["total"] >= record["first_token"]
+    assert record["response_chars"] == len("Hello world")
+
+
+def test_metrics_log_summary():
+    log = MetricsLog()
+    for total in (1.0, 2.0, 3.0):
+        log.add(
+            {"provider": "openai", "model": "gpt-4o", "cached": False, "total": total}
+        )
+    log.add({"provider": "openai", "model": "gpt-4o", "cached": True, "total": 0.1})
+
+    summary = log.summary()
+    assert summary["total"]["p50"] == 2.0
+    assert summary["total"]["max"] == 3.0
+    assert summary["total"]["count"] == 3
+    assert log.by_model() == {"openai/gpt-4o": {"count": 3, "total": 2.0}}
+
+
+def test_metrics_log_file(tmp_path):
+    path = tmp_path / "metrics" / "ask.jsonl"
+    log = MetricsLog.from_config({"metrics": {"log_file": str(path)}})
+    log.add({"cached": False, "total": 1.5})
+    log.add({"cached": True, "total": 0.1})
+
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["total"] for line in lines] == [1.5, 0.1]
+    assert MetricsLog.from_config({}).path is None
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+from ipychat.prompt import (
+    build_shell_content,
+    build_user_content,
+    estimate_tokens,
+    split_prompt,
+    get_token_budget,
+    truncate_to_tokens,
+)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("x" * 400, "openai") == 100
+    assert estimate_tokens("x" * 350, "anthropic") == 100
+
+
+def test_truncate_to_tokens():
+    assert truncate_to_tokens("short", 10) == "short"
+
+    truncated = truncate_to_tokens("x" * 1000, 50, "openai")
+    assert truncated.endswith("(truncated)")
+    assert estimate_tokens(truncated, "openai") <= 50
+
+
+def test_get_token_budget(mock_config):
+    mock_config["context"] = {"max_tokens": 1_000_000}
+    assert get_token_budget(mock_config) == 128_000 - 2000
+
+    mock_config["context"] = {"max_tokens": 5000}
+    assert get_token_budget(mock_config) == 5000
+
+    mock_config["current"]["model"] = "custom-model"
+    assert get_token_budget(mock_config) == 5000
+
+
+def test_build_user_content_fits_everything():
+    content = build_user_content(
+        "what is df", ["Variable: df"], ["In [1]: x = 1", "In [2]: y = 2"], 10_000
+    )
+    assert content == (
+        "Context:\nVariable: df\n\n"
+        "Earlier IPython history:\n\n\n"
+        "Recent IPython history:\nIn [1]: x = 1\nIn [2]: y = 2\n\n"
+        "Question: what is df \n"
+    )
+
+
+def test_build_user_content_respects_budget():
+    variables = ["Variable: df\n" + "d" * 4000]
+    history = [f"In [{i}]: " + "h" * 400 for i in range(1, 31)]
+
+    content = build_user_content(
+        "what is df", variables, history, 2000, provider="openai"
+    )
+
+    assert estimate_tokens(content, "openai") <= 2000
+    assert "Question: what is df" in content
+    assert "Variable: df" in content
+    # the newest cells win over older ones
+    assert "In [30]:" in content
+    assert "In [1]:" not in content
+
+
+def test_build_user_content_prefers_variables_over_history():
+    variables = ["Variable: df\n" + "d" * 2000]
+    history = ["In [1]: " + "h" * 2000]
+
+    content = build_user_content("q", variables, history, 700, provider="openai")
+    assert variables[0] in content
+    assert history[0] not in content
+    assert "(truncated)" in content
+
+
+def test_build_user_content_stable_prefix():
+    history = [f"In [{i}]: x = {i}" for i in range(1, 21)]
+    first = build_user_content(
+        "what is a", ["Variable: b", "Variable: a"], history, 10_000
+    )
+    second = build_user_content(
+        "and b?", ["Variable: a", "Variable: b"], history, 10_000
+    )
+
+    first_sections = split_prompt(first)
+    second_sections = split_prompt(second)
+    assert len(first_sections) == 3
+    assert "".join(first_sections) == first
+    assert first_sections[0] == "Context:\nVariable: a\nVariable: b\n\n"
+    assert "In [10]:" in first_sections[1] and "In [11]:" in first_sections[2]
+    assert first_sections[:2] == second_sections[:2]
+
+
+def test_split_prompt_other_content():
+    assert split_prompt("just a question") == ["just a question"]
+
+
+def test_build_shell_content():
+    inputs = [("File a.py", "a" * 400), ("Input", "b" * 400)]
+
+    content = build_shell_content("why?", inputs, budget=1000, system_prompt="")
+    assert (
+        content == f"File a.py:\n{'a' * 400}\n\nInput:\n{'b' * 400}\n\nQuestion: why?\n"
+    )
+
+    content = build_shell_content("why?", inputs, budget=150, system_prompt="")
+    assert content.endswith("Question: why?\n")
+    assert "Input:" not in content
+    assert estimate_tokens(content) <= 150
@@ -1,13 +1,27 @@
 # -*- coding: utf-8 -*-
 
-from unittest.mock import Mock, patch
+import asyncio
+import io
+import subprocess
+import sys
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
-
-from ipychat.providers import get_provider
+from rich.console import Console
+
+from ipychat.prompt import build_user_content
+from ipychat.providers import (
+    PROVIDER_REGISTRY,
+    get_pool_stats,
+    get_provider,
+    get_provider_class,
+    register_provider,
+)
 from ipychat.providers.anthropic import AnthropicProvider
+from ipychat.providers.base import BaseProvider
 from ipychat.providers.google import GoogleProvider
 from ipychat.providers.openai import OpenAIProvider
+from ipychat.providers.pool import ClientPool
 
 
 def test_get_provider(mock_config):
@@ -176,3 +190,266 @@ def test_google_provider_missing_api_key(mock_config):
     mock_console.print.assert_called_once_with(
         "[red]Set [bold]GOOGLE_API_KEY[/bold] in your environment, or run [bold]ipychat config[/bold].[/red]"
     )
+
+
+def test_import_does_not_load_vendor_sdks():
+    code = (
+        "import sys, ipychat, ipychat.magic\n"
+        "sdks = ('openai', 'anthropic', 'google.generativeai', 'gen_ai_hub')\n"
+        "print(','.join(m for m in sdks if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_get_provider_class_is_lazy():
+    with patch("ipychat.providers.import_module") as mock_import:
+        mock_import.return_value = Mock(AnthropicProvider=AnthropicProvider)
+        assert get_provider_class("anthropic") is AnthropicProvider
+        mock_import.assert_called_once_with("ipychat.providers.anthropic")
+
+
+def test_register_provider(mock_config):
+    register_provider("custom", "ipychat.providers.openai:OpenAIProvider")
+    try:
+        mock_config["current"]["provider"] = "custom"
+        assert isinstance(get_provider(mock_config), OpenAIProvider)
+    finally:
+        PROVIDER_REGISTRY.pop("custom")
+
+
+class FakeProvider(BaseProvider):
+    def initialize_client(self) -> None:
+        self.client = object()
+
+    def stream_chat(self, system_prompt, user_content):
+        yield "hello "
+        yield user_content
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_base_provider_astream_chat_fallback(mock_config):
+    provider = FakeProvider(mock_config)
+    provider.initialize_client()
+
+    responses = asyncio.run(collect(provider.astream_chat("system", "world")))
+    assert responses == ["hello ", "world"]
+
+
+async def async_chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_openai_provider_astream_chat(mock_config):
+    provider = OpenAIProvider(mock_config)
+    provider.initialize_client()
+
+    mock_response = Mock()
+    mock_response.choices = [Mock(delta=Mock(content="test response"))]
+
+    with patch.object(
+        provider.async_client.chat.completions, "create", new_callable=AsyncMock
+    ) as mock_create:
+        mock_create.return_value = async_chunks([mock_response])
+
+        responses = asyncio.run(collect(provider.astream_chat("system", "user")))
+        assert responses == ["test response"]
+        assert mock_create.call_args.kwargs["stream"] is True
+
+
+def test_anthropic_provider_astream_chat(mock_config):
+    provider = AnthropicProvider(mock_config)
+    provider.initialize_client()
+
+    mock_chunk = Mock()
+    mock_chunk.type = "content_block_delta"
+    mock_chunk.delta = Mock(text="test response")
+
+    with patch.object(
+        provider.async_client.messages, "create", new_callable=AsyncMock
+    ) as mock_create:
+        mock_create.return_value = async_chunks([mock_chunk])
+
+        responses = asyncio.run(collect(provider.astream_chat("system", "user")))
+        assert responses == ["test response"]
+
+
+def test_client_pool():
+    pool = ClientPool()
+    factory = Mock(side_effect=lambda: object())
+
+    first = pool.get("openai", "key", None, factory)
+    assert pool.get("openai", "key", None, factory) is first
+    assert pool.get("openai", "other-key", None, factory) is not first
+    assert factory.call_count == 2
+
+    stats = pool.stats()
+    assert stats == {
+        "clients": 2,
+        "hits": 1,
+        "misses": 2,
+        "endpoints": [("openai", None), ("openai", None)],
+    }
+
+
+def test_providers_share_pooled_clients(mock_config):
+    first = get_provider(mock_config)
+    mock_config["current"]["provider"] = "anthropic"
+    get_provider(mock_config)
+    mock_config["current"]["provider"] = "openai"
+    second = get_provider(mock_config)
+
+    assert second.client is first.client
+    assert get_pool_stats()["hits"] >= 1
+
+
+def test_anthropic_provider_cache_breakpoints(mock_config):
+    provider = AnthropicProvider(mock_config)
+    provider.initialize_client()
+
+    request = provider._request(
+        "system prompt",
+        build_user_content("q", ["Variable: df"], ["In [1]: x = 1"], 10_000),
+    )
+    assert request["system"][0]["cache_control"] == {"type": "ephemeral"}
+    content = request["messages"][0]["content"]
+    assert len(content) == 3
+    assert [("cache_control" in block) for block in content] == [True, True, False]
+
+    request = provider._request("system prompt", "a plain prompt")
+    assert request["messages"][0]["content"] == [
+        {"type": "text", "text": "a plain prompt"}
+    ]
+
+
+def test_anthropic_provider_reports_cache_usage(mock_config):
+    provider = AnthropicProvider(mock_config)
+    provider.initialize_client()
+
+    usage = Mock(
+        input_tokens=10, cache_read_input_tokens=900, cache_creation_input_tokens=100
+    )
+    events = [
+        Mock(type="message_start", message=Mock(usage=usage)),
+        Mock(type="content_block_delta", delta=Mock(text="hi")),
+        Mock(type="message_delta", usage=Mock(output_tokens=5)),
+    ]
+    with patch.object(provider.client.messages, "create", return_value=events):
+        assert list(provider.stream_chat("system", "user")) == ["hi"]
+
+    assert provider.last_usage == {
+        "input_tokens": 1010,
+        "output_tokens": 5,
+        "cache_read_tokens": 900,
+        "cache_write_tokens": 100,
+    }
+
+
+def test_openai_provider_reports_cache_usage(mock_config):
+    provider = OpenAIProvider(mock_config)
+    provider.initialize_client()
+
+    content = Mock(choices=[Mock(delta=Mock(content="hi"))], usage=None)
+    usage = Mock(
+        choices=[],
+        usage=Mock(
+            prompt_tokens=2000,
+            completion_tokens=5,
+            prompt_tokens_details=Mock(cached_tokens=1536),
+        ),
+    )
+    with patch.object(provider.client.chat.completions, "create") as mock_create:
+        mock_create.return_value = [content, usage]
+        assert list(provider.stream_chat("system", "user")) == ["hi"]
+        assert mock_create.call_args[1]["stream_options"] == {"include_usage": True}
+
+    assert provider.last_usage == {
+        "input_tokens": 2000,
+        "output_tokens": 5,
+        "cache_read_tokens": 1536,
+        "cache_write_tokens": 0,
+    }
+
+
+HISTORY = [
+    {"role": "user", "content": "what is df"},
+    {"role": "assistant", "content": "a list"},
+]
+
+
+def test_stream_turn_inlines_history_for_other_providers(mock_config):
+    class EchoProvider(BaseProvider):
+        def initialize_client(self):
+            self.client = object()
+
+        def stream_chat(self, system_prompt, user_content):
+            yield user_content
+
+    provider = EchoProvider(mock_config)
+    assert list(provider.stream_turn("system", "and now?")) == ["and now?"]
+    assert list(provider.stream_turn("system", "and now?", HISTORY)) == [
+        "Earlier conversation:\nUser: what is df\n\nAssistant: a list\n\nand now?"
+    ]
+
+
+def test_openai_provider_history(mock_config):
+    provider = OpenAIProvider(mock_config)
+    provider.initialize_client()
+
+    messages = provider._messages("system", "and now?", HISTORY)
+    assert [message["role"] for message in messages] == [
+        "system",
+        "user",
+        "assistant",
+        "user",
+    ]
+
+
+def test_anthropic_provider_history(mock_config):
+    provider = AnthropicProvider(mock_config)
+    provider.initialize_client()
+
+    messages = provider._request("system", "and now?", HISTORY)["messages"]
+    assert [message["role"] for message in messages] == ["user", "assistant", "user"]
+    assert messages[1]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert HISTORY[1]["content"] == "a list"
+
+
+def test_render_stream_writes_plain_text_when_not_a_terminal(mock_config):
+    provider = FakeProvider(mock_config)
+    provider.console = Console(file=io.StringIO(), force_terminal=False)
+
+    assert provider.render_stream(iter(["# Title", "\n\ntext"])) == "# Title\n\ntext"
+    assert provider.console.file.getvalue() == "# Title\n\ntext\n"
+
+
+def test_render_stream_renders_markdown_in_a_terminal(mock_config):
+    provider = FakeProvider(mock_config)
+    provider.console = Console(file=io.StringIO(), force_terminal=True, width=40)
+
+    assert provider.render_stream(iter(["# Title", "\n\n**bold**"])) == (
+        "# Title\n\n**bold**"
+    )
+    output = provider.console.file.getvalue()
+    assert "**" not in output
+    assert "bold" in output
+
+
+def test_render_stream_uses_display_handles_in_jupyter(mock_config):
+    provider = FakeProvider(mock_config)
+    provider.console = Console(file=io.StringIO(), force_jupyter=True)
+
+    with patch("IPython.display.display") as display:
+        assert provider.render_stream(iter(["Some ", "text"])) == "Some text"
+
+    assert display.call_args.kwargs == {"raw": True, "display_id": True}
+    update = display.return_value.update.call_args
+    assert update.args[0]["text/plain"] == "Some text"
+    assert update.kwargs == {"raw": True}
+    assert provider.console.file.getvalue() == ""
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from ipychat.cancel import GuardedStream
+from ipychat.render import JupyterDisplay, MarkdownStream, RefreshPace, coalesce
+
+
+def frozen_blocks(live):
+    return [
+        call.args[0].markup for call in live.console.print.call_args_list if call.args
+    ]
+
+
+def test_markdown_stream_freezes_completed_blocks():
+    live = Mock()
+    stream = MarkdownStream(live)
+
+    for chunk in ["# Ti", "tle\n", "\nSome ", "text\n\nMore"]:
+        stream.feed(chunk)
+
+    assert frozen_blocks(live) == ["# Title\n", "Some text\n"]
+    assert live.update.call_args.args[0].markup == "More"
+
+    stream.close()
+    assert stream.text == "# Title\n\nSome text\n\nMore"
+    assert frozen_blocks(live) == ["# Title\n", "Some text\n"]
+
+
+def test_markdown_stream_keeps_code_fences_together():
+    live = Mock()
+    stream = MarkdownStream(live)
+
+    stream.feed("```python\nx = 1\n\ny = 2\n")
+    assert frozen_blocks(live) == []
+    assert "y = 2" in live.update.call_args.args[0].markup
+
+    stream.feed("```\nDone")
+    assert frozen_blocks(live) == ["```python\nx = 1\n\ny = 2\n```\n"]
+
+
+def test_markdown_stream_only_renders_open_block():
+    live = Mock()
+    stream = MarkdownStream(live)
+
+    for i in range(100):
+        stream.feed(f"Paragraph {i}\n\n")
+
+    # the last paragraph stays open until the next block starts
+    assert len(frozen_blocks(live)) == 99
+    assert live.update.call_args.args[0].markup == "Paragraph 99\n\n"
+
+
+def test_markdown_stream_keeps_lists_together():
+    live = Mock()
+    stream = MarkdownStream(live)
+
+    text = (
+        "1. Install:\n\n"
+        "    ```bash\n    pip install x\n\n    pip install y\n    ```\n\n"
+        "2. Run it\n\nDone\n"
+    )
+    for i in range(0, len(text), 3):
+        stream.feed(text[i : i + 3])
+
+    assert frozen_blocks(live) == [text[: -len("\nDone\n")]]
+
+
+def test_refresh_pace_adapts_to_refresh_cost():
+    pace = RefreshPace(min_interval=0.01, max_interval=1.0, budget=0.1)
+    assert pace.interval == 0.01
+
+    pace.record(0.05)
+    assert pace.interval == pytest.approx(0.5)
+    for _ in range(20):
+        pace.record(0.0001)
+    assert pace.interval == 0.01
+
+
+def test_coalesce_merges_chunks_within_interval():
+    def chunks():
+        yield "first"
+        for i in range(5):
+            yield f" {i}"
+        time.sleep(0.2)
+        yield " late"
+
+    pace = RefreshPace(min_interval=0.05)
+    deltas = list(coalesce(GuardedStream(chunks()), pace))
+
+    assert deltas == ["first", " 0 1 2 3 4", " late"]
+
+
+def test_coalesce_limits_delta_size():
+    pace = RefreshPace(min_interval=1.0, max_chars=4)
+    deltas = list(coalesce(GuardedStream(iter("abcdefghij")), pace))
+    assert deltas == ["a", "bcde", "fghi", "j"]
+
+
+def test_coalesce_shows_text_before_error():
+    def chunks():
+        yield "a"
+        yield "b"
+        raise ValueError("boom")
+
+    stream = coalesce(GuardedStream(chunks()), RefreshPace(min_interval=1.0))
+    assert next(stream) == "a"
+    assert next(stream) == "b"
+    with pytest.raises(ValueError):
+        next(stream)
+
+
+def test_coalesce_passes_other_iterables_through():
+    assert list(coalesce(["a", "b"], RefreshPace())) == ["a", "b"]
+
+
+@pytest.fixture
+def notebook():
+    """Record the outputs shown through IPython display handles."""
+    outputs = []
+
+    def markup(bundle, raw):
+        assert raw
+        # plain text front ends show the markup too
+        assert bundle["text/plain"] == bundle["text/markdown"]
+        return bundle["text/markdown"]
+
+    def display(bundle, raw=False, display_id=None):
+        outputs.append([markup(bundle, raw)])
+        handle = Mock()
+        handle.update.side_effect = lambda bundle, raw=False: outputs[index].append(
+            markup(bundle, raw)
+        )
+        index = len(outputs) - 1
+        return handle
+
+    with patch("IPython.display.display", display):
+        yield outputs
+
+
+def test_jupyter_display_updates_open_block_in_place(notebook):
+    stream = MarkdownStream(JupyterDisplay())
+    for chunk in ["# Ti", "tle\n", "\nSome ", "text\n\nMore"]:
+        stream.feed(chunk)
+    stream.close()
+
+    # one output per block, each showing the block as it grew
+    assert [updates[-1] for updates in notebook] == ["# Title\n", "Some text\n", "More"]
+    assert notebook[0] == ["# Ti", "# Title\n"]
+
+
+def test_jupyter_output_is_proportional_to_answer(notebook):
+    stream = MarkdownStream(JupyterDisplay())
+    text = "".join(f"Paragraph {i} has some words in it.\n\n" for i in range(200))
+    for i in range(0, len(text), 5):
+        stream.feed(text[i : i + 5])
+    stream.close()
+
+    sent = sum(len(data) for updates in notebook for data in updates)
+    assert len(notebook) == 200
+    assert sent < 10 * len(text)
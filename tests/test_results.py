@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from ipychat import results
+from ipychat.cancel import GuardedStream, StreamCancelled, on_cancel
+
+
+@pytest.fixture(autouse=True)
+def clear_store():
+    results.store.clear()
+    yield
+    results.store.clear()
+
+
+def test_submit_collects_response():
+    result = results.submit("what is df", lambda: iter(["df is ", "a DataFrame"]))
+    assert result.result(timeout=5) == "df is a DataFrame"
+    assert result.status == "done"
+    assert results.get(result.id) is result
+    assert results.latest() is result
+
+
+def test_submit_records_errors():
+    def stream():
+        yield "partial"
+        raise RuntimeError("boom")
+
+    result = results.submit("fail", stream)
+    with pytest.raises(RuntimeError):
+        result.result(timeout=5)
+    assert result.status == "error"
+    assert result.text == "partial"
+
+
+def test_submit_calls_on_done():
+    finished = threading.Event()
+    result = results.submit("query", lambda: ["answer"], lambda r: finished.set())
+    assert finished.wait(timeout=5)
+    assert result.text == "answer"
+
+
+def test_status_line_reports_changes_once():
+    result = results.submit("query", lambda: ["answer"])
+    result.result(timeout=5)
+
+    assert "#1 done" in results.store.status_line()
+    assert results.store.status_line() == ""
+    assert "#1 done" in repr(result)
+
+
+def test_cancel_background_result():
+    closed = threading.Event()
+
+    def hanging():
+        on_cancel(closed.set)
+        yield "partial "
+        closed.wait(5)
+
+    chunks = GuardedStream(hanging())
+    result = results.submit("slow", lambda: chunks, cancel=chunks.cancel)
+    while result.text != "partial ":
+        time.sleep(0.01)
+
+    result.cancel()
+    with pytest.raises(StreamCancelled):
+        result.result(timeout=5)
+    assert result.status == "cancelled"
+    assert result.text == "partial "
+    assert closed.is_set()
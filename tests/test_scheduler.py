@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import anthropic
+import httpx
+import openai
+import pytest
+
+from ipychat.scheduler import (
+    AIMDLimiter,
+    MAX_CONCURRENCY,
+    SLOT_POLL,
+    Scheduler,
+    TokenBucket,
+    get_scheduler,
+    parse_duration,
+    parse_rate_limits,
+    parse_retry_after,
+    report_headers,
+)
+
+
+class Response:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = Response(headers)
+
+
+def failing(errors, chunks=("answer",)):
+    """Return a stream factory failing with `errors` before it succeeds."""
+    calls = []
+
+    def make_stream():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        yield from chunks
+
+    return make_stream, calls
+
+
+def fast_scheduler(**kwargs):
+    return Scheduler("test", base_delay=0.001, max_delay=0.01, **kwargs)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60, capacity=2)
+    assert bucket.delay(1) == 0
+    bucket.take(2)
+    assert bucket.delay(1) == pytest.approx(1, abs=0.05)
+    # requests larger than the bucket wait for a full bucket only
+    assert bucket.delay(10) == pytest.approx(2, abs=0.05)
+
+    unlimited = TokenBucket()
+    unlimited.take(100)
+    assert unlimited.delay(100) == 0
+
+
+def test_token_bucket_follows_provider():
+    bucket = TokenBucket()
+    bucket.sync(limit=120, remaining=0)
+    assert bucket.rate == 120
+    assert bucket.delay(1) == pytest.approx(0.5, abs=0.05)
+
+    configured = TokenBucket(60)
+    configured.sync(limit=600, remaining=None)
+    assert configured.rate == 60
+
+
+def test_aimd_limiter():
+    limiter = AIMDLimiter(initial=2, maximum=4)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+
+    limiter.release()
+    assert limiter.limit == 2.5
+    limiter.release(throttled=True)
+    assert limiter.limit == 1.25
+    assert limiter.active == 0
+
+    for _ in range(100):
+        limiter.try_acquire()
+        limiter.release()
+    assert limiter.limit == 4
+
+
+def test_parse_openai_headers():
+    limits = parse_rate_limits(
+        {
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "499",
+            "x-ratelimit-reset-requests": "120ms",
+            "x-ratelimit-limit-tokens": "30000",
+            "x-ratelimit-remaining-tokens": "29000",
+            "x-ratelimit-reset-tokens": "2m0.5s",
+        }
+    )
+    assert limits["requests"] == {"limit": 500, "remaining": 499, "reset": 0.12}
+    assert limits["tokens"] == {"limit": 30000, "remaining": 29000, "reset": 120.5}
+
+
+def test_parse_anthropic_headers():
+    reset = datetime.now(timezone.utc) + timedelta(seconds=30)
+    limits = parse_rate_limits(
+        {
+            "anthropic-ratelimit-requests-limit": "50",
+            "anthropic-ratelimit-requests-remaining": "0",
+            "anthropic-ratelimit-requests-reset": reset.isoformat().replace(
+                "+00:00", "Z"
+            ),
+        }
+    )
+    assert limits["requests"]["limit"] == 50
+    assert limits["requests"]["reset"] == pytest.approx(30, abs=1)
+    assert "tokens" not in limits
+
+
+def test_parse_durations():
+    assert parse_duration("1h2m3s") == 3723
+    assert parse_duration("7.5") == 7.5
+    assert parse_duration("soon") is None
+    assert parse_retry_after({"retry-after-ms": "250", "retry-after": "1"}) == 0.25
+    assert parse_retry_after({"retry-after": "2"}) == 2
+    assert parse_retry_after({}) is None
+
+
+def test_retries_throttled_request():
+    scheduler = fast_scheduler()
+    make_stream, calls = failing([APIError(429), APIError(503)])
+
+    assert list(scheduler.stream(make_stream)) == ["answer"]
+    assert len(calls) == 3
+    stats = scheduler.stats()
+    assert (stats["retries"], stats["throttled"], stats["active"]) == (2, 1, 0)
+    assert scheduler.concurrency.limit < MAX_CONCURRENCY
+
+
+def test_retries_connection_errors():
+    request = httpx.Request("POST", "https://api.example.com/v1/")
+    scheduler = fast_scheduler()
+    make_stream, calls = failing(
+        [
+            openai.APIConnectionError(request=request),
+            anthropic.APITimeoutError(request=request),
+            httpx.ReadTimeout("timed out", request=request),
+        ]
+    )
+
+    assert list(scheduler.stream(make_stream)) == ["answer"]
+    assert len(calls) == 4
+    assert scheduler.stats()["throttled"] == 0
+
+
+def test_retry_after_pauses_provider():
+    scheduler = fast_scheduler()
+    make_stream, calls = failing([APIError(429, {"retry-after": "0.2"})])
+
+    assert list(scheduler.stream(make_stream)) == ["answer"]
+    assert calls[1] - calls[0] >= 0.2
+
+
+def test_does_not_retry_client_errors():
+    scheduler = fast_scheduler()
+    make_stream, calls = failing([APIError(400)])
+
+    with pytest.raises(APIError):
+        list(scheduler.stream(make_stream))
+    assert len(calls) == 1
+    assert scheduler.stats()["active"] == 0
+
+
+def test_gives_up_after_max_retries():
+    scheduler = fast_scheduler(max_retries=2)
+    make_stream, calls = failing([APIError(500)] * 5)
+
+    with pytest.raises(APIError):
+        list(scheduler.stream(make_stream))
+    assert len(calls) == 3
+
+
+def test_does_not_retry_started_stream():
+    scheduler = fast_scheduler()
+    calls = []
+
+    def make_stream():
+        calls.append(1)
+        yield "partial"
+        raise APIError(500)
+
+    with pytest.raises(APIError):
+        list(scheduler.stream(make_stream))
+    assert len(calls) == 1
+
+
+def test_concurrency_starts_at_maximum():
+    scheduler = fast_scheduler(max_concurrency=8)
+    streams = [scheduler.stream(lambda: iter(["a"])) for _ in range(8)]
+    assert [next(stream) for stream in streams] == ["a"] * 8
+    assert len(scheduler.queue_times) == 8
+    assert max(scheduler.queue_times) < SLOT_POLL
+
+
+def test_concurrency_limit():
+    scheduler = fast_scheduler(max_concurrency=1)
+    first = scheduler.stream(lambda: iter(["a", "b"]))
+    assert next(first) == "a"
+    assert scheduler._reserve(0) > 0
+
+    assert list(first) == ["b"]
+    assert scheduler._reserve(0) == 0
+
+
+def test_astream_retries():
+    scheduler = fast_scheduler()
+    calls = []
+
+    async def make_stream():
+        calls.append(1)
+        if len(calls) == 1:
+            raise APIError(429)
+        yield "answer"
+
+    async def collect():
+        return [content async for content in scheduler.astream(make_stream)]
+
+    assert asyncio.run(collect()) == ["answer"]
+    assert len(calls) == 2
+
+
+def test_report_headers_reach_scheduler():
+    scheduler = fast_scheduler()
+
+    def make_stream():
+        report_headers(
+            {"x-ratelimit-limit-requests": "60", "x-ratelimit-remaining-requests": "0"}
+        )
+        yield "answer"
+
+    assert list(scheduler.stream(make_stream)) == ["answer"]
+    assert scheduler.requests.rate == 60
+    assert scheduler.requests.delay(1) > 0
+
+
+def test_get_scheduler_is_shared_per_quota(mock_config):
+    scheduler = get_scheduler("openai", mock_config)
+    assert get_scheduler("openai", mock_config) is scheduler
+
+    other = {**mock_config, "openai": {"api_key": "other-key"}}
+    assert get_scheduler("openai", other) is not scheduler
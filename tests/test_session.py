@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from ipychat.session import ChatSession
+
+
+def test_session_messages():
+    session = ChatSession()
+    session.add_turn(
+        "q1", "Context:\nVariable: df\n\nQuestion: q1", "a1", ["Variable: df"]
+    )
+    assert session.messages() == [
+        {"role": "user", "content": "Context:\nVariable: df\n\nQuestion: q1"},
+        {"role": "assistant", "content": "a1"},
+    ]
+
+
+def test_session_skips_empty_answers():
+    session = ChatSession()
+    session.add_turn("q1", "q1", "")
+    session.add_turn("q2", "q2", "  \n")
+    assert session.turns == []
+
+
+def test_session_unsent():
+    session = ChatSession()
+    session.add_turn(
+        "q1",
+        "Variable: df\nIn [1]: x = 1\nq1",
+        "a1",
+        ["Variable: df", "Variable: truncated"],
+        ["In [1]: x = 1"],
+    )
+
+    variables, cells = session.unsent(
+        ["Variable: df", "Variable: truncated", "Variable: new"],
+        ["In [1]: x = 1", "In [2]: y = 2"],
+    )
+    assert variables == ["Variable: truncated", "Variable: new"]
+    assert cells == ["In [2]: y = 2"]
+
+
+def test_session_compaction():
+    session = ChatSession(max_tokens=200, keep_turns=2)
+    for i in range(5):
+        session.add_turn(f"question {i}", "c" * 200, f"answer {i} " + "a" * 100)
+
+    assert session.compactions > 0
+    assert len(session.turns) <= 2
+    assert session.turns[-1].query == "question 4"
+    assert "- Asked: question 0" in session.summary
+    messages = session.messages()
+    assert messages[0]["role"] == "user"
+    assert messages[0]["content"].startswith("Summary of the earlier conversation:")
+    assert "- Asked: question 0" in messages[0]["content"]
+    assert messages[1]["role"] == "assistant"
+    assert len(messages) == 2 + 2 * len(session.turns)
+    assert session.tokens() < 5 * (200 + 110) // 3.5
+
+    session.clear()
+    assert session.messages() == []
+    assert session.summary == ""
+
+
+def test_session_from_config():
+    assert ChatSession.from_config({"session": {"enabled": False}}) is None
+    session = ChatSession.from_config({"session": {"max_tokens": 100}})
+    assert session.max_tokens == 100
+
+
+def test_session_concurrent_turns():
+    session = ChatSession(max_tokens=100_000)
+
+    def add_turns(thread):
+        for i in range(50):
+            session.add_turn(f"{thread}", "c" * 100, f"{i}")
+
+    threads = [threading.Thread(target=add_turns, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(session.turns) == 200
+    for t in range(4):
+        answers = [turn.response for turn in session.turns if turn.query == f"{t}"]
+        assert answers == [f"{i}" for i in range(50)]
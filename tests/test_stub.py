@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from ipychat.bench import bench_config, run_bench
+from ipychat.providers import get_provider
+from ipychat.stub import StubConfig, StubServer
+
+
+@pytest.fixture
+def stub_server():
+    with StubServer(
+        StubConfig(latency=0, tokens_per_second=0, response_tokens=3)
+    ) as server:
+        yield server
+
+
+@pytest.mark.parametrize("provider_name", ["openai", "anthropic"])
+def test_providers_stream_from_stub(stub_server, provider_name):
+    provider = get_provider(bench_config(provider_name, stub_server.url), debug=False)
+    text = "".join(provider.stream_chat("system", "question"))
+    assert text == "the data frame "
+
+
+def test_stub_errors(stub_server):
+    stub_server.config.error_rate = 1.0
+    summary = run_bench("openai", stub_server.url, sessions=2, requests=2, retries=0)
+    assert summary["requests"] == 4
+    assert summary["errors"] == 4
+    assert "first_token" not in summary
+
+
+def test_run_bench(stub_server):
+    summary = run_bench("anthropic", stub_server.url, sessions=3, requests=2)
+    assert summary["requests"] == 6
+    assert summary["errors"] == 0
+    assert set(summary["first_token"]) == {"p50", "p95", "p99"}
+    assert summary["queue"]["p95"] < summary["first_token"]["p95"]
+    assert summary["throughput"] > 0
+
+
+def test_bench_config_rejects_other_providers():
+    with pytest.raises(ValueError):
+        bench_config("google", "http://localhost")
+
+
+def test_stub_rate_limit(stub_server):
+    stub_server.config.rate_limit = 2
+    provider = get_provider(bench_config("openai", stub_server.url), debug=False)
+    scheduler = provider.scheduler
+
+    for _ in range(2):
+        assert "".join(provider.open_stream("system", "question")) == "the data frame "
+    # the stub reported its limit, so the scheduler paces the next request
+    assert scheduler.requests.rate == 2
+    assert scheduler.requests.delay(1) > 0
+
+    # going around the scheduler gets throttled
+    with pytest.raises(Exception) as error:
+        list(provider.stream_chat("system", "question"))
+    assert error.value.status_code == 429
+    assert float(error.value.response.headers["retry-after"]) > 0
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from unittest.mock import Mock
+
+from ipychat.providers.openai import OpenAIProvider
+from ipychat.warmup import KeepAlive
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_base_provider_warmup(mock_config):
+    provider = OpenAIProvider(mock_config)
+    provider.client = Mock(base_url="https://api.example.com/v1/")
+    provider.warmup()
+    provider.client._client.head.assert_called_once()
+    assert provider.client._client.head.call_args[0] == ("https://api.example.com/v1/",)
+
+
+def test_keepalive_pings_until_stopped():
+    provider = Mock()
+    keepalive = KeepAlive(provider, interval=0.01)
+    keepalive.start()
+    assert wait_for(lambda: keepalive.pings >= 3)
+
+    keepalive.stop()
+    keepalive._thread.join(1)
+    assert not keepalive._thread.is_alive()
+
+
+def test_keepalive_sleeps_when_idle():
+    provider = Mock()
+    keepalive = KeepAlive(provider, interval=0.01, idle_timeout=0.05)
+    keepalive.start()
+    assert wait_for(lambda: keepalive._idle and keepalive.pings > 0)
+    time.sleep(0.05)
+    pings = keepalive.pings
+    time.sleep(0.05)
+    assert keepalive.pings == pings
+
+    other = Mock()
+    keepalive.touch(other)
+    assert wait_for(lambda: other.warmup.called)
+    keepalive.stop()
+
+
+def test_keepalive_ignores_failures():
+    provider = Mock()
+    provider.warmup.side_effect = ConnectionError("offline")
+    keepalive = KeepAlive(provider, interval=0.01)
+    keepalive.start()
+    assert wait_for(lambda: provider.warmup.call_count >= 2)
+    assert keepalive.pings == 0
+    keepalive.stop()
+
+
+def test_keepalive_pings_are_not_logged(caplog):
+    provider = Mock()
+    provider.warmup.side_effect = lambda: logging.getLogger("httpx").info("HEAD")
+    keepalive = KeepAlive(provider, interval=0.01)
+
+    with caplog.at_level(logging.INFO, logger="httpx"):
+        keepalive.start()
+        assert wait_for(lambda: keepalive.pings >= 2)
+        keepalive.stop()
+        logging.getLogger("httpx").info("POST")
+
+    assert [record.getMessage() for record in caplog.records] == ["POST"]